@@ -3,13 +3,15 @@
 import os
 import sys
 import asyncio
+import argparse
 import telegram
-from telegram import Message
 from dotenv import load_dotenv
 
 sys.path.append("./")
-from src.db import Database
-from utils.constants import Environment, TimeConstants, UID
+from src.broadcast import Broadcast
+from src.db import AsyncDatabase, open_database
+from src.notifier import Notifier
+from utils.constants import Environment
 
 
 async def send_maintenance_announcement():
@@ -45,18 +47,14 @@ async def send_live_announcement():
 
 
 async def broadcast_message(message):
-    """Send message to all users"""
-    for user in DB.get_all_users():
-        try:
-            msg: Message = await BOT.send_message(
-                user[UID],
-                message,
-                parse_mode="Markdown",
-                write_timeout=TimeConstants.TIMEOUT_SECONDS,
-            )
-            await msg.pin()
-        except Exception as e:
-            print(f"Error sending message to {user['user']}: {e}")
+    """Send message to all users, resuming a previous run of the same message"""
+    broadcast = Broadcast(
+        DB, Notifier(BOT), message, broadcast_id=ARGS.id, pin=ARGS.pin
+    )
+    report = await broadcast.run(dry_run=ARGS.dry_run)
+    for uid, error in report.failed.items():
+        print(f"Error sending message to {uid}: {error}")
+    print(report)
 
 
 async def main(env: Environment):
@@ -65,14 +63,39 @@ async def main(env: Environment):
     bot_token = os.getenv(
         "TELEGRAM_TOKEN" if env == Environment.PROD else "TEST_TELEGRAM_TOKEN"
     )
-    BOT = telegram.Bot(bot_token)
-    DB = Database(env)
-    await send_live_announcement()
+    DB = AsyncDatabase(open_database(env))
+    async with telegram.Bot(bot_token) as BOT:
+        await send_live_announcement()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Broadcast an announcement")
+    parser.add_argument(
+        "--dev",
+        action="store_const",
+        const=Environment.DEV,
+        default=Environment.PROD,
+        help="Broadcast to development users",
+        dest="env",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Count the users that would be messaged without sending anything",
+    )
+    parser.add_argument(
+        "--id",
+        help="Broadcast id to resume (defaults to a hash of the message)",
+    )
+    parser.add_argument(
+        "--no-pin",
+        action="store_false",
+        help="Do not pin the announcement",
+        dest="pin",
+    )
+    ARGS = parser.parse_args()
     try:
-        asyncio.run(main(Environment.PROD))
+        asyncio.run(main(ARGS.env))
     except Exception as e:
         print(e)
     else:
@@ -0,0 +1,54 @@
+"""Print a section's enrollment history, summarized per time window"""
+
+import sys
+
+import argparse
+import pendulum
+
+sys.path.append("./")
+from src.db import open_database
+from src.history import AVAILABLE_MIN, AVAILABLE_MAX, WAITLIST_MIN, WAITLIST_MAX
+from src.snapshots import AVAILABLE, WAITLIST
+from utils.constants import Environment, POLLED_AT, SAMPLES
+from utils.models import Course
+
+
+def report(env: Environment, course: Course, days: int, window: int):
+    end = pendulum.now()
+    windows = open_database(env).get_enrollment_history(
+        str(course), end.subtract(days=days), end, window
+    )
+    print(f"{'window':<28}{'polls':>6}{'available':>14}{'waitlist':>14}")
+    for summary in windows:
+        available = (
+            f"{summary[AVAILABLE]} ({summary[AVAILABLE_MIN]}-{summary[AVAILABLE_MAX]})"
+        )
+        waitlist = (
+            f"{summary[WAITLIST]} ({summary[WAITLIST_MIN]}-{summary[WAITLIST_MAX]})"
+        )
+        print(
+            f"{pendulum.instance(summary[POLLED_AT]).to_datetime_string():<28}"
+            f"{summary[SAMPLES]:>6}{available:>14}{waitlist:>14}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("course", help='Section to report, e.g. "CAS CS111 A1"')
+    parser.add_argument("--days", type=int, default=7, help="How far back to look")
+    parser.add_argument(
+        "--window", type=int, default=3600, help="Seconds summarized per row"
+    )
+    parser.add_argument(
+        "--dev",
+        action="store_const",
+        const=Environment.DEV,
+        default=Environment.PROD,
+        help="Use the development database",
+        dest="env",
+    )
+    args = parser.parse_args()
+    try:
+        report(args.env, Course(args.course), args.days, args.window)
+    except Exception as e:
+        print(e)
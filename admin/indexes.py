@@ -0,0 +1,132 @@
+"""Create the database indexes and report which index each Database query uses"""
+
+import sys
+
+import argparse
+import pendulum
+
+sys.path.append("./")
+from src.db import Database
+from utils.constants import (
+    Environment,
+    NotificationStatus,
+    SUBSCRIPTION_LIST,
+    USER_LIST,
+    OUTBOX_LIST,
+    BROADCAST_LIST,
+    COURSE_NAME,
+    SEM_YEAR,
+    UID,
+    STATUS,
+    AVAILABLE_AT,
+    UPDATED_AT,
+    BROADCAST_ID,
+)
+from utils.models import Course
+
+SAMPLE_UID = "0"
+SAMPLE_COURSE = "CAS CS111 A1"
+
+
+def queries() -> list[tuple[str, str, dict]]:
+    """(description, collection, filter) of each query the Database class issues"""
+    now = pendulum.now()
+    return [
+        ("get_user_course / prune_users", SUBSCRIPTION_LIST, {UID: SAMPLE_UID}),
+        (
+            "subscribe",
+            SUBSCRIPTION_LIST,
+            {
+                UID: SAMPLE_UID,
+                COURSE_NAME: SAMPLE_COURSE,
+                SEM_YEAR: Course.get_sem_year(),
+            },
+        ),
+        (
+            "get_subscribers",
+            SUBSCRIPTION_LIST,
+            {COURSE_NAME: {"$in": [SAMPLE_COURSE]}, SEM_YEAR: Course.get_sem_year()},
+        ),
+        (
+            "get_sweep_courses",
+            SUBSCRIPTION_LIST,
+            {SEM_YEAR: Course.get_sem_year()},
+        ),
+        (
+            "get_expired_courses / purge_expired",
+            SUBSCRIPTION_LIST,
+            {SEM_YEAR: {"$ne": Course.get_sem_year()}},
+        ),
+        (
+            "unsubscribe",
+            SUBSCRIPTION_LIST,
+            {UID: SAMPLE_UID, COURSE_NAME: SAMPLE_COURSE},
+        ),
+        (
+            "get_user_subscriptions / unsubscribe_many",
+            SUBSCRIPTION_LIST,
+            {UID: {"$in": [SAMPLE_UID]}},
+        ),
+        ("get_user / update_subscription_*", USER_LIST, {UID: SAMPLE_UID}),
+        ("unsubscribe_many / prune_users", USER_LIST, {UID: {"$in": [SAMPLE_UID]}}),
+        (
+            "claim_notifications",
+            OUTBOX_LIST,
+            {STATUS: NotificationStatus.PENDING, AVAILABLE_AT: {"$lte": now}},
+        ),
+        (
+            "purge_notifications",
+            OUTBOX_LIST,
+            {STATUS: {"$ne": NotificationStatus.PENDING}, UPDATED_AT: {"$lt": now}},
+        ),
+        (
+            "get_broadcast_recipients",
+            BROADCAST_LIST,
+            {BROADCAST_ID: "0", STATUS: NotificationStatus.DELIVERED},
+        ),
+    ]
+
+
+def plan_stages(plan: dict) -> list[dict]:
+    """Flatten a winning plan into its stages, outermost first"""
+    stages = [plan]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages += plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        stages += plan_stages(child)
+    return stages
+
+
+def report(env: Environment):
+    database = Database(env)
+    print(f"{'query':<36}{'plan':<10}{'index':<16}{'keys':>8}{'docs':>8}")
+    for description, collection, query in queries():
+        explain = database.mongo_db.command(
+            "explain", {"find": collection, "filter": query}, verbosity="executionStats"
+        )
+        stages = plan_stages(explain["queryPlanner"]["winningPlan"])
+        index_names = [s["indexName"] for s in stages if "indexName" in s]
+        plan = "IXSCAN" if index_names else "COLLSCAN"
+        stats = explain["executionStats"]
+        print(
+            f"{description:<36}{plan:<10}{','.join(index_names) or '-':<16}"
+            f"{stats['totalKeysExamined']:>8}{stats['totalDocsExamined']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--dev",
+        action="store_const",
+        const=Environment.DEV,
+        default=Environment.PROD,
+        help="Use the development database",
+        dest="env",
+    )
+    args = parser.parse_args()
+    try:
+        report(args.env)
+    except Exception as e:
+        print(e)
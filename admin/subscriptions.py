@@ -0,0 +1,90 @@
+"""Move the users arrays of course documents into the subscriptions collection
+
+Safe to run while the bot is serving, and to run again. Each batch of a course's
+users is upserted into subscriptions, then exactly those users are pulled from the
+array, so users pushed concurrently stay for the next pass. Course documents left
+without users are deleted.
+"""
+
+import sys
+
+import argparse
+import pendulum
+from pymongo import UpdateOne
+
+sys.path.append("./")
+from src.db import Database
+from utils.constants import (
+    Environment,
+    COURSE_LIST,
+    USER_LIST,
+    COURSE_NAME,
+    SEM_YEAR,
+    UID,
+    LAST_SUBSCRIBED,
+    CREATED_AT,
+)
+
+
+def migrate(env: Environment, batch_size: int):
+    database = Database(env)
+    courses = database.mongo_db[COURSE_LIST]
+    moved = 0
+
+    for course in courses.find({USER_LIST: {"$exists": True, "$ne": []}}):
+        uids = list(dict.fromkeys(course[USER_LIST]))
+        for i in range(0, len(uids), batch_size):
+            batch = uids[i : i + batch_size]
+            subscribed_at = {
+                user[UID]: user.get(LAST_SUBSCRIBED)
+                for user in database.user_collection.find(
+                    {UID: {"$in": batch}}, {UID: 1, LAST_SUBSCRIBED: 1}
+                )
+            }
+            database.subscription_collection.bulk_write(
+                [
+                    UpdateOne(
+                        {
+                            UID: uid,
+                            COURSE_NAME: course[COURSE_NAME],
+                            SEM_YEAR: course[SEM_YEAR],
+                        },
+                        {
+                            "$setOnInsert": {
+                                CREATED_AT: subscribed_at.get(uid) or pendulum.now()
+                            }
+                        },
+                        upsert=True,
+                    )
+                    for uid in batch
+                ],
+                ordered=False,
+            )
+            courses.update_one({"_id": course["_id"]}, {"$pullAll": {USER_LIST: batch}})
+            moved += len(batch)
+
+    removed = courses.delete_many({USER_LIST: {"$in": [None, []]}}).deleted_count
+    print(f"Moved {moved} subscriptions, removed {removed} emptied courses")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--dev",
+        action="store_const",
+        const=Environment.DEV,
+        default=Environment.PROD,
+        help="Use the development database",
+        dest="env",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=500,
+        help="Users moved per write",
+    )
+    args = parser.parse_args()
+    try:
+        migrate(args.env, args.batch_size)
+    except Exception as e:
+        print(e)
@@ -0,0 +1,134 @@
+"""Compare CPU time and peak memory of class search payload parsing paths.
+
+Usage: python benchmarks/parse_payload.py [--sections N] [--rounds N]
+
+`full` is the previous path: decode the whole payload with `json.loads`, then
+validate a `CourseResponse` per section. `lean` is `parse_sections`, which runs the
+compiled `CLASS_SEARCH_VALIDATOR` over the raw bytes. Peak memory is measured with
+tracemalloc, which only sees Python-level allocations.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.models import CourseResponse, parse_sections
+
+
+class StaticResponse:
+    """Stand-in for a curl_cffi response holding a pre-rendered payload."""
+
+    def __init__(self, content: bytes):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+def make_section(i: int) -> dict:
+    """A section shaped like the class search API's, with the fields we never read."""
+    return {
+        "index": i,
+        "crse_id": f"{100000 + i}",
+        "crse_offer_nbr": 1,
+        "strm": "2258",
+        "session_code": "1",
+        "session_descr": "Regular Academic Session",
+        "class_section": f"{chr(65 + i // 9 % 26)}{i % 9 + 1}",
+        "location": "CHARLES",
+        "location_descr": "Charles River Campus",
+        "start_dt": "09/02/2025",
+        "end_dt": "12/10/2025",
+        "class_stat": "Active",
+        "campus": "MAIN",
+        "campus_descr": "Main Campus",
+        "class_nbr": 10000 + i,
+        "acad_career": "UGRD",
+        "acad_career_descr": "Undergraduate",
+        "component": "LEC" if i % 3 == 0 else "DIS",
+        "subject": "CASCS",
+        "subject_descr": "Computer Science",
+        "catalog_nbr": "111",
+        "class_type": "E",
+        "schedule_print": "Y",
+        "acad_group": "CAS",
+        "instruction_mode": "P",
+        "instruction_mode_descr": "In Person",
+        "grading_basis": "GRD",
+        "wait_tot": i % 7,
+        "wait_cap": 50,
+        "class_capacity": 120,
+        "enrollment_total": 120 - i % 5,
+        "enrollment_available": i % 5,
+        "descr": "Introduction to Computer Science 1",
+        "units": "4",
+        "topic": "",
+        "combined_section": "",
+        "instructors": [
+            {"name": f"Instructor {j}", "email": f"i{j}@bu.edu"} for j in range(2)
+        ],
+        "meetings": [
+            {
+                "days": "MoWeFr",
+                "start_time": "10.10.00.000000",
+                "end_time": "11.00.00.000000",
+                "bldg_cd": "CAS",
+                "facility_descr": f"CAS {200 + i}",
+                "room": f"{200 + i}",
+                "start_dt": "09/02/2025",
+                "end_dt": "12/10/2025",
+            }
+        ],
+        "notes": [{"note": "Registration restricted to majors. " * 4}],
+        "reserved_seats": [],
+        "crse_attr": "HUB",
+        "crse_attr_value": "QR1, CT",
+    }
+
+
+def full_parse(response: StaticResponse) -> dict[str, CourseResponse]:
+    classes = json.loads(response.content).get("classes", [])
+    return {x["class_section"]: CourseResponse(**x) for x in classes}
+
+
+def lean_parse(response: StaticResponse) -> dict[str, CourseResponse]:
+    return parse_sections(response, "benchmark")
+
+
+def measure(parse: Callable, response: StaticResponse, rounds: int):
+    start = time.process_time()
+    for _ in range(rounds):
+        parse(response)
+    cpu_ms = (time.process_time() - start) * 1000 / rounds
+
+    tracemalloc.start()
+    parse(response)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cpu_ms, peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sections", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    payload = {"classes": [make_section(i) for i in range(args.sections)]}
+    response = StaticResponse(json.dumps(payload).encode())
+    assert full_parse(response) == lean_parse(response)
+
+    print(f"{args.sections} sections, {len(response.content) / 1024:.0f} KiB payload")
+    print(f"{'path':<6}{'cpu ms/parse':>14}{'peak KiB':>12}")
+    for name, parse in [("full", full_parse), ("lean", lean_parse)]:
+        cpu_ms, peak_kib = measure(parse, response, args.rounds)
+        print(f"{name:<6}{cpu_ms:>14.3f}{peak_kib:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Time the storage operations of a sweep and a drain on a storage backend.
+
+Usage: python benchmarks/storage.py [--backend NAME] [--users N] [--courses N]
+"""
+
+import argparse
+import os
+import sys
+import time
+import uuid
+
+import pendulum
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.db import open_database
+from src.outbox import make_intents
+from src.storage import Storage
+from utils.constants import Environment
+from utils.models import Course
+
+
+def timed(label: str, operations: int, run) -> None:
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<24}{operations:>8}{elapsed * 1e6 / max(operations, 1):>12.1f}")
+
+
+def benchmark(db: Storage, users: int, courses: int) -> None:
+    now = pendulum.now()
+    prefix = uuid.uuid4().hex[:6]
+    names = [f"CAS CS{100 + i % 800} A{i // 800 + 1}" for i in range(courses)]
+    uids = [f"bench-{prefix}-{i}" for i in range(users)]
+    subscriptions = [(Course(names[i % courses]), uid) for i, uid in enumerate(uids)]
+    semester = Course.get_sem_year()
+
+    print(f"{'operation':<24}{'ops':>8}{'us/op':>12}")
+    timed(
+        "subscribe",
+        users,
+        lambda: [db.subscribe(course, uid, now) for course, uid in subscriptions],
+    )
+    timed("get_user_course", users, lambda: [db.get_user_course(uid) for uid in uids])
+    timed(
+        "get_sweep_courses",
+        courses,
+        lambda: list(db.get_sweep_courses(semester, 500)),
+    )
+    timed("get_subscribers", users, lambda: db.get_subscribers(semester, names))
+
+    intents = [
+        intent
+        for course, uid in subscriptions
+        for intent in make_intents(course, semester, "bench", "", [uid], now)
+    ]
+    timed("enqueue_notifications", users, lambda: db.enqueue_notifications(intents))
+    claimed = []
+    timed(
+        "claim_notifications",
+        users,
+        lambda: claimed.extend(db.claim_notifications("bench", now, now, users)),
+    )
+    keys = [intent["_id"] for intent in claimed]
+    timed(
+        "settle_notifications",
+        users,
+        lambda: db.settle_notifications(keys, {}, [], now),
+    )
+    timed("prune_users", users, lambda: db.prune_users(uids))
+    db.purge_notifications(now.add(seconds=1))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--backend",
+        choices=["memory", "sqlite", "mongo"],
+        default="memory",
+        help="Storage backend to benchmark; sqlite uses SQLITE_PATH",
+    )
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--courses", type=int, default=500)
+    args = parser.parse_args()
+    try:
+        benchmark(
+            open_database(Environment.DEV, args.backend), args.users, args.courses
+        )
+    except Exception as e:
+        print(e)
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 import html
 import os
 import re
@@ -17,6 +18,7 @@ from telegram import (
     constants,
 )
 from telegram.ext import (
+    Application,
     ApplicationBuilder,
     CallbackQueryHandler,
     CommandHandler,
@@ -27,8 +29,14 @@ from telegram.ext import (
 )
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from src.db import Database
-from src import finder
+from src.db import AsyncDatabase, open_database, USER_CACHE_CHANGE_STREAMS
+from src import finder, outbox, rollover, server
+from src.history import EnrollmentHistory
+from src.notifier import Notifier
+from src.outbox import OutboxDrainer
+from src.rollover import SemesterRollover
+from src.scheduler import PollScheduler
+from src.snapshots import SnapshotStore
 from utils.constants import (
     Environment,
     InputStates,
@@ -40,8 +48,10 @@ from utils.constants import (
     LAST_SUBSCRIBED,
     LAST_SUBSCRIPTION,
     COURSE_NAME,
+    SEARCH_CLIENT,
+    CACHE_WATCHER,
 )
-from utils import conv
+from utils import client, conv
 from utils.models import Course
 
 # Type aliases for better readability
@@ -49,7 +59,7 @@ Handler: TypeAlias = Callable[[Update, ContextTypes.DEFAULT_TYPE], Any]
 UserCache: TypeAlias = dict[str, Any]
 
 # Initialize DB at module level
-DB = None
+DB: AsyncDatabase | None = None
 
 load_dotenv()
 FEEDBACK_CHANNEL_ID = str(os.getenv("FEEDBACK_CHANNEL_ID"))
@@ -58,12 +68,12 @@ FEEDBACK_CHANNEL_ID = str(os.getenv("FEEDBACK_CHANNEL_ID"))
 # Conversation helpers
 
 
-def get_subscription_status(
+async def get_subscription_status(
     user_cache: UserCache, context: ContextTypes.DEFAULT_TYPE
 ) -> tuple[bool, pendulum.DateTime | None]:
     """Check user subscription and update cache"""
     user_id = str(context._user_id)
-    user = DB.get_user(user_id)
+    user = await DB.get_user(user_id)
 
     user_cache[MsgEnum.IS_SUBSCRIBED] = user[IS_SUBSCRIBED] if user else False
     user_cache[MsgEnum.LAST_SUBSCRIBED] = (
@@ -75,7 +85,7 @@ def get_subscription_status(
         for key in FORM_FIELDS:
             user_cache.pop(key, None)
     elif not all(field in user_cache for field in FORM_FIELDS):
-        user_course = DB.get_user_course(user_id)
+        user_course = await DB.get_user_course(user_id)
         populate_cache(user_cache, user_course)
 
     return user_cache[MsgEnum.IS_SUBSCRIBED], user_cache[MsgEnum.LAST_SUBSCRIBED]
@@ -111,7 +121,7 @@ async def start(update: Update, _: ContextTypes.DEFAULT_TYPE):
 async def subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Starts the conversation and asks the user about their subscription"""
     user_cache = cast(UserCache, context.user_data)
-    is_subscribed, last_subscribed = get_subscription_status(user_cache, context)
+    is_subscribed, last_subscribed = await get_subscription_status(user_cache, context)
 
     # Check user constraints (subscription status and time)
     if is_subscribed:
@@ -237,7 +247,7 @@ async def submit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     course = conv.get_course(user_cache)
     user_id = str(context._user_id)
     curr_time = pendulum.now()
-    DB.subscribe(course, user_id, curr_time)
+    await DB.subscribe(course, user_id, curr_time)
 
     user_cache[MsgEnum.IS_SUBSCRIBED] = True
     user_cache[MsgEnum.LAST_SUBSCRIBED] = curr_time
@@ -248,7 +258,7 @@ async def submit(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def register(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Ask user for confirmation to register"""
     user_cache = cast(UserCache, context.user_data)
-    is_subscribed, last_subscribed = get_subscription_status(user_cache, context)
+    is_subscribed, last_subscribed = await get_subscription_status(user_cache, context)
 
     if last_subscribed is None:
         await update.message.reply_text(conv.NOT_SUBSCRIBED_TEXT, do_quote=True)
@@ -373,7 +383,7 @@ async def start_webdriver(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def resubscribe_dialog(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Ask user for confirmation to resubscribe"""
     user_cache = cast(UserCache, context.user_data)
-    is_subscribed, _ = get_subscription_status(user_cache, context)
+    is_subscribed, _ = await get_subscription_status(user_cache, context)
     if is_subscribed:
         course = conv.get_course(user_cache)
         await update.message.reply_markdown_v2(
@@ -407,7 +417,7 @@ async def resubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
     last_subscribed_course = Course(last_subscribed_course_str)
     user_id = str(context._user_id)
     curr_time = pendulum.now()
-    DB.subscribe(last_subscribed_course, user_id, curr_time)
+    await DB.subscribe(last_subscribed_course, user_id, curr_time)
 
     user_cache[MsgEnum.IS_SUBSCRIBED] = True
     user_cache[MsgEnum.LAST_SUBSCRIBED] = curr_time
@@ -419,7 +429,7 @@ async def resubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def unsubscribe_dialog(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Ask user for confirmation to unsubscribe"""
-    is_subscribed, _ = get_subscription_status(context.user_data, context)
+    is_subscribed, _ = await get_subscription_status(context.user_data, context)
     if is_subscribed:
         buttons = conv.get_confirmation_buttons()
         keyboard = InlineKeyboardMarkup(buttons)
@@ -440,7 +450,7 @@ async def unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_cache = cast(UserCache, context.user_data)
     course = conv.get_course(user_cache)
     user_id = str(context._user_id)
-    DB.unsubscribe(course, user_id)
+    await DB.unsubscribe(course, user_id)
 
     for key in FORM_FIELDS:
         user_cache.pop(key, None)
@@ -519,6 +529,21 @@ async def error_handler(_update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
+async def post_init(application: Application) -> None:
+    """Open the class search client shared by all lookups for the bot's lifetime"""
+    application.bot_data[SEARCH_CLIENT] = client.create_search_client()
+    if USER_CACHE_CHANGE_STREAMS:
+        application.bot_data[CACHE_WATCHER] = asyncio.create_task(DB.watch_changes())
+
+
+async def post_shutdown(application: Application) -> None:
+    """Close the class search client and its pooled connections"""
+    if search_client := application.bot_data.pop(SEARCH_CLIENT, None):
+        await search_client.close()
+    if watcher := application.bot_data.pop(CACHE_WATCHER, None):
+        watcher.cancel()
+
+
 def create_conversation_handlers() -> list[ConversationHandler]:
     """Create all conversation handlers for the bot"""
     subscription_pattern = f"^({InputStates.INPUT_DEPARTMENT}|{InputStates.INPUT_COURSE_NUM}|{InputStates.INPUT_SECTION})$"
@@ -604,18 +629,23 @@ def create_conversation_handlers() -> list[ConversationHandler]:
     return handlers
 
 
-def main(env=Environment.PROD) -> None:
-    """Initialize and start the bot"""
-    print("Starting bot...")
+def create_application(env=Environment.PROD, poller=True) -> Application:
+    """Build the bot application with its handlers and jobs"""
     global DB
 
     if not DB:
-        DB = Database(env)
+        DB = AsyncDatabase(open_database(env))
 
     bot_token = os.getenv(
         "TELEGRAM_TOKEN" if env == Environment.PROD else "TEST_TELEGRAM_TOKEN"
     )
-    application = ApplicationBuilder().token(bot_token).build()
+    application = (
+        ApplicationBuilder()
+        .token(bot_token)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     # Add conversation handlers
     for handler in create_conversation_handlers():
@@ -633,11 +663,49 @@ def main(env=Environment.PROD) -> None:
     application.add_handler(MessageHandler(filters.COMMAND, unknown))
     application.add_error_handler(error_handler)
 
-    # Start job queue
+    # Deliver queued notifications, wherever they were detected
     job_queue = application.job_queue
-    job_queue.run_repeating(callback=finder.run, interval=60, data={"db": DB})
+    job_queue.run_repeating(
+        callback=outbox.run,
+        interval=outbox.OUTBOX_DRAIN_SECONDS,
+        data={"drainer": OutboxDrainer(DB, Notifier(application.bot))},
+    )
+
+    # Unsubscribe everyone from past semesters' courses once the semester changes
+    job_queue.run_repeating(
+        callback=rollover.run,
+        interval=rollover.ROLLOVER_CHECK_SECONDS,
+        first=0,
+        data={"rollover": SemesterRollover(DB)},
+    )
 
-    application.run_polling()
+    # Start polling job, unless polling is delegated to standalone workers
+    if poller:
+        job_queue.run_repeating(
+            callback=finder.run,
+            interval=finder.POLL_TICK_SECONDS,
+            data={
+                "db": DB,
+                "scheduler": PollScheduler(),
+                "snapshots": SnapshotStore(DB.sync.get_snapshots()),
+                "history": EnrollmentHistory(),
+                "courses": finder.CourseList(),
+            },
+        )
+
+    return application
+
+
+def main(env=Environment.PROD, poller=True, webhook=False) -> None:
+    """Initialize and start the bot"""
+    print("Starting bot...")
+    application = create_application(env, poller)
+
+    if webhook:
+        # Updates arrive through the HTTP server, which runs the bot in its event loop
+        server.serve(application)
+    else:
+        application.run_polling()
 
 
 if __name__ == "__main__":
@@ -650,5 +718,16 @@ if __name__ == "__main__":
         help="Run the bot in development mode",
         dest="env",
     )
+    parser.add_argument(
+        "--no-poller",
+        action="store_false",
+        help="Leave course polling to standalone workers (src/worker.py)",
+        dest="poller",
+    )
+    parser.add_argument(
+        "--webhook",
+        action="store_true",
+        help="Receive updates through the webhook served by src/server.py",
+    )
     args = parser.parse_args()
-    main(args.env)
+    main(args.env, args.poller, args.webhook)
@@ -0,0 +1,180 @@
+"""Resumable announcements to every user."""
+
+import asyncio
+import hashlib
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+
+import pendulum
+from dotenv import load_dotenv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.db import AsyncDatabase
+from src.notifier import Notifier, is_dead_chat
+from utils.constants import NotificationStatus, UID, STATUS, PINNED, ERROR, UPDATED_AT
+from utils.throttle import jittered_backoff
+
+load_dotenv()
+
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "50"))
+BROADCAST_CHECKPOINT_EVERY = int(os.getenv("BROADCAST_CHECKPOINT_EVERY", "50"))
+BROADCAST_MAX_ATTEMPTS = int(os.getenv("BROADCAST_MAX_ATTEMPTS", "3"))
+BROADCAST_RETRY_BASE_SECONDS = float(os.getenv("BROADCAST_RETRY_BASE_SECONDS", "5"))
+BROADCAST_RETRY_MAX_SECONDS = float(os.getenv("BROADCAST_RETRY_MAX_SECONDS", "60"))
+
+
+def broadcast_id_of(text: str) -> str:
+    """Default broadcast id, so re-running the same announcement resumes it."""
+    return hashlib.sha1(text.encode()).hexdigest()[:12]
+
+
+@dataclass
+class BroadcastReport:
+    broadcast_id: str
+    dry_run: bool = False
+    delivered: int = 0
+    pinned: int = 0
+    failed: dict[str, Exception] = field(default_factory=dict)
+    already_delivered: int = 0
+    pruned: int = 0
+    duration: float = 0.0
+
+    @property
+    def dead(self) -> list[str]:
+        """Users whose chat is gone, as opposed to failures worth retrying."""
+        return [uid for uid, e in self.failed.items() if is_dead_chat(e)]
+
+    @property
+    def throughput(self) -> float:
+        """Users reached per second."""
+        return self.delivered / self.duration if self.duration else 0.0
+
+    def __str__(self) -> str:
+        if self.dry_run:
+            return (
+                f"Broadcast {self.broadcast_id} (dry run): {self.delivered} to send, "
+                f"{self.already_delivered} already delivered"
+            )
+        return (
+            f"Broadcast {self.broadcast_id}: {self.delivered} delivered "
+            f"({self.pinned} pinned), {len(self.failed)} failed, "
+            f"{self.pruned} pruned, "
+            f"{self.already_delivered} skipped as already delivered, "
+            f"{self.duration:.1f}s at {self.throughput:.1f} users/s"
+        )
+
+
+class Broadcast:
+    """Sends `text` to every user concurrently, within the notifier's rate limits.
+
+    Every user's outcome is checkpointed to the broadcasts collection in batches of
+    `checkpoint_every`. Running the same broadcast again skips users it was already
+    delivered to and retries those it failed for, so an interrupted run resumes
+    where it stopped.
+
+    Users whose chat is gone are pruned once the run ends. Other failures are
+    retried in rounds, up to `max_attempts`, after a jittered backoff.
+    """
+
+    def __init__(
+        self,
+        db: AsyncDatabase,
+        notifier: Notifier,
+        text: str,
+        broadcast_id: str | None = None,
+        pin: bool = True,
+        parse_mode: str | None = "Markdown",
+        concurrency: int = BROADCAST_CONCURRENCY,
+        checkpoint_every: int = BROADCAST_CHECKPOINT_EVERY,
+        max_attempts: int = BROADCAST_MAX_ATTEMPTS,
+        retry_base: float = BROADCAST_RETRY_BASE_SECONDS,
+        retry_max: float = BROADCAST_RETRY_MAX_SECONDS,
+    ):
+        self.db = db
+        self.notifier = notifier
+        self.text = text
+        self.broadcast_id = broadcast_id or broadcast_id_of(text)
+        self.pin = pin
+        self.parse_mode = parse_mode
+        self.concurrency = concurrency
+        self.checkpoint_every = checkpoint_every
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._outcomes: list[dict] = []
+
+    async def run(self, dry_run: bool = False) -> BroadcastReport:
+        """Send to every user not yet reached; with `dry_run`, only count them."""
+        report = BroadcastReport(self.broadcast_id, dry_run)
+        done = await self.db.get_broadcast_recipients(self.broadcast_id)
+        recipients = []
+        for user in await self.db.get_all_users():
+            if user[UID] in done:
+                report.already_delivered += 1
+            else:
+                recipients.append(user[UID])
+
+        if dry_run:
+            report.delivered = len(recipients)
+            return report
+
+        start = time.monotonic()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def deliver(uid: str):
+            async with semaphore:
+                await self._deliver(uid, report)
+
+        try:
+            for attempt in range(self.max_attempts):
+                if attempt:
+                    await asyncio.sleep(
+                        jittered_backoff(attempt - 1, self.retry_base, self.retry_max)
+                    )
+                await asyncio.gather(*(deliver(uid) for uid in recipients))
+                dead = set(report.dead)
+                recipients = [uid for uid in report.failed if uid not in dead]
+                if not recipients or attempt + 1 == self.max_attempts:
+                    break
+                for uid in recipients:
+                    del report.failed[uid]
+        finally:
+            await self._checkpoint()
+            dead = report.dead
+            await self.db.prune_users(dead)
+            report.pruned = len(dead)
+            report.duration = time.monotonic() - start
+        return report
+
+    async def _deliver(self, uid: str, report: BroadcastReport) -> None:
+        outcome = {UID: uid, PINNED: False}
+        try:
+            message = await self.notifier.send(
+                uid, self.text, parse_mode=self.parse_mode
+            )
+        except Exception as e:
+            report.failed[uid] = e
+            outcome |= {STATUS: NotificationStatus.FAILED, ERROR: str(e)}
+        else:
+            report.delivered += 1
+            outcome[STATUS] = NotificationStatus.DELIVERED
+            # A failed pin still counts as delivered, so a resume does not re-send
+            if self.pin:
+                try:
+                    outcome[PINNED] = await self.notifier.pin(message)
+                    report.pinned += 1
+                except Exception as e:
+                    outcome[ERROR] = str(e)
+
+        outcome[UPDATED_AT] = pendulum.now()
+        self._outcomes.append(outcome)
+        if len(self._outcomes) >= self.checkpoint_every:
+            await self._checkpoint()
+
+    async def _checkpoint(self) -> None:
+        if not self._outcomes:
+            return
+        outcomes, self._outcomes = self._outcomes, []
+        await self.db.save_broadcast_outcomes(self.broadcast_id, outcomes)
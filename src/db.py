@@ -1,70 +1,436 @@
 """Database interface for the course subscription system."""
 
+import asyncio
+import itertools
 import os
 import sys
-from typing import Optional, Iterator
+import threading
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Iterator, Optional
 
 import pendulum
 from dotenv import load_dotenv
-from pymongo import MongoClient
+from pymongo import (
+    ASCENDING,
+    DeleteOne,
+    IndexModel,
+    MongoClient,
+    ReplaceOne,
+    UpdateMany,
+    UpdateOne,
+)
+from pymongo.client_session import ClientSession
+from pymongo.errors import CollectionInvalid, DuplicateKeyError, OperationFailure
 import certifi
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.history import (
+    AVAILABLE_MIN,
+    AVAILABLE_MAX,
+    WAITLIST_MIN,
+    WAITLIST_MAX,
+)
+from src.memory_db import MemoryDatabase
+from src.snapshots import AVAILABLE, WAITLIST
+from src.sqlite_db import SQLiteDatabase
+from src.storage import Storage, subscription_key
+from utils.cache import TTLCache
 from utils.models import Course
 from utils.constants import (
     Environment,
-    COURSE_LIST,
+    NotificationStatus,
     USER_LIST,
+    SUBSCRIPTION_LIST,
+    SNAPSHOT_LIST,
+    LEASE_LIST,
+    WORKER_LIST,
+    OUTBOX_LIST,
+    BROADCAST_LIST,
+    ENROLLMENT_LIST,
+    OWNER,
+    EXPIRES_AT,
+    HEARTBEAT,
+    STATUS,
+    ATTEMPTS,
+    AVAILABLE_AT,
+    CREATED_AT,
+    UPDATED_AT,
+    BROADCAST_ID,
     COURSE_NAME,
     SEM_YEAR,
     UID,
+    SUBSCRIBERS,
     LAST_SUBSCRIBED,
     IS_SUBSCRIBED,
     LAST_SUBSCRIPTION,
+    POLLED_AT,
+    SAMPLES,
 )
 
 load_dotenv()
 
+# Bounds how long a write from another process can go unseen without change streams
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "30"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+# Watch the users and courses collections to invalidate on other processes' writes
+USER_CACHE_CHANGE_STREAMS = os.getenv("USER_CACHE_CHANGE_STREAMS", "") == "1"
+# Storage engine: "mongo", "sqlite" (a single file at SQLITE_PATH) or "memory"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo")
+SQLITE_PATH = os.getenv("SQLITE_PATH")
+# Courses fetched per round trip while a sweep streams the courses collection
+SWEEP_BATCH_SIZE = int(os.getenv("SWEEP_BATCH_SIZE", "500"))
+# Enrollment samples older than this are expired by the server
+ENROLLMENT_RETENTION_DAYS = int(os.getenv("ENROLLMENT_RETENTION_DAYS", "365"))
+
+# Server error code for transactions on a standalone mongod
+ILLEGAL_OPERATION = 20
+
+# Indexes backing the queries below, keyed by collection
+INDEXES = {
+    SUBSCRIPTION_LIST: [
+        IndexModel(
+            [(UID, ASCENDING), (COURSE_NAME, ASCENDING), (SEM_YEAR, ASCENDING)],
+            name="user_course",
+            unique=True,
+        ),
+        IndexModel(
+            [(COURSE_NAME, ASCENDING), (SEM_YEAR, ASCENDING), (UID, ASCENDING)],
+            name="course_users",
+        ),
+        IndexModel([(SEM_YEAR, ASCENDING), (COURSE_NAME, ASCENDING)], name="semester"),
+    ],
+    USER_LIST: [IndexModel([(UID, ASCENDING)], name="user", unique=True)],
+    OUTBOX_LIST: [
+        IndexModel([(STATUS, ASCENDING), (AVAILABLE_AT, ASCENDING)], name="due"),
+        IndexModel([(STATUS, ASCENDING), (UPDATED_AT, ASCENDING)], name="settled"),
+    ],
+    BROADCAST_LIST: [
+        IndexModel([(BROADCAST_ID, ASCENDING), (STATUS, ASCENDING)], name="outcome")
+    ],
+}
 
-class Database:
+
+class Database(Storage):
     def __init__(self, env: Environment):
         mongo_client = MongoClient(os.getenv("MONGO_URL"), tlsCAFile=certifi.where())
         mongo_db = mongo_client.get_database(f"{env}_db")
         self.env = env
-        self.course_collection = mongo_db[COURSE_LIST]
+        self.mongo_client = mongo_client
+        self.mongo_db = mongo_db
+        # Cleared on the first transaction a standalone server rejects
+        self.transactions = True
+        self.subscription_collection = mongo_db[SUBSCRIPTION_LIST]
         self.user_collection = mongo_db[USER_LIST]
+        self.snapshot_collection = mongo_db[SNAPSHOT_LIST]
+        self.lease_collection = mongo_db[LEASE_LIST]
+        self.worker_collection = mongo_db[WORKER_LIST]
+        self.outbox_collection = mongo_db[OUTBOX_LIST]
+        self.broadcast_collection = mongo_db[BROADCAST_LIST]
+        self.enrollment_collection = mongo_db[ENROLLMENT_LIST]
+        self.ensure_indexes()
+        self.ensure_enrollment_collection()
+
+    def ensure_indexes(self) -> None:
+        """Create missing indexes; existing ones with the same spec are left alone"""
+        for collection, indexes in INDEXES.items():
+            try:
+                self.mongo_db[collection].create_indexes(indexes)
+            except OperationFailure as e:
+                # e.g. duplicates blocking a unique index; see admin/indexes.py
+                print(f"Could not create indexes on {collection}: {e}")
+
+    def ensure_enrollment_collection(self) -> None:
+        """Create the enrollment history as a time-series collection
+
+        Samples are bucketed per section, so a window of a section's history is read
+        from a handful of compressed buckets.
+        """
+        if ENROLLMENT_LIST in self.mongo_db.list_collection_names():
+            return
+        try:
+            self.mongo_db.create_collection(
+                ENROLLMENT_LIST,
+                timeseries={
+                    "timeField": POLLED_AT,
+                    "metaField": COURSE_NAME,
+                    "granularity": "minutes",
+                },
+                expireAfterSeconds=ENROLLMENT_RETENTION_DAYS * 24 * 60 * 60,
+            )
+        except (CollectionInvalid, OperationFailure) as e:
+            print(f"Could not create {ENROLLMENT_LIST} collection: {e}")
+
+    def write_together(self, *writes: Callable[[ClientSession | None], Any]) -> None:
+        """Apply writes to several collections atomically, in a transaction
+
+        Each write takes the session to issue its operation in. Without transaction
+        support (a standalone server) the writes are issued in order instead.
+        """
+        if self.transactions:
+            try:
+                with self.mongo_client.start_session() as session:
+                    session.with_transaction(
+                        lambda session: [write(session) for write in writes]
+                    )
+                return
+            except OperationFailure as e:
+                if e.code != ILLEGAL_OPERATION:
+                    raise
+                self.transactions = False
+        for write in writes:
+            write(None)
 
     def get_all_courses(self) -> Iterator[dict]:
-        return self.course_collection.find()
+        """Every subscribed course with its semester and list of users"""
+        return self.subscription_collection.aggregate(
+            [
+                {
+                    "$group": {
+                        "_id": {
+                            COURSE_NAME: f"${COURSE_NAME}",
+                            SEM_YEAR: f"${SEM_YEAR}",
+                        },
+                        USER_LIST: {"$push": f"${UID}"},
+                    }
+                },
+                {
+                    "$project": {
+                        "_id": 0,
+                        COURSE_NAME: f"$_id.{COURSE_NAME}",
+                        SEM_YEAR: f"$_id.{SEM_YEAR}",
+                        USER_LIST: 1,
+                    }
+                },
+            ]
+        )
+
+    def get_sweep_courses(
+        self, semester: str, batch_size: int = SWEEP_BATCH_SIZE
+    ) -> Iterator[dict]:
+        """Name, semester and subscriber count of every course subscribed in `semester`
+
+        Matching and sorting on the semester index lets the count run as a covered
+        index scan over the current semester only.
+        """
+        return self.subscription_collection.aggregate(
+            [
+                {"$match": {SEM_YEAR: semester}},
+                {"$sort": {COURSE_NAME: 1}},
+                {
+                    "$group": {
+                        "_id": {
+                            COURSE_NAME: f"${COURSE_NAME}",
+                            SEM_YEAR: f"${SEM_YEAR}",
+                        },
+                        SUBSCRIBERS: {"$sum": 1},
+                    }
+                },
+                {
+                    "$project": {
+                        "_id": 0,
+                        COURSE_NAME: f"$_id.{COURSE_NAME}",
+                        SEM_YEAR: f"$_id.{SEM_YEAR}",
+                        SUBSCRIBERS: 1,
+                    }
+                },
+            ],
+            batchSize=batch_size,
+        )
+
+    def get_expired_courses(self, semester: str) -> list[dict]:
+        """Every course subscribed in a semester other than `semester`, with its users"""
+        return list(
+            self.subscription_collection.aggregate(
+                [
+                    {"$match": {SEM_YEAR: {"$ne": semester}}},
+                    {
+                        "$group": {
+                            "_id": {
+                                COURSE_NAME: f"${COURSE_NAME}",
+                                SEM_YEAR: f"${SEM_YEAR}",
+                            },
+                            USER_LIST: {"$push": f"${UID}"},
+                        }
+                    },
+                    {
+                        "$project": {
+                            "_id": 0,
+                            COURSE_NAME: f"$_id.{COURSE_NAME}",
+                            SEM_YEAR: f"$_id.{SEM_YEAR}",
+                            USER_LIST: 1,
+                        }
+                    },
+                ]
+            )
+        )
+
+    def purge_expired(self, semester: str, uids: list[str]) -> None:
+        """Delete subscriptions outside `semester` and mark `uids` unsubscribed"""
+        writes = [
+            lambda session: self.subscription_collection.delete_many(
+                {SEM_YEAR: {"$ne": semester}}, session=session
+            ),
+            self.delete_orphaned_snapshots,
+        ]
+        if uids:
+            writes.append(
+                lambda session: self.user_collection.update_many(
+                    {UID: {"$in": uids}},
+                    {"$set": {IS_SUBSCRIBED: False}},
+                    session=session,
+                )
+            )
+        self.write_together(*writes)
+
+    def get_subscribers(
+        self, semester: str, course_names: list[str]
+    ) -> dict[str, dict[str, datetime | None]]:
+        """Subscribed users of each of `course_names` in `semester` and when they subscribed"""
+        subscribers: dict[str, dict[str, datetime | None]] = {}
+        if not course_names:
+            return subscribers
+        cursor = self.subscription_collection.find(
+            {COURSE_NAME: {"$in": course_names}, SEM_YEAR: semester},
+            {"_id": 0, COURSE_NAME: 1, UID: 1, CREATED_AT: 1},
+        )
+        for subscription in cursor:
+            subscribers.setdefault(subscription[COURSE_NAME], {})[subscription[UID]] = (
+                subscription.get(CREATED_AT)
+            )
+        return subscribers
 
     def get_user_course(self, uid: str) -> Optional[dict]:
-        return self.course_collection.find_one({USER_LIST: uid})
+        """The user's subscription, which names the course they are subscribed to"""
+        return self.subscription_collection.find_one({UID: uid})
 
     def subscribe(
         self, course: Course, uid: str, subscription_time: pendulum.DateTime
     ) -> None:
-        """Update course with new user, inserting new course if necessary"""
+        """Subscribe user to course; subscribing twice leaves a single subscription"""
         course_name = str(course)
         sem_year = Course.get_sem_year()
-        self.course_collection.update_one(
-            {COURSE_NAME: course_name, SEM_YEAR: sem_year},
-            {"$setOnInsert": {SEM_YEAR: sem_year}, "$push": {USER_LIST: uid}},
-            upsert=True,
+        self.write_together(
+            lambda session: self.subscription_collection.update_one(
+                {UID: uid, COURSE_NAME: course_name, SEM_YEAR: sem_year},
+                {"$setOnInsert": {CREATED_AT: subscription_time}},
+                upsert=True,
+                session=session,
+            ),
+            lambda session: self.user_collection.update_one(
+                {UID: uid},
+                {
+                    "$set": {
+                        LAST_SUBSCRIBED: subscription_time,
+                        IS_SUBSCRIBED: True,
+                        LAST_SUBSCRIPTION: course_name,
+                    }
+                },
+                upsert=True,
+                session=session,
+            ),
         )
-        self.update_subscription_time(uid, subscription_time)
-        self.update_subscription_status(uid, course_name, True)
 
     def unsubscribe(self, course: Course, uid: str) -> None:
         """Remove user from course"""
         course_name = str(course)
-        self.course_collection.update_one(
-            {COURSE_NAME: course_name}, {"$pull": {USER_LIST: uid}}
+        self.write_together(
+            lambda session: self.subscription_collection.delete_many(
+                {UID: uid, COURSE_NAME: course_name}, session=session
+            ),
+            lambda session: self.delete_orphaned_snapshots(session, [course_name]),
+            lambda session: self.user_collection.update_one(
+                {UID: uid},
+                {"$set": {IS_SUBSCRIBED: False, LAST_SUBSCRIPTION: course_name}},
+                upsert=True,
+                session=session,
+            ),
+        )
+
+    def get_user_subscriptions(self, uids: list[str]) -> list[dict]:
+        """Every subscription of `uids`"""
+        if not uids:
+            return []
+        return list(self.subscription_collection.find({UID: {"$in": uids}}))
+
+    def unsubscribe_many(self, subscriptions: list[dict]) -> list[str]:
+        """End the given subscriptions that still exist, with one write per collection"""
+        if not subscriptions:
+            return []
+        targets = {subscription_key(subscription) for subscription in subscriptions}
+        uids = sorted({subscription[UID] for subscription in subscriptions})
+        ended: list[dict] = []
+
+        def delete_subscriptions(session: ClientSession | None) -> None:
+            ended[:] = [
+                doc
+                for doc in self.subscription_collection.find(
+                    {UID: {"$in": uids}}, session=session
+                )
+                if subscription_key(doc) in targets
+            ]
+            if ended:
+                self.subscription_collection.delete_many(
+                    {"_id": {"$in": [doc["_id"] for doc in ended]}}, session=session
+                )
+
+        def mark_unsubscribed(session: ClientSession | None) -> None:
+            if not ended:
+                return
+            self.delete_orphaned_snapshots(
+                session, sorted({doc[COURSE_NAME] for doc in ended})
+            )
+            self.user_collection.bulk_write(
+                [
+                    UpdateOne(
+                        {UID: doc[UID]},
+                        {
+                            "$set": {
+                                IS_SUBSCRIBED: False,
+                                LAST_SUBSCRIPTION: doc[COURSE_NAME],
+                            }
+                        },
+                    )
+                    for doc in ended
+                ],
+                session=session,
+            )
+
+        self.write_together(delete_subscriptions, mark_unsubscribed)
+        return [doc[UID] for doc in ended]
+
+    def prune_users(self, uids: list[str]) -> None:
+        """Remove users whose chats are gone from every course and the users collection"""
+        if not uids:
+            return
+        self.write_together(
+            lambda session: self.subscription_collection.delete_many(
+                {UID: {"$in": uids}}, session=session
+            ),
+            self.delete_orphaned_snapshots,
+            lambda session: self.user_collection.delete_many(
+                {UID: {"$in": uids}}, session=session
+            ),
         )
-        self.update_subscription_status(uid, course_name, False)
 
-    def remove_course(self, course: Course) -> None:
-        """Remove course from database"""
-        return self.course_collection.delete_one({COURSE_NAME: str(course)})
+    def delete_orphaned_snapshots(
+        self, session: ClientSession | None, course_names: list[str] | None = None
+    ) -> None:
+        """Delete snapshots of `course_names`, or of any course, left unsubscribed
+
+        Sweeps only keep snapshots of subscribed sections in memory, so a persisted
+        one outliving its last subscription would be loaded at every start.
+        """
+        query = {} if course_names is None else {COURSE_NAME: {"$in": course_names}}
+        subscribed = self.subscription_collection.distinct(
+            COURSE_NAME, query, session=session
+        )
+        if course_names is None:
+            orphaned = {"$nin": subscribed}
+        elif names := sorted(set(course_names) - set(subscribed)):
+            orphaned = {"$in": names}
+        else:
+            return
+        self.snapshot_collection.delete_many({"_id": orphaned}, session=session)
 
     def get_all_users(self) -> Iterator[dict]:
         """Find all users in database and return iterable of collection objects"""
@@ -94,3 +460,497 @@ class Database:
             },
             upsert=True,
         )
+
+    def get_snapshots(self) -> Iterator[dict]:
+        """Find all persisted enrollment snapshots"""
+        return self.snapshot_collection.find()
+
+    def save_snapshots(self, upserts: list[dict], removed: list[str]) -> None:
+        """Upsert changed snapshots and delete forgotten ones in one bulk write"""
+        requests = [
+            ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in upserts
+        ]
+        requests += [DeleteOne({"_id": name}) for name in removed]
+        if requests:
+            self.snapshot_collection.bulk_write(requests, ordered=False)
+
+    def save_enrollment(self, samples: list[dict]) -> None:
+        """Append polled enrollment samples to the history in one unordered insert"""
+        if samples:
+            # Copies, since the driver adds an _id to each document it inserts
+            self.enrollment_collection.insert_many(
+                [dict(sample) for sample in samples], ordered=False
+            )
+
+    def get_enrollment_history(
+        self,
+        course_name: str,
+        start: pendulum.DateTime,
+        end: pendulum.DateTime,
+        window: int,
+    ) -> list[dict]:
+        """A section's samples from `start` until `end`, summarized per `window` seconds
+
+        Windows are aligned to the epoch, as in `history.downsample`.
+        """
+        polled_at = {"$toLong": f"${POLLED_AT}"}
+        window_start = {
+            "$toDate": {"$subtract": [polled_at, {"$mod": [polled_at, window * 1000]}]}
+        }
+        return list(
+            self.enrollment_collection.aggregate(
+                [
+                    {
+                        "$match": {
+                            COURSE_NAME: course_name,
+                            POLLED_AT: {"$gte": start, "$lt": end},
+                        }
+                    },
+                    {"$sort": {POLLED_AT: 1}},
+                    {
+                        "$group": {
+                            "_id": window_start,
+                            SAMPLES: {"$sum": 1},
+                            AVAILABLE: {"$last": f"${AVAILABLE}"},
+                            AVAILABLE_MIN: {"$min": f"${AVAILABLE}"},
+                            AVAILABLE_MAX: {"$max": f"${AVAILABLE}"},
+                            WAITLIST: {"$last": f"${WAITLIST}"},
+                            WAITLIST_MIN: {"$min": f"${WAITLIST}"},
+                            WAITLIST_MAX: {"$max": f"${WAITLIST}"},
+                        }
+                    },
+                    {"$sort": {"_id": 1}},
+                    {"$set": {POLLED_AT: "$_id"}},
+                    {"$unset": "_id"},
+                ]
+            )
+        )
+
+    def heartbeat_worker(self, worker_id: str, time: pendulum.DateTime) -> None:
+        """Record that a poller worker is alive"""
+        self.worker_collection.update_one(
+            {"_id": worker_id}, {"$set": {HEARTBEAT: time}}, upsert=True
+        )
+
+    def count_live_workers(self, since: pendulum.DateTime) -> int:
+        """Count poller workers that have heartbeated since the given time"""
+        return self.worker_collection.count_documents({HEARTBEAT: {"$gt": since}})
+
+    def remove_worker(self, worker_id: str) -> None:
+        self.worker_collection.delete_one({"_id": worker_id})
+
+    def renew_leases(
+        self,
+        worker_id: str,
+        now: pendulum.DateTime,
+        expires_at: pendulum.DateTime,
+    ) -> list[int]:
+        """Extend the worker's unexpired leases and return their partitions"""
+        owned = {OWNER: worker_id, EXPIRES_AT: {"$gt": now}}
+        self.lease_collection.update_many(owned, {"$set": {EXPIRES_AT: expires_at}})
+        return [doc["_id"] for doc in self.lease_collection.find(owned, {"_id": 1})]
+
+    def acquire_lease(
+        self,
+        partition: int,
+        worker_id: str,
+        now: pendulum.DateTime,
+        expires_at: pendulum.DateTime,
+    ) -> bool:
+        """Take a partition lease if it is free or expired"""
+        try:
+            self.lease_collection.update_one(
+                {
+                    "_id": partition,
+                    "$or": [{OWNER: None}, {EXPIRES_AT: {"$lte": now}}],
+                },
+                {"$set": {OWNER: worker_id, EXPIRES_AT: expires_at}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return False  # Held by a live worker
+        return True
+
+    def release_leases(self, worker_id: str, partitions: list[int]) -> None:
+        """Give up the worker's leases on the given partitions"""
+        if partitions:
+            self.lease_collection.update_many(
+                {"_id": {"$in": partitions}, OWNER: worker_id},
+                {"$set": {OWNER: None}},
+            )
+
+    def enqueue_notifications(self, intents: list[dict]) -> int:
+        """Queue notification intents in one bulk write, skipping keys already queued"""
+        if not intents:
+            return 0
+        requests = [
+            UpdateOne({"_id": intent["_id"]}, {"$setOnInsert": intent}, upsert=True)
+            for intent in intents
+        ]
+        result = self.outbox_collection.bulk_write(requests, ordered=False)
+        return result.upserted_count
+
+    def claim_notifications(
+        self,
+        owner: str,
+        now: pendulum.DateTime,
+        expires_at: pendulum.DateTime,
+        limit: int,
+    ) -> list[dict]:
+        """Claim up to `limit` due notifications that are not claimed by a live drain"""
+        claimable = {
+            STATUS: NotificationStatus.PENDING,
+            AVAILABLE_AT: {"$lte": now},
+            "$or": [{EXPIRES_AT: None}, {EXPIRES_AT: {"$lte": now}}],
+        }
+        keys = [
+            doc["_id"]
+            for doc in self.outbox_collection.find(claimable, {"_id": 1})
+            .sort(AVAILABLE_AT, 1)
+            .limit(limit)
+        ]
+        if not keys:
+            return []
+        self.outbox_collection.update_many(
+            {"_id": {"$in": keys}, **claimable},
+            {"$set": {OWNER: owner, EXPIRES_AT: expires_at}},
+        )
+        # Another drain may have claimed some of them between the find and the update
+        return list(self.outbox_collection.find({"_id": {"$in": keys}, OWNER: owner}))
+
+    def settle_notifications(
+        self,
+        delivered: list[str],
+        retries: dict[str, pendulum.DateTime],
+        failed: list[str],
+        now: pendulum.DateTime,
+    ) -> None:
+        """Record the outcome of claimed notifications and release their claims"""
+        release = {"$unset": {OWNER: "", EXPIRES_AT: ""}}
+        requests = []
+        if delivered:
+            requests.append(
+                UpdateMany(
+                    {"_id": {"$in": delivered}},
+                    {
+                        "$set": {STATUS: NotificationStatus.DELIVERED, UPDATED_AT: now},
+                        **release,
+                    },
+                )
+            )
+        if failed:
+            requests.append(
+                UpdateMany(
+                    {"_id": {"$in": failed}},
+                    {
+                        "$set": {STATUS: NotificationStatus.FAILED, UPDATED_AT: now},
+                        "$inc": {ATTEMPTS: 1},
+                        **release,
+                    },
+                )
+            )
+        requests += [
+            UpdateOne(
+                {"_id": key},
+                {
+                    "$set": {AVAILABLE_AT: available_at, UPDATED_AT: now},
+                    "$inc": {ATTEMPTS: 1},
+                    **release,
+                },
+            )
+            for key, available_at in retries.items()
+        ]
+        if requests:
+            self.outbox_collection.bulk_write(requests, ordered=False)
+
+    def purge_notifications(self, before: pendulum.DateTime) -> None:
+        """Delete settled notifications last updated before `before`"""
+        self.outbox_collection.delete_many(
+            {STATUS: {"$ne": NotificationStatus.PENDING}, UPDATED_AT: {"$lt": before}}
+        )
+
+    def get_broadcast_recipients(self, broadcast_id: str) -> set[str]:
+        """Users a broadcast has already been delivered to"""
+        return {
+            doc[UID]
+            for doc in self.broadcast_collection.find(
+                {BROADCAST_ID: broadcast_id, STATUS: NotificationStatus.DELIVERED},
+                {UID: 1},
+            )
+        }
+
+    def save_broadcast_outcomes(self, broadcast_id: str, outcomes: list[dict]) -> None:
+        """Upsert per-user broadcast outcomes in one bulk write"""
+        requests = [
+            ReplaceOne(
+                {"_id": f"{broadcast_id}:{outcome[UID]}"},
+                {BROADCAST_ID: broadcast_id, **outcome},
+                upsert=True,
+            )
+            for outcome in outcomes
+        ]
+        if requests:
+            self.broadcast_collection.bulk_write(requests, ordered=False)
+
+
+def open_database(env: Environment, backend: str = STORAGE_BACKEND) -> Storage:
+    """Connect to the storage engine selected by `STORAGE_BACKEND`"""
+    if backend == "mongo":
+        return Database(env)
+    if backend == "sqlite":
+        return SQLiteDatabase(env, SQLITE_PATH or f"{env}_db.sqlite3")
+    if backend == "memory":
+        return MemoryDatabase(env)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+class AsyncDatabase:
+    """Awaitable counterpart of a `Storage` engine for code running on the event loop
+
+    Each call runs the synchronous storage method on a worker thread, so a Mongo
+    round trip no longer stalls every other handler and the poller. Methods that
+    return cursors return lists instead, since iterating a cursor also blocks.
+
+    A user's document and subscribed course are read through a bounded TTL cache,
+    since every conversation step checks them. Writes through this class drop the
+    affected users' entries. Writes made by other processes show up after the TTL,
+    or right away when `watch_changes` is running.
+    """
+
+    def __init__(
+        self,
+        db: Storage,
+        cache_ttl: float = USER_CACHE_TTL_SECONDS,
+        cache_size: int = USER_CACHE_SIZE,
+    ):
+        self.sync = db
+        # Values are wrapped in a 1-tuple so a missing user is cached as (None,)
+        self.users: TTLCache[str, tuple[Optional[dict]]] = TTLCache(
+            cache_ttl, cache_size
+        )
+        self.user_courses: TTLCache[str, tuple[Optional[dict]]] = TTLCache(
+            cache_ttl, cache_size
+        )
+        # Bumped on every invalidation, so a read that raced a write is not cached
+        self._generation = 0
+
+    def invalidate_users(self, uids: list[str]) -> None:
+        """Drop cached state of `uids` after they were written to."""
+        self._generation += 1
+        for uid in uids:
+            self.users.invalidate(uid)
+            self.user_courses.invalidate(uid)
+
+    def clear_cache(self) -> None:
+        self._generation += 1
+        self.users.clear()
+        self.user_courses.clear()
+
+    async def _read_through(
+        self,
+        cache: TTLCache[str, tuple[Optional[dict]]],
+        uid: str,
+        read: Callable[[str], Optional[dict]],
+    ) -> Optional[dict]:
+        if (entry := cache.get(uid)) is not None:
+            return entry[0]
+        generation = self._generation
+        value = await asyncio.to_thread(read, uid)
+        if generation == self._generation:
+            cache.set(uid, (value,))
+        return value
+
+    async def watch_changes(self) -> None:
+        """Invalidate the cache on every user and subscription change until cancelled.
+
+        Requires a replica set; on a standalone server this logs and returns, and
+        the TTL alone bounds staleness.
+        """
+        if not isinstance(self.sync, Database):
+            print("User cache change streams need the mongo storage backend")
+            return
+        stop = threading.Event()
+        try:
+            await asyncio.to_thread(self._watch, stop, asyncio.get_running_loop())
+        except OperationFailure as e:
+            print(f"User cache change stream unavailable: {e}")
+        finally:
+            stop.set()
+
+    def _watch(self, stop: threading.Event, loop: asyncio.AbstractEventLoop) -> None:
+        pipeline = [{"$match": {"ns.coll": {"$in": [USER_LIST, SUBSCRIPTION_LIST]}}}]
+        with self.sync.mongo_db.watch(
+            pipeline, full_document="updateLookup", max_await_time_ms=1000
+        ) as stream:
+            while not stop.is_set():
+                if change := stream.try_next():
+                    loop.call_soon_threadsafe(self.apply_change, change)
+
+    def apply_change(self, change: dict) -> None:
+        """Invalidate the entries a change stream event may have made stale."""
+        self._generation += 1
+        cache = self.users if change["ns"]["coll"] == USER_LIST else self.user_courses
+        document = change.get("fullDocument") or {}
+        if UID in document:
+            cache.invalidate(document[UID])
+        else:
+            # Deletes carry no document to tell whose entry it was
+            cache.clear()
+
+    @property
+    def env(self) -> Environment:
+        return self.sync.env
+
+    async def get_all_courses(self) -> list[dict]:
+        return await asyncio.to_thread(lambda: list(self.sync.get_all_courses()))
+
+    async def stream_sweep_courses(
+        self, semester: str, batch_size: int = SWEEP_BATCH_SIZE
+    ) -> AsyncIterator[dict]:
+        """Yield `get_sweep_courses` one batch at a time as the cursor delivers it."""
+        cursor = await asyncio.to_thread(
+            self.sync.get_sweep_courses, semester, batch_size
+        )
+        try:
+            while batch := await asyncio.to_thread(
+                lambda: list(itertools.islice(cursor, batch_size))
+            ):
+                for course_doc in batch:
+                    yield course_doc
+        finally:
+            cursor.close()
+
+    async def get_expired_courses(self, semester: str) -> list[dict]:
+        return await asyncio.to_thread(self.sync.get_expired_courses, semester)
+
+    async def purge_expired(self, semester: str, uids: list[str]) -> None:
+        try:
+            await asyncio.to_thread(self.sync.purge_expired, semester, uids)
+        finally:
+            self.invalidate_users(uids)
+
+    async def get_subscribers(
+        self, semester: str, course_names: list[str]
+    ) -> dict[str, dict[str, datetime | None]]:
+        if not course_names:
+            return {}
+        return await asyncio.to_thread(
+            self.sync.get_subscribers, semester, course_names
+        )
+
+    async def get_user_course(self, uid: str) -> Optional[dict]:
+        return await self._read_through(
+            self.user_courses, uid, self.sync.get_user_course
+        )
+
+    async def subscribe(
+        self, course: Course, uid: str, subscription_time: pendulum.DateTime
+    ) -> None:
+        try:
+            await asyncio.to_thread(self.sync.subscribe, course, uid, subscription_time)
+        finally:
+            self.invalidate_users([uid])
+
+    async def unsubscribe(self, course: Course, uid: str) -> None:
+        try:
+            await asyncio.to_thread(self.sync.unsubscribe, course, uid)
+        finally:
+            self.invalidate_users([uid])
+
+    async def get_user_subscriptions(self, uids: list[str]) -> list[dict]:
+        return await asyncio.to_thread(self.sync.get_user_subscriptions, uids)
+
+    async def unsubscribe_many(self, subscriptions: list[dict]) -> list[str]:
+        try:
+            return await asyncio.to_thread(self.sync.unsubscribe_many, subscriptions)
+        finally:
+            self.invalidate_users([subscription[UID] for subscription in subscriptions])
+
+    async def prune_users(self, uids: list[str]) -> None:
+        try:
+            await asyncio.to_thread(self.sync.prune_users, uids)
+        finally:
+            self.invalidate_users(uids)
+
+    async def get_all_users(self) -> list[dict]:
+        return await asyncio.to_thread(lambda: list(self.sync.get_all_users()))
+
+    async def get_user(self, uid: str) -> Optional[dict]:
+        return await self._read_through(self.users, uid, self.sync.get_user)
+
+    async def update_subscription_time(self, uid: str, time: pendulum.DateTime) -> None:
+        try:
+            await asyncio.to_thread(self.sync.update_subscription_time, uid, time)
+        finally:
+            self.invalidate_users([uid])
+
+    async def update_subscription_status(
+        self, uid: str, last_subscribed: str, is_subscribed: bool
+    ) -> None:
+        try:
+            await asyncio.to_thread(
+                self.sync.update_subscription_status,
+                uid,
+                last_subscribed,
+                is_subscribed,
+            )
+        finally:
+            self.invalidate_users([uid])
+
+    async def get_snapshots(self) -> list[dict]:
+        return await asyncio.to_thread(lambda: list(self.sync.get_snapshots()))
+
+    async def save_snapshots(self, upserts: list[dict], removed: list[str]) -> None:
+        await asyncio.to_thread(self.sync.save_snapshots, upserts, removed)
+
+    async def save_enrollment(self, samples: list[dict]) -> None:
+        await asyncio.to_thread(self.sync.save_enrollment, samples)
+
+    async def get_enrollment_history(
+        self,
+        course_name: str,
+        start: pendulum.DateTime,
+        end: pendulum.DateTime,
+        window: int,
+    ) -> list[dict]:
+        return await asyncio.to_thread(
+            self.sync.get_enrollment_history, course_name, start, end, window
+        )
+
+    async def enqueue_notifications(self, intents: list[dict]) -> int:
+        return await asyncio.to_thread(self.sync.enqueue_notifications, intents)
+
+    async def claim_notifications(
+        self,
+        owner: str,
+        now: pendulum.DateTime,
+        expires_at: pendulum.DateTime,
+        limit: int,
+    ) -> list[dict]:
+        return await asyncio.to_thread(
+            self.sync.claim_notifications, owner, now, expires_at, limit
+        )
+
+    async def settle_notifications(
+        self,
+        delivered: list[str],
+        retries: dict[str, pendulum.DateTime],
+        failed: list[str],
+        now: pendulum.DateTime,
+    ) -> None:
+        await asyncio.to_thread(
+            self.sync.settle_notifications, delivered, retries, failed, now
+        )
+
+    async def purge_notifications(self, before: pendulum.DateTime) -> None:
+        await asyncio.to_thread(self.sync.purge_notifications, before)
+
+    async def get_broadcast_recipients(self, broadcast_id: str) -> set[str]:
+        return await asyncio.to_thread(self.sync.get_broadcast_recipients, broadcast_id)
+
+    async def save_broadcast_outcomes(
+        self, broadcast_id: str, outcomes: list[dict]
+    ) -> None:
+        await asyncio.to_thread(
+            self.sync.save_broadcast_outcomes, broadcast_id, outcomes
+        )
@@ -1,21 +1,43 @@
 # Standard library imports
+import asyncio
 import os
 import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
 
 # Third-party imports
+import pendulum
 from dotenv import load_dotenv
-from telegram import CallbackQuery
+from telegram import Bot, CallbackQuery
 from telegram.ext import ContextTypes
 
 # Local imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from src.db import Database
-from utils.constants import Environment, TimeConstants, SEM_YEAR, USER_LIST, COURSE_NAME
-from utils.models import Course
+from src.db import AsyncDatabase
+from src.history import EnrollmentHistory
+from src.leases import partition_of
+from src.outbox import make_intents
+from src.scheduler import PollScheduler
+from src.snapshots import SnapshotStore, Transition, TransitionEvent
+from utils.constants import (
+    Environment,
+    SUBSCRIBERS,
+    COURSE_NAME,
+    SEARCH_CLIENT,
+)
+from utils.client import SearchClient
+from utils.models import Course, CourseResponse
+from utils.throttle import CircuitOpenError
 
 # Constants
 load_dotenv()
 FEEDBACK_CHANNEL_ID = str(os.getenv("FEEDBACK_CHANNEL_ID"))
+POLL_CONCURRENCY = int(os.getenv("POLL_CONCURRENCY", "10"))
+POLL_TICK_SECONDS = float(os.getenv("POLL_TICK_SECONDS", "5"))
+SWEEP_BUDGET_SECONDS = float(os.getenv("SWEEP_BUDGET_SECONDS", "45"))
+COURSE_REFRESH_SECONDS = float(os.getenv("COURSE_REFRESH_SECONDS", "60"))
 REG_SCREENS = {
     "title": "Add Classes - Display",
     "options": "Registration Options",
@@ -23,8 +45,70 @@ REG_SCREENS = {
 }
 
 # Global variables
-DB: Database | None = None
+DB: AsyncDatabase | None = None
 BOT = None
+# Held for the duration of a sweep so overlapping job runs skip instead of racing
+SWEEP_LOCK = asyncio.Lock()
+# When the last breaker trip reported ends, so each trip is logged once
+REPORTED_TRIP: float | None = None
+
+
+@dataclass
+class SweepStats:
+    """Outcome of a sweep, counted in subscribed courses."""
+
+    completed: int = 0
+    skipped: int = 0
+    carried_over: int = 0
+    overlapped: bool = False
+    breaker_open: bool = False
+    duration: float = 0.0
+
+
+@dataclass
+class CourseList:
+    """Subscribed courses grouped by search URL, as of the last refresh.
+
+    Ticks poll from this list and the scheduler, and reload it from the database only
+    every `COURSE_REFRESH_SECONDS`, or as soon as the semester or partitions change.
+    """
+
+    searches: dict[str, list[tuple[Course, int]]] = field(default_factory=dict)
+    semester: str | None = None
+    partitions: frozenset[int] | None = None
+    refreshed_at: float | None = None
+
+    def stale(
+        self, semester: str, partitions: frozenset[int] | None, now: float
+    ) -> bool:
+        return (
+            self.refreshed_at is None
+            or now - self.refreshed_at >= COURSE_REFRESH_SECONDS
+            or (semester, partitions) != (self.semester, self.partitions)
+        )
+
+
+@dataclass
+class Sweep:
+    """State shared by the polls of a single sweep."""
+
+    search_client: SearchClient
+    scheduler: PollScheduler
+    snapshots: SnapshotStore
+    history: EnrollmentHistory
+    courses: CourseList
+    deadline: float
+    semaphore: asyncio.Semaphore = field(
+        default_factory=lambda: asyncio.Semaphore(POLL_CONCURRENCY)
+    )
+    stats: SweepStats = field(default_factory=SweepStats)
+    semester: str = field(default_factory=Course.get_sem_year)
+    # Transitions seen by the polls, with the sections of the search that saw them
+    transitions: list[tuple[TransitionEvent, dict[str, CourseResponse | None]]] = field(
+        default_factory=list
+    )
+    # Notification intents, written to the outbox in one batch at the end of the sweep
+    intents: list[dict] = field(default_factory=list)
 
 
 async def register_course(env: Environment, user_cache: dict, query: CallbackQuery):
@@ -32,71 +116,253 @@ async def register_course(env: Environment, user_cache: dict, query: CallbackQue
     pass
 
 
-async def search_courses() -> None:
-    """Process all course subscriptions."""
-    for course_doc in DB.get_all_courses():
-        course_name = course_doc[COURSE_NAME]
-        users = list(course_doc[USER_LIST])
-        current_sem_year = Course.get_sem_year()
+async def search_courses(
+    search_client: SearchClient,
+    scheduler: PollScheduler,
+    snapshots: SnapshotStore,
+    partitions: frozenset[int] | None = None,
+    history: EnrollmentHistory | None = None,
+    courses: CourseList | None = None,
+) -> SweepStats:
+    """Process the course subscriptions that are due for polling.
 
-        # Remove courses with no subscribers
-        if not users:
-            DB.remove_course(Course(course_name, purge=True))
-            continue
+    Subscriptions are grouped by search URL so that each term/subject/catalog number
+    is fetched once, however many of its sections are subscribed. `scheduler` picks
+    which searches are due on this tick. Lookups run concurrently, bounded by
+    `POLL_CONCURRENCY`, and each poll is diffed against `snapshots`. Workers pass the
+    `partitions` they hold leases for; courses outside them are left alone. Polled
+    enrollment is buffered in `history` and written once per sweep. Subscriptions are
+    read into `courses`, which is reused across ticks until it is due for a refresh.
 
-        # Handle expired semester courses
-        if course_doc[SEM_YEAR] != current_sem_year:
-            course = Course(course_name, purge=True)
-            await handle_expired_semester(course, course_doc[SEM_YEAR], users)
-            continue
+    Only one sweep runs at a time, and a sweep stops starting lookups after
+    `SWEEP_BUDGET_SECONDS`; unfinished searches stay first in line for the next one.
+    """
+    if SWEEP_LOCK.locked():
+        return SweepStats(overlapped=True)
+
+    async with SWEEP_LOCK:
+        start = time.monotonic()
+        sweep = Sweep(
+            search_client,
+            scheduler,
+            snapshots,
+            EnrollmentHistory() if history is None else history,
+            CourseList() if courses is None else courses,
+            deadline=start + SWEEP_BUDGET_SECONDS,
+        )
+        try:
+            await run_sweep(sweep, partitions)
+        finally:
+            sweep.stats.duration = time.monotonic() - start
+            report_sweep(sweep)
+        return sweep.stats
+
+
+def report_sweep(sweep: Sweep) -> None:
+    """Logs incomplete sweeps; sweeps deferred by the breaker once per trip."""
+    global REPORTED_TRIP
+    stats = sweep.stats
+    if stats.breaker_open:
+        opened_until = sweep.search_client.breaker.opened_until
+        if opened_until != REPORTED_TRIP:
+            REPORTED_TRIP = opened_until
+            print(f"Class search unavailable, deferring due searches: {stats}")
+    elif stats.skipped or stats.carried_over:
+        print(f"Sweep incomplete: {stats}")
+
+
+async def run_sweep(sweep: Sweep, partitions: frozenset[int] | None) -> None:
+    if sweep.courses.stale(sweep.semester, partitions, time.monotonic()):
+        await refresh_courses(sweep, partitions)
+    searches = sweep.courses.searches
+
+    # Defer due searches until BU recovers instead of issuing doomed requests
+    if sweep.search_client.available:
+        results = await asyncio.gather(
+            *(
+                poll_search(sweep, search_url, searches[search_url])
+                for search_url in sweep.scheduler.pop_due()
+            ),
+            return_exceptions=True,
+        )
+    else:
+        sweep.stats.breaker_open = True
+        sweep.stats.skipped = sum(
+            len(searches[search_url]) for search_url in sweep.scheduler.peek_due()
+        )
+        results = []
+    await handle_transitions(sweep)
+    if sweep.intents:
+        await DB.enqueue_notifications(sweep.intents)
+    upserts, removed = sweep.snapshots.pop_changes()
+    if upserts or removed:
+        await DB.save_snapshots(upserts, removed)
+    await save_history(sweep.history)
+
+    # Surface the first failure to the error handler once every course has been polled
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
 
-        await process_course(Course(course_name), users)
 
+async def refresh_courses(sweep: Sweep, partitions: frozenset[int] | None) -> None:
+    """Reloads the subscribed courses and syncs the snapshots and scheduler to them."""
+    # Courses carry subscriber counts only; user lists are loaded for those notified.
+    # Past semesters' subscriptions are left to the rollover job.
+    searches: dict[str, list[tuple[Course, int]]] = defaultdict(list)
 
-async def handle_expired_semester(
-    course: Course, semester: str, users: list[str]
-) -> None:
-    """Handle courses from expired semesters."""
-    msg = (
-        f"You have been unsubscribed from {course} "
-        f"since the deadline to add courses for {semester} has passed."
+    async for course_doc in DB.stream_sweep_courses(sweep.semester):
+        course_name = course_doc[COURSE_NAME]
+        if partitions is not None and partition_of(course_name) not in partitions:
+            continue
+
+        course = Course(course_name)
+        searches[course.search_url].append((course, course_doc[SUBSCRIBERS]))
+
+    sweep.snapshots.retain(
+        str(course)
+        for subscriptions in searches.values()
+        for course, _ in subscriptions
+    )
+    sweep.scheduler.sync(
+        {
+            search_url: sum(count for _, count in subscriptions)
+            for search_url, subscriptions in searches.items()
+        }
     )
-    await notify_users_and_unsubscribe(course, msg, users)
+    sweep.courses.searches = dict(searches)
+    sweep.courses.semester = sweep.semester
+    sweep.courses.partitions = partitions
+    sweep.courses.refreshed_at = time.monotonic()
 
 
-async def process_course(course: Course, users: list[str]):
-    """Checks for edge cases and course availability. Handles notifications for each case."""
-    try:
-        course_response = course.get_course_section()
-    except ValueError as exc:
-        await notify_users_and_unsubscribe(course, str(exc), users)
+async def poll_search(
+    sweep: Sweep, search_url: str, subscriptions: list[tuple[Course, int]]
+):
+    """Fetches a search key once and handles transitions of its subscribed sections."""
+    async with sweep.semaphore:
+        remaining = sweep.deadline - time.monotonic()
+        try:
+            if remaining <= 0:
+                raise TimeoutError
+            async with asyncio.timeout(remaining):
+                # Cached results would read as unchanged and back the search off
+                sections = await sweep.search_client.get_sections(search_url, max_age=0)
+            # Samples are stamped when BU answered, not when they are processed
+            polled_at = pendulum.now()
+        except TimeoutError:
+            # Out of budget: keep this search's priority for the next sweep
+            sweep.scheduler.carry_over(search_url)
+            sweep.stats.carried_over += len(subscriptions)
+            return
+        except CircuitOpenError:
+            # Breaker opened mid-sweep; the scheduler retries this search later
+            sweep.stats.skipped += len(subscriptions)
+            return
+        except Exception:
+            sweep.stats.skipped += len(subscriptions)
+            raise
+
+    # Malformed sections (None) are left for the next poll instead of reported missing
+    polled = [
+        (course, sections.get(course.section))
+        for course, _ in subscriptions
+        if course.section not in sections or sections[course.section]
+    ]
+    for course, section in polled:
+        if section:
+            sweep.history.record(course, section, polled_at)
+
+    transitions = [
+        (event, sections)
+        for course, section in polled
+        if (event := sweep.snapshots.diff(course, section))
+    ]
+    sweep.scheduler.record(search_url, changed=bool(transitions))
+    sweep.stats.completed += len(subscriptions)
+    sweep.transitions += transitions
+
+
+async def save_history(history: EnrollmentHistory) -> None:
+    """Writes buffered enrollment samples; a failed write is retried next sweep."""
+    samples = history.pop_samples()
+    if not samples:
         return
+    try:
+        await DB.save_enrollment(samples)
+    except Exception as e:
+        history.restore(samples)
+        print(
+            f"Could not save {len(samples)} enrollment samples "
+            f"({history.dropped} dropped so far): {e}"
+        )
+
+
+async def handle_transitions(sweep: Sweep) -> None:
+    """Loads subscribers of the sections to notify in one query, then handles all."""
+    notified = [
+        str(event.course)
+        for event, _ in sweep.transitions
+        if event.kind in (Transition.OPENED, Transition.VANISHED)
+    ]
+    subscribers = await DB.get_subscribers(sweep.semester, notified) if notified else {}
+    for event, sections in sweep.transitions:
+        handle_transition(
+            sweep, event, sections, subscribers.get(str(event.course), {})
+        )
+
 
-    if course_response.enrollment_available > 0:
-        waitlist_cnt = course_response.wait_tot
+def handle_transition(
+    sweep: Sweep,
+    event: TransitionEvent,
+    sections: dict[str, CourseResponse | None],
+    users: dict[str, datetime | None],
+):
+    """Notifies subscribers when their section opens or vanishes; logs other moves."""
+    course = event.course
+    if event.kind == Transition.OPENED:
+        waitlist_cnt = event.current.wait_tot
         msg = (
             f"{course} is now available! (with {waitlist_cnt} students on the waitlist)"
         )
-        await notify_users_and_unsubscribe(course, msg, users)
+        queue_notifications(sweep, course, sweep.semester, event.kind, msg, users)
+    elif event.kind == Transition.VANISHED:
+        msg = course.not_found_msg(sections)
+        queue_notifications(sweep, course, sweep.semester, event.kind, msg, users)
+    else:
+        print(event)
 
 
-async def notify_users_and_unsubscribe(course: Course, msg: str, users: list[str]):
-    """Notifies each user on Telegram and unsubscribes them from the course."""
-    for uid in users:
-        await BOT.send_message(
-            chat_id=uid,
-            text=msg,
-            write_timeout=TimeConstants.TIMEOUT_SECONDS,
-        )
-        DB.unsubscribe(course, uid)
+def queue_notifications(
+    sweep: Sweep,
+    course: Course,
+    semester: str,
+    kind: str,
+    msg: str,
+    users: dict[str, datetime | None],
+):
+    """Queues a notification for each user; the outbox drain unsubscribes them."""
+    sweep.intents += make_intents(
+        course, semester, kind, msg, users, subscribed_at=users
+    )
 
 
-def init(context: ContextTypes.DEFAULT_TYPE):
+def setup(bot: Bot, db: AsyncDatabase):
     global BOT, DB
-    BOT = context.bot
-    DB = context.job.data["db"]
+    BOT = bot
+    DB = db
+
+
+def init(context: ContextTypes.DEFAULT_TYPE):
+    setup(context.bot, context.job.data["db"])
 
 
 async def run(context: ContextTypes.DEFAULT_TYPE):
     init(context)
-    await search_courses()
+    context.job.data["last_sweep"] = await search_courses(
+        context.bot_data[SEARCH_CLIENT],
+        context.job.data["scheduler"],
+        context.job.data["snapshots"],
+        history=context.job.data["history"],
+        courses=context.job.data["courses"],
+    )
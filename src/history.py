@@ -0,0 +1,93 @@
+"""Per-section enrollment samples from every poll, for tuning and latency analysis."""
+
+import os
+import sys
+from collections import deque
+from typing import Iterable
+
+import pendulum
+from dotenv import load_dotenv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.snapshots import AVAILABLE, WAITLIST
+from utils.constants import COURSE_NAME, POLLED_AT, SAMPLES
+from utils.models import Course, CourseResponse
+
+load_dotenv()
+
+# Samples held for the next write; the oldest are dropped while writes keep failing
+HISTORY_BUFFER_SIZE = int(os.getenv("HISTORY_BUFFER_SIZE", "10000"))
+
+# Fields of downsampled windows, next to the last AVAILABLE and WAITLIST seen in each
+AVAILABLE_MIN = "a_min"
+AVAILABLE_MAX = "a_max"
+WAITLIST_MIN = "w_min"
+WAITLIST_MAX = "w_max"
+
+
+class EnrollmentHistory:
+    """Enrollment samples polled since the last write to the history.
+
+    Sweeps record a sample per polled section and write them in one batch at the
+    end. Samples of a failed write go back in the buffer, which keeps at most
+    `limit` samples by dropping the oldest.
+    """
+
+    def __init__(self, limit: int = HISTORY_BUFFER_SIZE):
+        self.samples: deque[dict] = deque(maxlen=limit)
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def record(
+        self, course: Course, section: CourseResponse, now: pendulum.DateTime
+    ) -> None:
+        if len(self.samples) == self.samples.maxlen:
+            self.dropped += 1
+        self.samples.append(
+            {
+                COURSE_NAME: str(course),
+                POLLED_AT: now,
+                AVAILABLE: section.enrollment_available,
+                WAITLIST: section.wait_tot,
+            }
+        )
+
+    def pop_samples(self) -> list[dict]:
+        samples = list(self.samples)
+        self.samples.clear()
+        return samples
+
+    def restore(self, samples: list[dict]) -> None:
+        """Put back samples whose write failed, ahead of those recorded since."""
+        samples = samples + list(self.samples)
+        overflow = max(len(samples) - self.samples.maxlen, 0)
+        self.dropped += overflow
+        self.samples = deque(samples[overflow:], maxlen=self.samples.maxlen)
+
+
+def downsample(samples: Iterable[dict], window: int) -> list[dict]:
+    """Summarize time-ordered samples per `window` seconds, aligned to the epoch."""
+    windows: dict[int, dict] = {}
+    for sample in samples:
+        timestamp = int(sample[POLLED_AT].timestamp())
+        start = timestamp - timestamp % window
+        available, waitlist = sample[AVAILABLE], sample[WAITLIST]
+        if (summary := windows.get(start)) is None:
+            summary = windows[start] = {
+                POLLED_AT: pendulum.from_timestamp(start),
+                SAMPLES: 0,
+                AVAILABLE_MIN: available,
+                AVAILABLE_MAX: available,
+                WAITLIST_MIN: waitlist,
+                WAITLIST_MAX: waitlist,
+            }
+        summary[SAMPLES] += 1
+        summary[AVAILABLE] = available
+        summary[AVAILABLE_MIN] = min(summary[AVAILABLE_MIN], available)
+        summary[AVAILABLE_MAX] = max(summary[AVAILABLE_MAX], available)
+        summary[WAITLIST] = waitlist
+        summary[WAITLIST_MIN] = min(summary[WAITLIST_MIN], waitlist)
+        summary[WAITLIST_MAX] = max(summary[WAITLIST_MAX], waitlist)
+    return list(windows.values())
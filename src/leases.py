@@ -0,0 +1,107 @@
+"""Partition leases that shard course polling across worker processes."""
+
+import math
+import os
+import random
+import sys
+import threading
+import zlib
+
+import pendulum
+from dotenv import load_dotenv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.storage import Storage
+from utils.models import Course
+
+load_dotenv()
+
+POLL_PARTITIONS = int(os.getenv("POLL_PARTITIONS", "16"))
+LEASE_TTL_SECONDS = int(os.getenv("LEASE_TTL_SECONDS", "60"))
+# Leases are renewed this often while polling, so a slow cycle cannot outlive them
+LEASE_RENEW_SECONDS = float(
+    os.getenv("LEASE_RENEW_SECONDS", str(LEASE_TTL_SECONDS / 3))
+)
+
+
+def partition_of(course_name: str, partitions: int = POLL_PARTITIONS) -> int:
+    """Stable partition of a course, shared by all sections of the same search."""
+    course = Course(course_name, purge=True)
+    key = f"{course.college}{course.department}{course.number}"
+    return zlib.crc32(key.encode()) % partitions
+
+
+class LeaseManager:
+    """Holds this worker's fair share of partition leases.
+
+    Every `heartbeat` refreshes the worker's liveness, renews its leases and moves
+    towards `ceil(partitions / live workers)` leases: releasing extras when workers
+    join, and taking over expired leases when a worker stops heartbeating. Call it
+    between sweeps only, so a partition is never released while it is being polled.
+    In the meantime, `renew` keeps the leases held on a timer.
+    """
+
+    def __init__(
+        self,
+        db: Storage,
+        worker_id: str,
+        partitions: int = POLL_PARTITIONS,
+        ttl: int = LEASE_TTL_SECONDS,
+    ):
+        self.db = db
+        self.worker_id = worker_id
+        self.partitions = partitions
+        self.ttl = ttl
+        self.owned: frozenset[int] = frozenset()
+        # Renewals run on a timer and may overlap a rebalance
+        self._lock = threading.Lock()
+
+    def heartbeat(self) -> frozenset[int]:
+        """Renew and rebalance leases, returning the partitions this worker owns."""
+        with self._lock:
+            return self._rebalance()
+
+    def renew(self) -> frozenset[int]:
+        """Extend the leases this worker holds without rebalancing; safe mid-sweep."""
+        with self._lock:
+            now = pendulum.now()
+            self.db.heartbeat_worker(self.worker_id, now)
+            renewed = frozenset(
+                self.db.renew_leases(self.worker_id, now, now.add(seconds=self.ttl))
+            )
+            if lost := self.owned - renewed:
+                print(f"Worker {self.worker_id} lost leases {sorted(lost)}")
+            self.owned = renewed
+            return self.owned
+
+    def _rebalance(self) -> frozenset[int]:
+        now = pendulum.now()
+        expires_at = now.add(seconds=self.ttl)
+        self.db.heartbeat_worker(self.worker_id, now)
+
+        owned = set(self.db.renew_leases(self.worker_id, now, expires_at))
+        live_workers = self.db.count_live_workers(now.subtract(seconds=self.ttl))
+        target = math.ceil(self.partitions / max(live_workers, 1))
+
+        if len(owned) > target:
+            extras = sorted(owned)[target:]
+            self.db.release_leases(self.worker_id, extras)
+            owned.difference_update(extras)
+
+        candidates = [p for p in range(self.partitions) if p not in owned]
+        random.shuffle(candidates)
+        for partition in candidates:
+            if len(owned) >= target:
+                break
+            if self.db.acquire_lease(partition, self.worker_id, now, expires_at):
+                owned.add(partition)
+
+        self.owned = frozenset(owned)
+        return self.owned
+
+    def release(self) -> None:
+        """Give up all leases so other workers can take over immediately."""
+        with self._lock:
+            self.db.release_leases(self.worker_id, list(self.owned))
+            self.db.remove_worker(self.worker_id)
+            self.owned = frozenset()
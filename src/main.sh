@@ -11,13 +11,18 @@ cleanup() {
 
 trap cleanup SIGINT SIGTERM
 
+# In webhook mode the bot serves the FastAPI app itself, in the same event loop
+if [ -n "$WEBHOOK_URL" ]; then
+    exec python "$SCRIPT_DIR/bot.py" --webhook "$@"
+fi
+
 # Start the FastAPI server
 python -m fastapi run $SCRIPT_DIR/server.py &
 FASTAPI_PID=$!
 
 # Start the bot
 BOT_PROGRAM="$SCRIPT_DIR/bot.py"
-python $BOT_PROGRAM $1 &
+python $BOT_PROGRAM "$@" &
 BOT_PID=$!
 
 echo "FastAPI server (PID: $FASTAPI_PID) and Bot (PID: $BOT_PID) started"
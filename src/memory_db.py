@@ -0,0 +1,360 @@
+"""Storage engine holding every collection in process memory."""
+
+import os
+import sys
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Iterator, Optional
+
+import pendulum
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.history import downsample
+from src.storage import Storage, subscription_key
+from utils.constants import (
+    Environment,
+    NotificationStatus,
+    OWNER,
+    EXPIRES_AT,
+    STATUS,
+    ATTEMPTS,
+    AVAILABLE_AT,
+    CREATED_AT,
+    UPDATED_AT,
+    BROADCAST_ID,
+    COURSE_NAME,
+    SEM_YEAR,
+    SUBSCRIBERS,
+    UID,
+    USER_LIST,
+    LAST_SUBSCRIBED,
+    IS_SUBSCRIBED,
+    LAST_SUBSCRIPTION,
+    POLLED_AT,
+)
+from utils.models import Course
+
+
+class MemoryDatabase(Storage):
+    """Dicts behind a lock, for tests, offline load tests and throwaway runs.
+
+    Nothing outlives the process, so only pollers running in the bot process see
+    the same data. Reads return copies, as a database would.
+    """
+
+    def __init__(self, env: Environment):
+        self.env = env
+        self._lock = threading.RLock()
+        self.users: dict[str, dict] = {}
+        # Keyed by (user, course name, semester), in subscription order
+        self.subscriptions: dict[tuple[str, str, str], dict] = {}
+        self.snapshots: dict[str, dict] = {}
+        self.enrollment: list[dict] = []
+        self.workers: dict[str, pendulum.DateTime] = {}
+        self.leases: dict[int, dict] = {}
+        self.outbox: dict[str, dict] = {}
+        self.broadcasts: dict[str, dict] = {}
+
+    def _courses(self) -> dict[tuple[str, str], list[str]]:
+        courses = defaultdict(list)
+        for uid, course_name, semester in self.subscriptions:
+            courses[course_name, semester].append(uid)
+        return courses
+
+    def get_all_courses(self) -> Iterator[dict]:
+        with self._lock:
+            courses = self._courses()
+        for (course_name, semester), uids in courses.items():
+            yield {COURSE_NAME: course_name, SEM_YEAR: semester, USER_LIST: uids}
+
+    def get_sweep_courses(self, semester: str, batch_size: int = 0) -> Iterator[dict]:
+        with self._lock:
+            courses = self._courses()
+        for (course_name, sem), uids in courses.items():
+            if sem == semester:
+                yield {COURSE_NAME: course_name, SEM_YEAR: sem, SUBSCRIBERS: len(uids)}
+
+    def get_expired_courses(self, semester: str) -> list[dict]:
+        with self._lock:
+            return [
+                {COURSE_NAME: course_name, SEM_YEAR: sem, USER_LIST: uids}
+                for (course_name, sem), uids in self._courses().items()
+                if sem != semester
+            ]
+
+    def purge_expired(self, semester: str, uids: list[str]) -> None:
+        with self._lock:
+            self._delete_subscriptions(lambda _, __, sem: sem != semester)
+            for uid in set(uids) & self.users.keys():
+                self.users[uid][IS_SUBSCRIBED] = False
+
+    def get_subscribers(
+        self, semester: str, course_names: list[str]
+    ) -> dict[str, dict[str, datetime | None]]:
+        names = set(course_names)
+        subscribers: dict[str, dict[str, datetime | None]] = {}
+        with self._lock:
+            for (uid, course_name, sem), subscription in self.subscriptions.items():
+                if sem == semester and course_name in names:
+                    subscribers.setdefault(course_name, {})[uid] = subscription.get(
+                        CREATED_AT
+                    )
+        return subscribers
+
+    def get_user_course(self, uid: str) -> Optional[dict]:
+        with self._lock:
+            return next(
+                (dict(s) for key, s in self.subscriptions.items() if key[0] == uid),
+                None,
+            )
+
+    def subscribe(
+        self, course: Course, uid: str, subscription_time: pendulum.DateTime
+    ) -> None:
+        course_name, sem_year = str(course), Course.get_sem_year()
+        with self._lock:
+            self.subscriptions.setdefault(
+                (uid, course_name, sem_year),
+                {
+                    UID: uid,
+                    COURSE_NAME: course_name,
+                    SEM_YEAR: sem_year,
+                    CREATED_AT: subscription_time,
+                },
+            )
+            self.users.setdefault(uid, {UID: uid}).update(
+                {
+                    LAST_SUBSCRIBED: subscription_time,
+                    IS_SUBSCRIBED: True,
+                    LAST_SUBSCRIPTION: course_name,
+                }
+            )
+
+    def _delete_subscriptions(self, matches) -> None:
+        for key in [key for key in self.subscriptions if matches(*key)]:
+            del self.subscriptions[key]
+        subscribed = {course_name for _, course_name, _ in self.subscriptions}
+        for course_name in self.snapshots.keys() - subscribed:
+            del self.snapshots[course_name]
+
+    def unsubscribe(self, course: Course, uid: str) -> None:
+        course_name = str(course)
+        with self._lock:
+            self._delete_subscriptions(lambda u, c, _: u == uid and c == course_name)
+            self.users.setdefault(uid, {UID: uid}).update(
+                {IS_SUBSCRIBED: False, LAST_SUBSCRIPTION: course_name}
+            )
+
+    def get_user_subscriptions(self, uids: list[str]) -> list[dict]:
+        targets = set(uids)
+        with self._lock:
+            return [
+                dict(subscription)
+                for (uid, _, _), subscription in self.subscriptions.items()
+                if uid in targets
+            ]
+
+    def unsubscribe_many(self, subscriptions: list[dict]) -> list[str]:
+        targets = {subscription_key(subscription) for subscription in subscriptions}
+        with self._lock:
+            ended = {
+                key: subscription
+                for key, subscription in self.subscriptions.items()
+                if subscription_key(subscription) in targets
+            }
+            self._delete_subscriptions(lambda *key: key in ended)
+            for uid, course_name, _ in ended:
+                if user := self.users.get(uid):
+                    user.update({IS_SUBSCRIBED: False, LAST_SUBSCRIPTION: course_name})
+        return [uid for uid, _, _ in ended]
+
+    def prune_users(self, uids: list[str]) -> None:
+        targets = set(uids)
+        with self._lock:
+            self._delete_subscriptions(lambda u, *_: u in targets)
+            for uid in targets:
+                self.users.pop(uid, None)
+
+    def get_all_users(self) -> Iterator[dict]:
+        with self._lock:
+            users = [dict(user) for user in self.users.values()]
+        yield from users
+
+    def get_user(self, uid: str) -> Optional[dict]:
+        with self._lock:
+            user = self.users.get(uid)
+            return dict(user) if user else None
+
+    def update_subscription_time(self, uid: str, time: pendulum.DateTime) -> None:
+        with self._lock:
+            self.users.setdefault(uid, {UID: uid})[LAST_SUBSCRIBED] = time
+
+    def update_subscription_status(
+        self, uid: str, last_subscribed: str, is_subscribed: bool
+    ) -> None:
+        with self._lock:
+            self.users.setdefault(uid, {UID: uid}).update(
+                {IS_SUBSCRIBED: is_subscribed, LAST_SUBSCRIPTION: last_subscribed}
+            )
+
+    def get_snapshots(self) -> Iterator[dict]:
+        with self._lock:
+            snapshots = [dict(doc) for doc in self.snapshots.values()]
+        yield from snapshots
+
+    def save_snapshots(self, upserts: list[dict], removed: list[str]) -> None:
+        with self._lock:
+            for doc in upserts:
+                self.snapshots[doc["_id"]] = dict(doc)
+            for name in removed:
+                self.snapshots.pop(name, None)
+
+    def save_enrollment(self, samples: list[dict]) -> None:
+        with self._lock:
+            self.enrollment += map(dict, samples)
+
+    def get_enrollment_history(
+        self,
+        course_name: str,
+        start: pendulum.DateTime,
+        end: pendulum.DateTime,
+        window: int,
+    ) -> list[dict]:
+        with self._lock:
+            samples = [
+                sample
+                for sample in self.enrollment
+                if sample[COURSE_NAME] == course_name
+                and start <= sample[POLLED_AT] < end
+            ]
+        return downsample(sorted(samples, key=lambda s: s[POLLED_AT]), window)
+
+    def heartbeat_worker(self, worker_id: str, time: pendulum.DateTime) -> None:
+        with self._lock:
+            self.workers[worker_id] = time
+
+    def count_live_workers(self, since: pendulum.DateTime) -> int:
+        with self._lock:
+            return sum(heartbeat > since for heartbeat in self.workers.values())
+
+    def remove_worker(self, worker_id: str) -> None:
+        with self._lock:
+            self.workers.pop(worker_id, None)
+
+    def renew_leases(
+        self, worker_id: str, now: pendulum.DateTime, expires_at: pendulum.DateTime
+    ) -> list[int]:
+        with self._lock:
+            owned = [
+                partition
+                for partition, lease in self.leases.items()
+                if lease[OWNER] == worker_id and lease[EXPIRES_AT] > now
+            ]
+            for partition in owned:
+                self.leases[partition][EXPIRES_AT] = expires_at
+            return owned
+
+    def acquire_lease(
+        self,
+        partition: int,
+        worker_id: str,
+        now: pendulum.DateTime,
+        expires_at: pendulum.DateTime,
+    ) -> bool:
+        with self._lock:
+            lease = self.leases.get(partition)
+            if lease and lease[OWNER] is not None and lease[EXPIRES_AT] > now:
+                return False  # Held by a live worker
+            self.leases[partition] = {OWNER: worker_id, EXPIRES_AT: expires_at}
+            return True
+
+    def release_leases(self, worker_id: str, partitions: list[int]) -> None:
+        with self._lock:
+            for partition in partitions:
+                lease = self.leases.get(partition)
+                if lease and lease[OWNER] == worker_id:
+                    lease[OWNER] = None
+
+    def enqueue_notifications(self, intents: list[dict]) -> int:
+        with self._lock:
+            queued = 0
+            for intent in intents:
+                if intent["_id"] not in self.outbox:
+                    self.outbox[intent["_id"]] = dict(intent)
+                    queued += 1
+            return queued
+
+    def claim_notifications(
+        self,
+        owner: str,
+        now: pendulum.DateTime,
+        expires_at: pendulum.DateTime,
+        limit: int,
+    ) -> list[dict]:
+        with self._lock:
+            claimable = sorted(
+                (
+                    doc
+                    for doc in self.outbox.values()
+                    if doc[STATUS] == NotificationStatus.PENDING
+                    and doc[AVAILABLE_AT] <= now
+                    and (doc.get(EXPIRES_AT) is None or doc[EXPIRES_AT] <= now)
+                ),
+                key=lambda doc: doc[AVAILABLE_AT],
+            )[:limit]
+            for doc in claimable:
+                doc.update({OWNER: owner, EXPIRES_AT: expires_at})
+            return [dict(doc) for doc in claimable]
+
+    def settle_notifications(
+        self,
+        delivered: list[str],
+        retries: dict[str, pendulum.DateTime],
+        failed: list[str],
+        now: pendulum.DateTime,
+    ) -> None:
+        with self._lock:
+            updates = [
+                (key, {STATUS: NotificationStatus.DELIVERED}, 0) for key in delivered
+            ]
+            updates += [(key, {STATUS: NotificationStatus.FAILED}, 1) for key in failed]
+            updates += [
+                (key, {AVAILABLE_AT: available_at}, 1)
+                for key, available_at in retries.items()
+            ]
+            for key, fields, attempts in updates:
+                if (doc := self.outbox.get(key)) is None:
+                    continue
+                doc.update(fields, **{UPDATED_AT: now})
+                doc[ATTEMPTS] = doc.get(ATTEMPTS, 0) + attempts
+                doc.pop(OWNER, None)
+                doc.pop(EXPIRES_AT, None)
+
+    def purge_notifications(self, before: pendulum.DateTime) -> None:
+        with self._lock:
+            for key in [
+                key
+                for key, doc in self.outbox.items()
+                if doc[STATUS] != NotificationStatus.PENDING
+                and doc.get(UPDATED_AT) is not None
+                and doc[UPDATED_AT] < before
+            ]:
+                del self.outbox[key]
+
+    def get_broadcast_recipients(self, broadcast_id: str) -> set[str]:
+        with self._lock:
+            return {
+                doc[UID]
+                for doc in self.broadcasts.values()
+                if doc[BROADCAST_ID] == broadcast_id
+                and doc[STATUS] == NotificationStatus.DELIVERED
+            }
+
+    def save_broadcast_outcomes(self, broadcast_id: str, outcomes: list[dict]) -> None:
+        with self._lock:
+            for outcome in outcomes:
+                self.broadcasts[f"{broadcast_id}:{outcome[UID]}"] = {
+                    BROADCAST_ID: broadcast_id,
+                    **outcome,
+                }
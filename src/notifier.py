@@ -0,0 +1,160 @@
+"""Concurrent, rate-limited delivery of a message to many Telegram chats."""
+
+import asyncio
+import math
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, TypeVar
+
+from dotenv import load_dotenv
+from telegram import Bot, Message
+from telegram.error import BadRequest, Forbidden, RetryAfter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.constants import TimeConstants
+from utils.throttle import TokenBucket
+
+load_dotenv()
+
+# Telegram allows ~30 messages per second overall and ~1 per second per chat
+NOTIFY_RATE_LIMIT = float(os.getenv("NOTIFY_RATE_LIMIT", "25"))
+NOTIFY_BURST = float(os.getenv("NOTIFY_BURST", "25"))
+NOTIFY_CHAT_INTERVAL_SECONDS = float(os.getenv("NOTIFY_CHAT_INTERVAL_SECONDS", "1"))
+NOTIFY_MAX_RETRIES = int(os.getenv("NOTIFY_MAX_RETRIES", "3"))
+
+T = TypeVar("T")
+
+# BadRequest messages that mean the chat is gone rather than the request is wrong
+DEAD_CHAT_ERRORS = ("chat not found", "user not found", "peer_id_invalid")
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile of `values`, for `q` in [0, 100]."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(q / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def is_dead_chat(exc: BaseException) -> bool:
+    """Whether a send failed because the chat will never accept messages again.
+
+    Covers users who blocked the bot or deleted their account (`Forbidden`) and
+    chats Telegram no longer knows. Anything else may succeed on a retry.
+    """
+    if isinstance(exc, Forbidden):
+        return True
+    return isinstance(exc, BadRequest) and any(
+        error in exc.message.lower() for error in DEAD_CHAT_ERRORS
+    )
+
+
+@dataclass
+class FanOutReport:
+    """Per-chat outcome of a fan-out and how long each delivery took."""
+
+    sent: list[str] = field(default_factory=list)
+    failed: dict[str, Exception] = field(default_factory=dict)
+    latencies: list[float] = field(default_factory=list)
+
+    @property
+    def dead(self) -> list[str]:
+        """Chats that failed permanently and should be pruned."""
+        return [chat_id for chat_id, e in self.failed.items() if is_dead_chat(e)]
+
+    def __str__(self) -> str:
+        total = len(self.sent) + len(self.failed)
+        p50, p90, p99 = (percentile(self.latencies, q) for q in (50, 90, 99))
+        return (
+            f"{len(self.sent)}/{total} delivered, latency "
+            f"p50={p50:.2f}s p90={p90:.2f}s p99={p99:.2f}s"
+        )
+
+
+class Notifier:
+    """Sends a message to many chats at once within Telegram's flood limits.
+
+    Sends share a global token bucket and are spaced per chat. A `RetryAfter` from
+    Telegram pauses every send for the requested time before the chat is retried,
+    up to `max_retries` times.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        rate: float = NOTIFY_RATE_LIMIT,
+        burst: float = NOTIFY_BURST,
+        chat_interval: float = NOTIFY_CHAT_INTERVAL_SECONDS,
+        max_retries: int = NOTIFY_MAX_RETRIES,
+    ):
+        self.bot = bot
+        self.chat_interval = chat_interval
+        self.max_retries = max_retries
+        self._bucket = TokenBucket(rate, burst)
+        self._next_chat_send: dict[str, float] = {}
+        self._paused_until = 0.0
+
+    async def fan_out(self, chat_ids: list[str], text: str) -> FanOutReport:
+        """Send `text` to every chat concurrently and report per-chat outcomes."""
+        start = time.monotonic()
+        self._next_chat_send = {
+            chat_id: t for chat_id, t in self._next_chat_send.items() if t > start
+        }
+        report = FanOutReport()
+
+        async def deliver(chat_id: str):
+            try:
+                await self.send(chat_id, text)
+            except Exception as e:
+                report.failed[chat_id] = e
+            else:
+                report.sent.append(chat_id)
+                report.latencies.append(time.monotonic() - start)
+
+        await asyncio.gather(*(deliver(chat_id) for chat_id in chat_ids))
+        return report
+
+    async def send(self, chat_id: str, text: str, **kwargs) -> Message:
+        """Send a single message, waiting out rate limits and flood control."""
+        return await self.call(
+            chat_id,
+            lambda: self.bot.send_message(
+                chat_id=chat_id,
+                text=text,
+                write_timeout=TimeConstants.TIMEOUT_SECONDS,
+                **kwargs,
+            ),
+        )
+
+    async def pin(self, message: Message) -> bool:
+        """Pin a sent message, counting against the same limits as sends."""
+        return await self.call(str(message.chat_id), message.pin)
+
+    async def call(self, chat_id: str, request: Callable[[], Awaitable[T]]) -> T:
+        """Run a Bot API request on `chat_id` within the rate limits."""
+        for attempt in range(self.max_retries + 1):
+            await self._wait_turn(chat_id)
+            try:
+                return await request()
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                # Flood control applies to the whole bot, so hold back every send
+                self._paused_until = max(
+                    self._paused_until, time.monotonic() + e.retry_after
+                )
+
+    async def _wait_turn(self, chat_id: str) -> None:
+        while (pause := self._paused_until - time.monotonic()) > 0:
+            await asyncio.sleep(pause)
+
+        # Reserve this chat's next slot before sleeping so concurrent sends queue up
+        now = time.monotonic()
+        slot = max(now, self._next_chat_send.get(chat_id, 0.0))
+        self._next_chat_send[chat_id] = slot + self.chat_interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+        await self._bucket.acquire()
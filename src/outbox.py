@@ -0,0 +1,262 @@
+"""Durable notification outbox between the pollers and Telegram delivery.
+
+Pollers queue a notification intent per subscriber instead of messaging them
+directly. Intents are keyed by subscription and kind, so a poll that is repeated
+after a crash queues nothing new, while a user who resubscribes is notified
+again. Drains claim due intents in batches, drop those whose subscription has
+since ended, deliver the rest, end the subscriptions of the users reached and only
+then mark the intents delivered. A drain that dies mid-batch leaves its claims to
+expire, and another drain picks them up.
+"""
+
+import asyncio
+import os
+import sys
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable
+
+import pendulum
+from dotenv import load_dotenv
+from telegram.ext import ContextTypes
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.db import AsyncDatabase
+from src.notifier import Notifier
+from src.storage import subscription_key
+from utils.constants import (
+    NotificationStatus,
+    UID,
+    COURSE_NAME,
+    SEM_YEAR,
+    TEXT,
+    STATUS,
+    ATTEMPTS,
+    AVAILABLE_AT,
+    CREATED_AT,
+    SUBSCRIBED_AT,
+    ENDS_SUBSCRIPTION,
+)
+from utils.models import Course
+from utils.throttle import jittered_backoff
+
+load_dotenv()
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "200"))
+OUTBOX_DRAIN_SECONDS = float(os.getenv("OUTBOX_DRAIN_SECONDS", "1"))
+OUTBOX_CLAIM_SECONDS = int(os.getenv("OUTBOX_CLAIM_SECONDS", "60"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_RETRY_BASE_SECONDS = int(os.getenv("OUTBOX_RETRY_BASE_SECONDS", "5"))
+OUTBOX_RETRY_MAX_SECONDS = int(os.getenv("OUTBOX_RETRY_MAX_SECONDS", "600"))
+# Settled intents are kept this long to absorb re-detections of the same event
+OUTBOX_RETENTION_SECONDS = int(os.getenv("OUTBOX_RETENTION_SECONDS", "300"))
+
+
+def notification_key(
+    uid: str,
+    course: Course,
+    semester: str,
+    kind: str,
+    subscribed_at: datetime | None = None,
+) -> str:
+    """Idempotency key of a notification: one per subscription and kind.
+
+    A resubscription starts a new subscription with a new `subscribed_at`, so it is
+    not mistaken for a re-detection while the last notification is retained.
+    """
+    key = f"{uid}:{course}:{semester}:{kind}"
+    return key if subscribed_at is None else f"{key}:{subscribed_at.isoformat()}"
+
+
+def make_intents(
+    course: Course,
+    semester: str,
+    kind: str,
+    text: str,
+    users: Iterable[str],
+    now: pendulum.DateTime | None = None,
+    subscribed_at: dict[str, datetime | None] | None = None,
+    ends_subscription: bool = True,
+) -> list[dict]:
+    """Outbox documents notifying each of `users` about `course`.
+
+    `subscribed_at` maps users to when they subscribed, as `get_subscribers` returns.
+    Intents that end their subscription are dropped if it ends before delivery, and
+    delivering them unsubscribes the user from it.
+    """
+    now = now or pendulum.now()
+    subscribed_at = subscribed_at or {}
+    return [
+        {
+            "_id": notification_key(
+                uid, course, semester, kind, subscribed_at.get(uid)
+            ),
+            UID: uid,
+            COURSE_NAME: str(course),
+            SEM_YEAR: semester,
+            SUBSCRIBED_AT: subscribed_at.get(uid),
+            ENDS_SUBSCRIPTION: ends_subscription,
+            TEXT: text,
+            STATUS: NotificationStatus.PENDING,
+            ATTEMPTS: 0,
+            AVAILABLE_AT: now,
+            CREATED_AT: now,
+        }
+        for uid in users
+    ]
+
+
+def subscription_of(intent: dict) -> dict:
+    """The subscription an intent was queued for, as stored in the subscriptions"""
+    return {
+        UID: intent[UID],
+        COURSE_NAME: intent[COURSE_NAME],
+        SEM_YEAR: intent[SEM_YEAR],
+        CREATED_AT: intent.get(SUBSCRIBED_AT),
+    }
+
+
+@dataclass
+class DrainStats:
+    delivered: int = 0
+    retried: int = 0
+    failed: int = 0
+    pruned: int = 0
+    dropped: int = 0
+
+
+class OutboxDrainer:
+    """Delivers queued notifications in claimed batches.
+
+    Notifications whose subscription ended while they were queued are dropped
+    unsent. Users whose chat is gone (blocked the bot, deleted their account) are
+    pruned from every course and the users collection in one go. Other failures are
+    retried with jittered exponential backoff and marked failed after
+    `max_attempts`; their users stay subscribed.
+    """
+
+    def __init__(
+        self,
+        db: AsyncDatabase,
+        notifier: Notifier,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        claim_ttl: int = OUTBOX_CLAIM_SECONDS,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+        retry_base: int = OUTBOX_RETRY_BASE_SECONDS,
+        retry_max: int = OUTBOX_RETRY_MAX_SECONDS,
+        retention: int = OUTBOX_RETENTION_SECONDS,
+    ):
+        self.db = db
+        self.notifier = notifier
+        self.batch_size = batch_size
+        self.claim_ttl = claim_ttl
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.retention = retention
+        self._lock = asyncio.Lock()
+        self._last_purge = 0.0
+
+    async def drain(self) -> DrainStats:
+        """Deliver due notifications until none are left; skips if already draining."""
+        stats = DrainStats()
+        if self._lock.locked():
+            return stats
+
+        async with self._lock:
+            while True:
+                now = pendulum.now()
+                batch = await self.db.claim_notifications(
+                    uuid.uuid4().hex,
+                    now,
+                    now.add(seconds=self.claim_ttl),
+                    self.batch_size,
+                )
+                if batch:
+                    await self._deliver(batch, stats)
+                if len(batch) < self.batch_size:
+                    break
+
+            if time.monotonic() - self._last_purge >= self.retention:
+                await self.db.purge_notifications(
+                    pendulum.now().subtract(seconds=self.retention)
+                )
+                self._last_purge = time.monotonic()
+        return stats
+
+    async def _drop_ended(self, batch: list[dict]) -> tuple[list[dict], list[str]]:
+        """Split off intents whose subscription no longer exists"""
+        ending = [intent for intent in batch if intent.get(ENDS_SUBSCRIPTION)]
+        if not ending:
+            return batch, []
+        live = {
+            subscription_key(subscription)
+            for subscription in await self.db.get_user_subscriptions(
+                sorted({intent[UID] for intent in ending})
+            )
+        }
+        dropped = {
+            intent["_id"]
+            for intent in ending
+            if subscription_key(subscription_of(intent)) not in live
+        }
+        for key in sorted(dropped):
+            print(f"Dropping {key}: its subscription has ended")
+        kept = [intent for intent in batch if intent["_id"] not in dropped]
+        return kept, sorted(dropped)
+
+    async def _deliver(self, batch: list[dict], stats: DrainStats) -> None:
+        batch, dropped = await self._drop_ended(batch)
+        groups: dict[tuple[str, str], list[dict]] = defaultdict(list)
+        for intent in batch:
+            groups[intent[COURSE_NAME], intent[TEXT]].append(intent)
+
+        reports = await asyncio.gather(
+            *(
+                self.notifier.fan_out([intent[UID] for intent in intents], text)
+                for (_, text), intents in groups.items()
+            )
+        )
+
+        now = pendulum.now()
+        delivered, failed, retries, dead = [], list(dropped), {}, set()
+        for ((course_name, _), intents), report in zip(groups.items(), reports):
+            print(f"Notified subscribers of {course_name}: {report}")
+            # Unsubscribe before settling, so a crash in between re-sends rather than
+            # leaving a notified user subscribed
+            sent = set(report.sent)
+            await self.db.unsubscribe_many(
+                [
+                    subscription_of(intent)
+                    for intent in intents
+                    if intent.get(ENDS_SUBSCRIPTION) and intent[UID] in sent
+                ]
+            )
+            dead.update(report.dead)
+            for intent in intents:
+                uid = intent[UID]
+                if uid not in report.failed:
+                    delivered.append(intent["_id"])
+                elif uid in dead or intent[ATTEMPTS] + 1 >= self.max_attempts:
+                    print(f"Giving up on {intent['_id']}: {report.failed[uid]}")
+                    failed.append(intent["_id"])
+                else:
+                    backoff = jittered_backoff(
+                        intent[ATTEMPTS], self.retry_base, self.retry_max
+                    )
+                    retries[intent["_id"]] = now.add(seconds=backoff)
+
+        await self.db.prune_users(list(dead))
+        await self.db.settle_notifications(delivered, retries, failed, now)
+        stats.delivered += len(delivered)
+        stats.retried += len(retries)
+        stats.failed += len(failed) - len(dropped)
+        stats.pruned += len(dead)
+        stats.dropped += len(dropped)
+
+
+async def run(context: ContextTypes.DEFAULT_TYPE):
+    await context.job.data["drainer"].drain()
@@ -0,0 +1,84 @@
+"""Once-per-semester cleanup of subscriptions to past semesters' courses.
+
+`Course.get_sem_year` moves on once a semester's add deadline passes. The first
+check after that finds every stale subscription with one query on the semester
+index, queues an "expired" notice to each subscriber through the outbox and
+deletes the stale subscriptions in one write. Sweeps only read the current
+semester, so they never pay for expired data.
+"""
+
+import os
+import sys
+
+from dotenv import load_dotenv
+from telegram.ext import ContextTypes
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.db import AsyncDatabase
+from src.outbox import make_intents
+from utils.constants import COURSE_NAME, SEM_YEAR, USER_LIST
+from utils.models import Course
+
+load_dotenv()
+
+# How often to check whether the semester has changed; checks are free otherwise
+ROLLOVER_CHECK_SECONDS = int(os.getenv("ROLLOVER_CHECK_SECONDS", "3600"))
+
+
+def expired_msg(course: Course, semester: str) -> str:
+    return (
+        f"You have been unsubscribed from {course} "
+        f"since the deadline to add courses for {semester} has passed."
+    )
+
+
+class SemesterRollover:
+    """Rolls subscriptions over to the current semester when it changes.
+
+    The first check after startup always rolls over, which finds nothing to do
+    unless the process was down at the boundary. Notices are keyed per semester in
+    the outbox, so rolling over twice queues nothing new.
+    """
+
+    def __init__(self, db: AsyncDatabase):
+        self.db = db
+        # Semester last rolled over into
+        self.semester: str | None = None
+
+    async def check(self) -> int:
+        """Roll over if the semester changed since the last check; returns notices queued."""
+        semester = Course.get_sem_year()
+        if semester == self.semester:
+            return 0
+        queued = await self.rollover(semester)
+        self.semester = semester
+        return queued
+
+    async def rollover(self, semester: str) -> int:
+        intents, uids = [], set()
+        for course_doc in await self.db.get_expired_courses(semester):
+            course = Course(course_doc[COURSE_NAME], purge=True)
+            intents += make_intents(
+                course,
+                course_doc[SEM_YEAR],
+                "expired",
+                expired_msg(course, course_doc[SEM_YEAR]),
+                course_doc[USER_LIST],
+                # Already ended by purge_expired below
+                ends_subscription=False,
+            )
+            uids.update(course_doc[USER_LIST])
+
+        # Queue before purging, so a crash in between re-queues rather than loses them
+        queued = await self.db.enqueue_notifications(intents)
+        await self.db.purge_expired(semester, sorted(uids))
+        if intents:
+            print(
+                f"Rolled over to {semester}: {queued} notices queued, "
+                f"{len(uids)} users unsubscribed"
+            )
+        return queued
+
+
+async def run(context: ContextTypes.DEFAULT_TYPE):
+    await context.job.data["rollover"].check()
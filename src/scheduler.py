@@ -0,0 +1,145 @@
+"""Adaptive polling schedule for class searches."""
+
+import heapq
+import math
+import os
+import time
+from dataclasses import dataclass
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+POLL_MIN_INTERVAL_SECONDS = float(os.getenv("POLL_MIN_INTERVAL_SECONDS", "5"))
+POLL_BASE_INTERVAL_SECONDS = float(os.getenv("POLL_BASE_INTERVAL_SECONDS", "60"))
+POLL_MAX_INTERVAL_SECONDS = float(os.getenv("POLL_MAX_INTERVAL_SECONDS", "600"))
+
+# Multiplicative factors applied to a search's interval after each poll
+SPEEDUP_FACTOR = 0.5
+BACKOFF_FACTOR = 1.25
+
+
+@dataclass
+class PollState:
+    """Polling history of a single search URL."""
+
+    interval: float
+    next_poll: float
+    subscribers: int = 0
+    # When the search last became due, kept so unfinished polls keep their priority
+    due_at: float = 0.0
+
+
+class PollScheduler:
+    """Priority queue of search URLs keyed by their next poll time.
+
+    Each search's interval halves when a poll sees its subscribed sections' seat or
+    waitlist counts move and backs off when it does not, and is shortened further for
+    searches with many subscribers. Polls are also metered against a budget of
+    one poll per search every `base_interval` seconds, so hot searches borrow
+    polls from dormant ones instead of increasing the total request volume.
+    """
+
+    def __init__(
+        self,
+        min_interval: float = POLL_MIN_INTERVAL_SECONDS,
+        base_interval: float = POLL_BASE_INTERVAL_SECONDS,
+        max_interval: float = POLL_MAX_INTERVAL_SECONDS,
+    ):
+        self.min_interval = min_interval
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self.states: dict[str, PollState] = {}
+        self._queue: list[tuple[float, str]] = []
+        self._allowance = 0.0
+        self._last_refill: float | None = None
+
+    def __len__(self) -> int:
+        return len(self.states)
+
+    def sync(self, subscribers: dict[str, int], now: float | None = None) -> None:
+        """Track the given search URLs and their subscriber counts.
+
+        New searches are due immediately; searches no longer subscribed are dropped.
+        """
+        now = time.monotonic() if now is None else now
+        for search_url in self.states.keys() - subscribers.keys():
+            del self.states[search_url]
+
+        for search_url, count in subscribers.items():
+            if state := self.states.get(search_url):
+                state.subscribers = count
+                continue
+            self.states[search_url] = PollState(
+                interval=self.base_interval, next_poll=now, subscribers=count
+            )
+            heapq.heappush(self._queue, (now, search_url))
+            self._allowance += 1
+
+    def pop_due(self, now: float | None = None) -> list[str]:
+        """Return the search URLs due for polling, most overdue first, within budget.
+
+        Returned searches are provisionally rescheduled one interval ahead, so a
+        failed poll is simply retried later.
+        """
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+
+        due = []
+        while self._queue:
+            next_poll, search_url = self._queue[0]
+            state = self.states.get(search_url)
+            if state is None or state.next_poll != next_poll:
+                heapq.heappop(
+                    self._queue
+                )  # Stale entry of a dropped/rescheduled search
+                continue
+            if next_poll > now or self._allowance < 1:
+                break
+            heapq.heappop(self._queue)
+            due.append(search_url)
+            self._allowance -= 1
+            state.due_at = next_poll
+            self._schedule(search_url, state, now)
+        return due
+
+    def peek_due(self, now: float | None = None) -> list[str]:
+        """Return the search URLs due for polling, without popping them or the budget."""
+        now = time.monotonic() if now is None else now
+        return [url for url, state in self.states.items() if state.next_poll <= now]
+
+    def carry_over(self, search_url: str) -> None:
+        """Return a popped but unpolled search to the queue at its original due time."""
+        if state := self.states.get(search_url):
+            state.next_poll = state.due_at
+            heapq.heappush(self._queue, (state.next_poll, search_url))
+            self._allowance += 1
+
+    def record(self, search_url: str, changed: bool, now: float | None = None) -> None:
+        """Adapt a search's interval to whether its sections changed since last poll."""
+        state = self.states.get(search_url)
+        if state is None:
+            return
+
+        now = time.monotonic() if now is None else now
+        if changed:
+            state.interval = max(self.min_interval, state.interval * SPEEDUP_FACTOR)
+        else:
+            state.interval = min(self.max_interval, state.interval * BACKOFF_FACTOR)
+        self._schedule(search_url, state, now)
+
+    def delay(self, state: PollState) -> float:
+        """Seconds until the next poll, shortened logarithmically by subscriber count."""
+        delay = state.interval / (1 + math.log2(max(state.subscribers, 1)))
+        return min(self.max_interval, max(self.min_interval, delay))
+
+    def _schedule(self, search_url: str, state: PollState, now: float) -> None:
+        state.next_poll = now + self.delay(state)
+        heapq.heappush(self._queue, (state.next_poll, search_url))
+
+    def _refill(self, now: float) -> None:
+        if self._last_refill is not None:
+            elapsed = now - self._last_refill
+            self._allowance += len(self.states) * elapsed / self.base_interval
+        self._allowance = min(self._allowance, max(len(self.states), 1))
+        self._last_refill = now
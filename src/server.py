@@ -1,8 +1,79 @@
-from fastapi import FastAPI
+import os
+from contextlib import asynccontextmanager
 
-app = FastAPI()
+import uvicorn
+from dotenv import load_dotenv
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+from telegram import Update
+from telegram.ext import Application
+
+load_dotenv()
+
+# Public base URL Telegram posts updates to, e.g. https://alert.example.com
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_PATH = "/telegram"
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+SERVER_PORT = int(os.getenv("PORT", "8000"))
+
+# Bot application served in webhook mode, set by `serve`
+APPLICATION: Application | None = None
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """Run the bot application alongside the server, as `run_polling` would."""
+    if APPLICATION is None:
+        yield
+        return
+
+    await APPLICATION.initialize()
+    if APPLICATION.post_init:
+        await APPLICATION.post_init(APPLICATION)
+    await APPLICATION.bot.set_webhook(
+        url=f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=Update.ALL_TYPES,
+    )
+    await APPLICATION.start()
+    try:
+        yield
+    finally:
+        await APPLICATION.stop()
+        if APPLICATION.post_stop:
+            await APPLICATION.post_stop(APPLICATION)
+        await APPLICATION.shutdown()
+        if APPLICATION.post_shutdown:
+            await APPLICATION.post_shutdown(APPLICATION)
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 @app.get("/")
 def read_root():
     return {"Hello": "World"}
+
+
+@app.post(WEBHOOK_PATH)
+async def telegram_webhook(
+    request: Request,
+    x_telegram_bot_api_secret_token: str | None = Header(default=None),
+):
+    """Hand a Telegram update to the bot application's update queue"""
+    if APPLICATION is None:
+        raise HTTPException(status_code=404)
+    if WEBHOOK_SECRET and x_telegram_bot_api_secret_token != WEBHOOK_SECRET:
+        raise HTTPException(status_code=403)
+
+    update = Update.de_json(await request.json(), APPLICATION.bot)
+    await APPLICATION.update_queue.put(update)
+    return Response(status_code=200)
+
+
+def serve(application: Application) -> None:
+    """Serve the webhook and run `application` in the server's event loop"""
+    global APPLICATION
+    if not WEBHOOK_URL:
+        raise ValueError("WEBHOOK_URL must be set to run the bot in webhook mode")
+    APPLICATION = application
+    uvicorn.run(app, host="0.0.0.0", port=SERVER_PORT)
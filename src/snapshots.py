@@ -0,0 +1,139 @@
+"""Per-section enrollment snapshots and the transitions between them."""
+
+import os
+import sys
+import time
+from dataclasses import dataclass
+from enum import StrEnum
+from typing import Iterable
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.models import Course, CourseResponse
+
+# Compact field names of persisted snapshot documents, keyed by course name
+AVAILABLE = "a"
+WAITLIST = "w"
+TIMESTAMP = "t"
+
+
+class Transition(StrEnum):
+    OPENED = "opened"
+    CLOSED = "closed"
+    SEATS_CHANGED = "seats_changed"
+    WAITLIST_CHANGED = "waitlist_changed"
+    VANISHED = "vanished"
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """Enrollment state of a section and when it was first observed."""
+
+    enrollment_available: int
+    wait_tot: int
+    timestamp: int
+
+    @property
+    def is_open(self) -> bool:
+        return self.enrollment_available > 0
+
+    @property
+    def counts(self) -> tuple[int, int]:
+        return self.enrollment_available, self.wait_tot
+
+
+@dataclass(frozen=True)
+class TransitionEvent:
+    course: Course
+    kind: Transition
+    previous: Snapshot | None
+    current: Snapshot | None
+
+    def __str__(self) -> str:
+        return f"{self.course}: {self.kind} ({self.previous} -> {self.current})"
+
+
+class SnapshotStore:
+    """Last seen enrollment state of every subscribed section.
+
+    `diff` compares a poll against the stored snapshot and returns the transition,
+    if any. OPENED and VANISHED consume the snapshot, because their subscribers are
+    notified and unsubscribed: a later subscriber to the same section then sees the
+    section open (or missing) as a fresh transition.
+    """
+
+    def __init__(self, documents: Iterable[dict] = ()):
+        self.snapshots = {
+            doc["_id"]: Snapshot(doc[AVAILABLE], doc[WAITLIST], doc[TIMESTAMP])
+            for doc in documents
+        }
+        self._dirty: set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self.snapshots)
+
+    def diff(
+        self, course: Course, section: CourseResponse | None, now: int | None = None
+    ) -> TransitionEvent | None:
+        """Record a poll of `course` and return its transition since the last poll."""
+        name = str(course)
+        previous = self.snapshots.get(name)
+
+        if section is None:
+            self._forget(name)
+            return TransitionEvent(course, Transition.VANISHED, previous, None)
+
+        current = Snapshot(
+            section.enrollment_available,
+            section.wait_tot,
+            int(time.time()) if now is None else now,
+        )
+        if current.is_open and not (previous and previous.is_open):
+            self._forget(name)
+            return TransitionEvent(course, Transition.OPENED, previous, current)
+
+        if previous and previous.counts == current.counts:
+            return None
+
+        self.snapshots[name] = current
+        self._dirty.add(name)
+        if previous is None:
+            return None
+        if previous.is_open and not current.is_open:
+            kind = Transition.CLOSED
+        elif previous.enrollment_available != current.enrollment_available:
+            kind = Transition.SEATS_CHANGED
+        else:
+            kind = Transition.WAITLIST_CHANGED
+        return TransitionEvent(course, kind, previous, current)
+
+    def retain(self, course_names: Iterable[str]) -> None:
+        """Evict in-memory snapshots of sections this poller no longer tracks.
+
+        Persisted snapshots are left alone: they may belong to another worker's
+        partitions, and are deleted along with their section's last subscription.
+        """
+        for name in self.snapshots.keys() - set(course_names):
+            del self.snapshots[name]
+            self._dirty.discard(name)
+
+    def pop_changes(self) -> tuple[list[dict], list[str]]:
+        """Return snapshot documents to upsert and names to delete since last call."""
+        upserts, removed = [], []
+        for name in self._dirty:
+            if snapshot := self.snapshots.get(name):
+                upserts.append(
+                    {
+                        "_id": name,
+                        AVAILABLE: snapshot.enrollment_available,
+                        WAITLIST: snapshot.wait_tot,
+                        TIMESTAMP: snapshot.timestamp,
+                    }
+                )
+            else:
+                removed.append(name)
+        self._dirty.clear()
+        return upserts, removed
+
+    def _forget(self, name: str) -> None:
+        if self.snapshots.pop(name, None) is not None:
+            self._dirty.add(name)
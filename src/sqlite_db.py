@@ -0,0 +1,538 @@
+"""Storage engine on an embedded SQLite file, for single-node deployments."""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator, Optional
+
+import pendulum
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.history import downsample
+from src.snapshots import AVAILABLE, WAITLIST
+from src.storage import Storage, subscription_key
+from utils.constants import (
+    Environment,
+    NotificationStatus,
+    EXPIRES_AT,
+    HEARTBEAT,
+    AVAILABLE_AT,
+    CREATED_AT,
+    SUBSCRIBED_AT,
+    ENDS_SUBSCRIPTION,
+    UPDATED_AT,
+    BROADCAST_ID,
+    COURSE_NAME,
+    SEM_YEAR,
+    UID,
+    USER_LIST,
+    LAST_SUBSCRIBED,
+    IS_SUBSCRIBED,
+    PINNED,
+    POLLED_AT,
+)
+from utils.models import Course
+
+# Tables mirror the Mongo collections, with the same field names as columns
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user TEXT PRIMARY KEY,
+    last_subscribed REAL,
+    is_subscribed INTEGER,
+    last_subscription TEXT
+);
+CREATE TABLE IF NOT EXISTS subscriptions (
+    user TEXT NOT NULL,
+    name TEXT NOT NULL,
+    semester TEXT NOT NULL,
+    created_at REAL,
+    PRIMARY KEY (user, name, semester)
+);
+CREATE INDEX IF NOT EXISTS course_users ON subscriptions (name, semester, user);
+CREATE INDEX IF NOT EXISTS semester ON subscriptions (semester, name);
+CREATE TABLE IF NOT EXISTS snapshots (_id TEXT PRIMARY KEY, document TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS enrollment (
+    name TEXT NOT NULL,
+    polled_at REAL NOT NULL,
+    a INTEGER NOT NULL,
+    w INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS course_polls ON enrollment (name, polled_at);
+CREATE TABLE IF NOT EXISTS workers (_id TEXT PRIMARY KEY, heartbeat REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS leases (
+    _id INTEGER PRIMARY KEY,
+    owner TEXT,
+    expires_at REAL
+);
+CREATE TABLE IF NOT EXISTS outbox (
+    _id TEXT PRIMARY KEY,
+    user TEXT NOT NULL,
+    name TEXT NOT NULL,
+    text TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    created_at REAL,
+    updated_at REAL,
+    owner TEXT,
+    expires_at REAL,
+    semester TEXT,
+    subscribed_at REAL,
+    ends_subscription INTEGER
+);
+CREATE INDEX IF NOT EXISTS due ON outbox (status, available_at);
+CREATE INDEX IF NOT EXISTS settled ON outbox (status, updated_at);
+CREATE TABLE IF NOT EXISTS broadcasts (
+    _id TEXT PRIMARY KEY,
+    broadcast TEXT NOT NULL,
+    user TEXT NOT NULL,
+    status TEXT NOT NULL,
+    pinned INTEGER,
+    error TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS outcome ON broadcasts (broadcast, status);
+"""
+
+# Columns stored as epoch seconds and read back as datetimes
+TIME_FIELDS = {
+    LAST_SUBSCRIBED,
+    CREATED_AT,
+    SUBSCRIBED_AT,
+    UPDATED_AT,
+    AVAILABLE_AT,
+    EXPIRES_AT,
+    POLLED_AT,
+}
+BOOL_FIELDS = {IS_SUBSCRIBED, PINNED, ENDS_SUBSCRIPTION}
+
+
+def to_timestamp(time: pendulum.DateTime | None) -> float | None:
+    return None if time is None else time.timestamp()
+
+
+def to_document(row: sqlite3.Row) -> dict:
+    """Row as a Mongo-shaped document: NULL columns are left out like unset fields."""
+    document = {}
+    for key in row.keys():
+        if (value := row[key]) is None:
+            continue
+        if key in TIME_FIELDS:
+            value = pendulum.from_timestamp(value)
+        elif key in BOOL_FIELDS:
+            value = bool(value)
+        document[key] = value
+    return document
+
+
+def placeholders(values: list) -> str:
+    return ", ".join("?" * len(values))
+
+
+class SQLiteDatabase(Storage):
+    """Every collection as a table in one SQLite file.
+
+    Each method runs in one `BEGIN IMMEDIATE` transaction, so multi-collection
+    writes are atomic and processes sharing the file (the bot and its workers)
+    take turns writing. Pass ":memory:" for a private, throwaway database.
+    """
+
+    def __init__(self, env: Environment, path: str):
+        self.env = env
+        self.path = path
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.connection
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+
+    def _query(self, sql: str, params: tuple | list = ()) -> list[dict]:
+        with self.transaction() as db:
+            return [to_document(row) for row in db.execute(sql, params)]
+
+    def get_all_courses(self) -> Iterator[dict]:
+        rows = self._query(
+            "SELECT name, semester, json_group_array(user) AS users "
+            "FROM subscriptions GROUP BY name, semester"
+        )
+        for row in rows:
+            row[USER_LIST] = json.loads(row[USER_LIST])
+            yield row
+
+    def get_sweep_courses(self, semester: str, batch_size: int = 0) -> Iterator[dict]:
+        yield from self._query(
+            "SELECT name, semester, COUNT(*) AS subscribers FROM subscriptions "
+            "WHERE semester = ? GROUP BY name",
+            (semester,),
+        )
+
+    def get_expired_courses(self, semester: str) -> list[dict]:
+        rows = self._query(
+            "SELECT name, semester, json_group_array(user) AS users "
+            "FROM subscriptions WHERE semester != ? GROUP BY name, semester",
+            (semester,),
+        )
+        for row in rows:
+            row[USER_LIST] = json.loads(row[USER_LIST])
+        return rows
+
+    def purge_expired(self, semester: str, uids: list[str]) -> None:
+        with self.transaction() as db:
+            db.execute("DELETE FROM subscriptions WHERE semester != ?", (semester,))
+            self._delete_orphaned_snapshots(db)
+            db.execute(
+                "UPDATE users SET is_subscribed = 0 "
+                f"WHERE user IN ({placeholders(uids)})",
+                uids,
+            )
+
+    def get_subscribers(
+        self, semester: str, course_names: list[str]
+    ) -> dict[str, dict[str, datetime | None]]:
+        subscribers: dict[str, dict[str, datetime | None]] = {}
+        if not course_names:
+            return subscribers
+        for row in self._query(
+            "SELECT name, user, created_at FROM subscriptions "
+            f"WHERE semester = ? AND name IN ({placeholders(course_names)})",
+            [semester, *course_names],
+        ):
+            subscribers.setdefault(row[COURSE_NAME], {})[row[UID]] = row.get(CREATED_AT)
+        return subscribers
+
+    def get_user_course(self, uid: str) -> Optional[dict]:
+        rows = self._query(
+            "SELECT * FROM subscriptions WHERE user = ? ORDER BY rowid LIMIT 1", (uid,)
+        )
+        return rows[0] if rows else None
+
+    def subscribe(
+        self, course: Course, uid: str, subscription_time: pendulum.DateTime
+    ) -> None:
+        course_name, time = str(course), subscription_time.timestamp()
+        with self.transaction() as db:
+            db.execute(
+                "INSERT OR IGNORE INTO subscriptions VALUES (?, ?, ?, ?)",
+                (uid, course_name, Course.get_sem_year(), time),
+            )
+            db.execute(
+                "INSERT INTO users VALUES (?, ?, 1, ?) ON CONFLICT (user) DO UPDATE "
+                "SET last_subscribed = excluded.last_subscribed, is_subscribed = 1, "
+                "last_subscription = excluded.last_subscription",
+                (uid, time, course_name),
+            )
+
+    def _set_unsubscribed(self, db: sqlite3.Connection, uid: str, course_name: str):
+        db.execute(
+            "INSERT INTO users (user, is_subscribed, last_subscription) "
+            "VALUES (?, 0, ?) ON CONFLICT (user) DO UPDATE "
+            "SET is_subscribed = 0, last_subscription = excluded.last_subscription",
+            (uid, course_name),
+        )
+
+    def unsubscribe(self, course: Course, uid: str) -> None:
+        course_name = str(course)
+        with self.transaction() as db:
+            db.execute(
+                "DELETE FROM subscriptions WHERE user = ? AND name = ?",
+                (uid, course_name),
+            )
+            self._delete_orphaned_snapshots(db)
+            self._set_unsubscribed(db, uid, course_name)
+
+    def get_user_subscriptions(self, uids: list[str]) -> list[dict]:
+        if not uids:
+            return []
+        return self._query(
+            f"SELECT * FROM subscriptions WHERE user IN ({placeholders(uids)})", uids
+        )
+
+    def unsubscribe_many(self, subscriptions: list[dict]) -> list[str]:
+        if not subscriptions:
+            return []
+        targets = {subscription_key(subscription) for subscription in subscriptions}
+        uids = sorted({subscription[UID] for subscription in subscriptions})
+        with self.transaction() as db:
+            rows = db.execute(
+                f"SELECT * FROM subscriptions WHERE user IN ({placeholders(uids)})",
+                uids,
+            )
+            ended = [
+                doc
+                for doc in map(to_document, rows)
+                if subscription_key(doc) in targets
+            ]
+            db.executemany(
+                "DELETE FROM subscriptions WHERE user = ? AND name = ? AND semester = ?",
+                [(doc[UID], doc[COURSE_NAME], doc[SEM_YEAR]) for doc in ended],
+            )
+            self._delete_orphaned_snapshots(db)
+            db.executemany(
+                "UPDATE users SET is_subscribed = 0, last_subscription = ? "
+                "WHERE user = ?",
+                [(doc[COURSE_NAME], doc[UID]) for doc in ended],
+            )
+        return [doc[UID] for doc in ended]
+
+    def prune_users(self, uids: list[str]) -> None:
+        if not uids:
+            return
+        with self.transaction() as db:
+            for table in ("subscriptions", "users"):
+                db.execute(
+                    f"DELETE FROM {table} WHERE user IN ({placeholders(uids)})", uids
+                )
+            self._delete_orphaned_snapshots(db)
+
+    def _delete_orphaned_snapshots(self, db: sqlite3.Connection) -> None:
+        db.execute(
+            "DELETE FROM snapshots WHERE _id NOT IN (SELECT name FROM subscriptions)"
+        )
+
+    def get_all_users(self) -> Iterator[dict]:
+        yield from self._query("SELECT * FROM users")
+
+    def get_user(self, uid: str) -> Optional[dict]:
+        rows = self._query("SELECT * FROM users WHERE user = ?", (uid,))
+        return rows[0] if rows else None
+
+    def update_subscription_time(self, uid: str, time: pendulum.DateTime) -> None:
+        with self.transaction() as db:
+            db.execute(
+                "INSERT INTO users (user, last_subscribed) VALUES (?, ?) "
+                "ON CONFLICT (user) DO UPDATE "
+                "SET last_subscribed = excluded.last_subscribed",
+                (uid, time.timestamp()),
+            )
+
+    def update_subscription_status(
+        self, uid: str, last_subscribed: str, is_subscribed: bool
+    ) -> None:
+        with self.transaction() as db:
+            db.execute(
+                "INSERT INTO users (user, is_subscribed, last_subscription) "
+                "VALUES (?, ?, ?) ON CONFLICT (user) DO UPDATE "
+                "SET is_subscribed = excluded.is_subscribed, "
+                "last_subscription = excluded.last_subscription",
+                (uid, is_subscribed, last_subscribed),
+            )
+
+    def get_snapshots(self) -> Iterator[dict]:
+        with self.transaction() as db:
+            rows = db.execute("SELECT document FROM snapshots").fetchall()
+        for row in rows:
+            yield json.loads(row["document"])
+
+    def save_snapshots(self, upserts: list[dict], removed: list[str]) -> None:
+        with self.transaction() as db:
+            db.executemany(
+                "INSERT OR REPLACE INTO snapshots VALUES (?, ?)",
+                [(doc["_id"], json.dumps(doc)) for doc in upserts],
+            )
+            db.executemany(
+                "DELETE FROM snapshots WHERE _id = ?", [(name,) for name in removed]
+            )
+
+    def save_enrollment(self, samples: list[dict]) -> None:
+        with self.transaction() as db:
+            db.executemany(
+                "INSERT INTO enrollment VALUES (?, ?, ?, ?)",
+                [
+                    (
+                        sample[COURSE_NAME],
+                        to_timestamp(sample[POLLED_AT]),
+                        sample[AVAILABLE],
+                        sample[WAITLIST],
+                    )
+                    for sample in samples
+                ],
+            )
+
+    def get_enrollment_history(
+        self,
+        course_name: str,
+        start: pendulum.DateTime,
+        end: pendulum.DateTime,
+        window: int,
+    ) -> list[dict]:
+        samples = self._query(
+            "SELECT polled_at, a, w FROM enrollment "
+            "WHERE name = ? AND polled_at >= ? AND polled_at < ? ORDER BY polled_at",
+            (course_name, to_timestamp(start), to_timestamp(end)),
+        )
+        return downsample(samples, window)
+
+    def heartbeat_worker(self, worker_id: str, time: pendulum.DateTime) -> None:
+        with self.transaction() as db:
+            db.execute(
+                f"INSERT OR REPLACE INTO workers (_id, {HEARTBEAT}) VALUES (?, ?)",
+                (worker_id, time.timestamp()),
+            )
+
+    def count_live_workers(self, since: pendulum.DateTime) -> int:
+        with self.transaction() as db:
+            [count] = db.execute(
+                f"SELECT COUNT(*) FROM workers WHERE {HEARTBEAT} > ?",
+                (since.timestamp(),),
+            ).fetchone()
+        return count
+
+    def remove_worker(self, worker_id: str) -> None:
+        with self.transaction() as db:
+            db.execute("DELETE FROM workers WHERE _id = ?", (worker_id,))
+
+    def renew_leases(
+        self, worker_id: str, now: pendulum.DateTime, expires_at: pendulum.DateTime
+    ) -> list[int]:
+        with self.transaction() as db:
+            rows = db.execute(
+                "UPDATE leases SET expires_at = ? "
+                "WHERE owner = ? AND expires_at > ? RETURNING _id",
+                (expires_at.timestamp(), worker_id, now.timestamp()),
+            ).fetchall()
+        return sorted(row["_id"] for row in rows)
+
+    def acquire_lease(
+        self,
+        partition: int,
+        worker_id: str,
+        now: pendulum.DateTime,
+        expires_at: pendulum.DateTime,
+    ) -> bool:
+        with self.transaction() as db:
+            taken = db.execute(
+                "INSERT INTO leases VALUES (?, ?, ?) ON CONFLICT (_id) DO UPDATE "
+                "SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE owner IS NULL OR expires_at <= ? RETURNING _id",
+                (partition, worker_id, expires_at.timestamp(), now.timestamp()),
+            ).fetchall()
+        return bool(taken)
+
+    def release_leases(self, worker_id: str, partitions: list[int]) -> None:
+        if not partitions:
+            return
+        with self.transaction() as db:
+            db.execute(
+                "UPDATE leases SET owner = NULL "
+                f"WHERE owner = ? AND _id IN ({placeholders(partitions)})",
+                [worker_id, *partitions],
+            )
+
+    def enqueue_notifications(self, intents: list[dict]) -> int:
+        if not intents:
+            return 0
+        columns = list(intents[0])
+        with self.transaction() as db:
+            before = db.total_changes
+            db.executemany(
+                f"INSERT OR IGNORE INTO outbox ({', '.join(columns)}) "
+                f"VALUES ({placeholders(columns)})",
+                [
+                    [
+                        to_timestamp(intent[c]) if c in TIME_FIELDS else intent[c]
+                        for c in columns
+                    ]
+                    for intent in intents
+                ],
+            )
+            return db.total_changes - before
+
+    def claim_notifications(
+        self,
+        owner: str,
+        now: pendulum.DateTime,
+        expires_at: pendulum.DateTime,
+        limit: int,
+    ) -> list[dict]:
+        with self.transaction() as db:
+            rows = db.execute(
+                "UPDATE outbox SET owner = ?, expires_at = ? WHERE _id IN ("
+                "SELECT _id FROM outbox WHERE status = ? AND available_at <= ? "
+                "AND (expires_at IS NULL OR expires_at <= ?) "
+                "ORDER BY available_at LIMIT ?) RETURNING *",
+                (
+                    owner,
+                    expires_at.timestamp(),
+                    NotificationStatus.PENDING,
+                    now.timestamp(),
+                    now.timestamp(),
+                    limit,
+                ),
+            ).fetchall()
+        return sorted(map(to_document, rows), key=lambda doc: doc[AVAILABLE_AT])
+
+    def settle_notifications(
+        self,
+        delivered: list[str],
+        retries: dict[str, pendulum.DateTime],
+        failed: list[str],
+        now: pendulum.DateTime,
+    ) -> None:
+        release = "owner = NULL, expires_at = NULL, updated_at = ?"
+        with self.transaction() as db:
+            for keys, status, attempts in (
+                (delivered, NotificationStatus.DELIVERED, 0),
+                (failed, NotificationStatus.FAILED, 1),
+            ):
+                if keys:
+                    db.execute(
+                        f"UPDATE outbox SET status = ?, attempts = attempts + ?, "
+                        f"{release} WHERE _id IN ({placeholders(keys)})",
+                        [status, attempts, now.timestamp(), *keys],
+                    )
+            db.executemany(
+                "UPDATE outbox SET available_at = ?, attempts = attempts + 1, "
+                f"{release} WHERE _id = ?",
+                [
+                    (available_at.timestamp(), now.timestamp(), key)
+                    for key, available_at in retries.items()
+                ],
+            )
+
+    def purge_notifications(self, before: pendulum.DateTime) -> None:
+        with self.transaction() as db:
+            db.execute(
+                "DELETE FROM outbox WHERE status != ? AND updated_at < ?",
+                (NotificationStatus.PENDING, before.timestamp()),
+            )
+
+    def get_broadcast_recipients(self, broadcast_id: str) -> set[str]:
+        return {
+            row[UID]
+            for row in self._query(
+                "SELECT user FROM broadcasts WHERE broadcast = ? AND status = ?",
+                (broadcast_id, NotificationStatus.DELIVERED),
+            )
+        }
+
+    def save_broadcast_outcomes(self, broadcast_id: str, outcomes: list[dict]) -> None:
+        with self.transaction() as db:
+            for outcome in outcomes:
+                document = {
+                    "_id": f"{broadcast_id}:{outcome[UID]}",
+                    BROADCAST_ID: broadcast_id,
+                    **outcome,
+                }
+                document[UPDATED_AT] = to_timestamp(document.get(UPDATED_AT))
+                db.execute(
+                    f"INSERT OR REPLACE INTO broadcasts ({', '.join(document)}) "
+                    f"VALUES ({placeholders(list(document))})",
+                    list(document.values()),
+                )
@@ -0,0 +1,197 @@
+"""Storage interface shared by the MongoDB, SQLite and in-memory engines."""
+
+import os
+import sys
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Iterator, Optional
+
+import pendulum
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.constants import Environment, CREATED_AT, COURSE_NAME, SEM_YEAR, UID
+from utils.models import Course
+
+
+def subscription_key(subscription: dict) -> tuple:
+    """Identity of a subscription; resubscribing creates one with a new `CREATED_AT`"""
+    return (
+        subscription[UID],
+        subscription[COURSE_NAME],
+        subscription[SEM_YEAR],
+        subscription.get(CREATED_AT),
+    )
+
+
+class Storage(ABC):
+    """Everything the bot, pollers and admin scripts read and write.
+
+    Documents are plain dicts keyed by the field names in `utils.constants`, in the
+    shape MongoDB stores them, whichever engine holds them. Writes that touch
+    several collections are applied atomically where the engine allows it.
+    Removing a course's last subscription also removes its enrollment snapshot.
+    """
+
+    env: Environment
+
+    # Subscriptions
+
+    @abstractmethod
+    def get_all_courses(self) -> Iterator[dict]:
+        """Every subscribed course with its semester and list of users"""
+
+    @abstractmethod
+    def get_sweep_courses(self, semester: str, batch_size: int) -> Iterator[dict]:
+        """Name, semester and subscriber count of every course subscribed in `semester`"""
+
+    @abstractmethod
+    def get_expired_courses(self, semester: str) -> list[dict]:
+        """Every course subscribed in a semester other than `semester`, with its users"""
+
+    @abstractmethod
+    def purge_expired(self, semester: str, uids: list[str]) -> None:
+        """Delete subscriptions outside `semester` and mark `uids` unsubscribed"""
+
+    @abstractmethod
+    def get_subscribers(
+        self, semester: str, course_names: list[str]
+    ) -> dict[str, dict[str, datetime | None]]:
+        """Subscribed users of each of `course_names` in `semester` and when they subscribed"""
+
+    @abstractmethod
+    def get_user_course(self, uid: str) -> Optional[dict]:
+        """The user's subscription, which names the course they are subscribed to"""
+
+    @abstractmethod
+    def subscribe(
+        self, course: Course, uid: str, subscription_time: pendulum.DateTime
+    ) -> None: ...
+
+    @abstractmethod
+    def unsubscribe(self, course: Course, uid: str) -> None: ...
+
+    @abstractmethod
+    def get_user_subscriptions(self, uids: list[str]) -> list[dict]:
+        """Every subscription of `uids`"""
+
+    @abstractmethod
+    def unsubscribe_many(self, subscriptions: list[dict]) -> list[str]:
+        """End those of `subscriptions` that still exist and mark their users unsubscribed
+
+        Subscriptions are matched on `subscription_key`, so a user who resubscribed
+        keeps the new subscription. Returns the users whose subscription ended.
+        """
+
+    @abstractmethod
+    def prune_users(self, uids: list[str]) -> None:
+        """Remove users whose chats are gone from every course and the users"""
+
+    # Users
+
+    @abstractmethod
+    def get_all_users(self) -> Iterator[dict]: ...
+
+    @abstractmethod
+    def get_user(self, uid: str) -> Optional[dict]: ...
+
+    @abstractmethod
+    def update_subscription_time(self, uid: str, time: pendulum.DateTime) -> None: ...
+
+    @abstractmethod
+    def update_subscription_status(
+        self, uid: str, last_subscribed: str, is_subscribed: bool
+    ) -> None: ...
+
+    # Enrollment snapshots
+
+    @abstractmethod
+    def get_snapshots(self) -> Iterator[dict]: ...
+
+    @abstractmethod
+    def save_snapshots(self, upserts: list[dict], removed: list[str]) -> None: ...
+
+    # Enrollment history
+
+    @abstractmethod
+    def save_enrollment(self, samples: list[dict]) -> None:
+        """Append polled enrollment samples to the history"""
+
+    @abstractmethod
+    def get_enrollment_history(
+        self,
+        course_name: str,
+        start: pendulum.DateTime,
+        end: pendulum.DateTime,
+        window: int,
+    ) -> list[dict]:
+        """A section's samples from `start` until `end`, summarized per `window` seconds"""
+
+    # Poller workers and partition leases
+
+    @abstractmethod
+    def heartbeat_worker(self, worker_id: str, time: pendulum.DateTime) -> None: ...
+
+    @abstractmethod
+    def count_live_workers(self, since: pendulum.DateTime) -> int: ...
+
+    @abstractmethod
+    def remove_worker(self, worker_id: str) -> None: ...
+
+    @abstractmethod
+    def renew_leases(
+        self, worker_id: str, now: pendulum.DateTime, expires_at: pendulum.DateTime
+    ) -> list[int]:
+        """Extend the worker's unexpired leases and return their partitions"""
+
+    @abstractmethod
+    def acquire_lease(
+        self,
+        partition: int,
+        worker_id: str,
+        now: pendulum.DateTime,
+        expires_at: pendulum.DateTime,
+    ) -> bool:
+        """Take a partition lease if it is free or expired"""
+
+    @abstractmethod
+    def release_leases(self, worker_id: str, partitions: list[int]) -> None: ...
+
+    # Notification outbox
+
+    @abstractmethod
+    def enqueue_notifications(self, intents: list[dict]) -> int:
+        """Queue notification intents, skipping keys already queued"""
+
+    @abstractmethod
+    def claim_notifications(
+        self,
+        owner: str,
+        now: pendulum.DateTime,
+        expires_at: pendulum.DateTime,
+        limit: int,
+    ) -> list[dict]:
+        """Claim up to `limit` due notifications that are not claimed by a live drain"""
+
+    @abstractmethod
+    def settle_notifications(
+        self,
+        delivered: list[str],
+        retries: dict[str, pendulum.DateTime],
+        failed: list[str],
+        now: pendulum.DateTime,
+    ) -> None:
+        """Record the outcome of claimed notifications and release their claims"""
+
+    @abstractmethod
+    def purge_notifications(self, before: pendulum.DateTime) -> None:
+        """Delete settled notifications last updated before `before`"""
+
+    # Broadcasts
+
+    @abstractmethod
+    def get_broadcast_recipients(self, broadcast_id: str) -> set[str]: ...
+
+    @abstractmethod
+    def save_broadcast_outcomes(
+        self, broadcast_id: str, outcomes: list[dict]
+    ) -> None: ...
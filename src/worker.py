@@ -0,0 +1,97 @@
+"""Standalone poller worker.
+
+Run any number of these alongside a bot started with `--no-poller`. Workers split
+the course partitions between themselves through leases in MongoDB, so each
+course is polled by exactly one worker at a time. Workers only queue notifications
+in the outbox; the bot delivers them, so its own writes keep its user cache fresh.
+"""
+
+import asyncio
+import os
+import socket
+import sys
+import uuid
+
+import argparse
+from dotenv import load_dotenv
+from telegram import Bot
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import finder
+from src.db import AsyncDatabase, open_database
+from src.history import EnrollmentHistory
+from src.leases import LeaseManager, LEASE_RENEW_SECONDS
+from src.scheduler import PollScheduler
+from src.snapshots import SnapshotStore
+from utils import client
+from utils.constants import Environment
+
+load_dotenv()
+
+
+async def keep_leases(leases: LeaseManager) -> None:
+    """Renew the worker's leases on a timer, however long a cycle takes"""
+    while True:
+        await asyncio.sleep(LEASE_RENEW_SECONDS)
+        try:
+            await asyncio.to_thread(leases.renew)
+        except Exception as e:
+            print(f"Lease renewal failed on worker {leases.worker_id}: {e}")
+
+
+async def main(env: Environment) -> None:
+    """Poll the partitions this worker holds leases for until interrupted"""
+    worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    print(f"Starting poller worker {worker_id}...")
+
+    db = open_database(env)
+    bot_token = os.getenv(
+        "TELEGRAM_TOKEN" if env == Environment.PROD else "TEST_TELEGRAM_TOKEN"
+    )
+    leases = LeaseManager(db, worker_id)
+    scheduler = PollScheduler()
+    snapshots = SnapshotStore(db.get_snapshots())
+    history = EnrollmentHistory()
+    courses = finder.CourseList()
+    search_client = client.create_search_client()
+
+    async with Bot(bot_token) as bot:
+        finder.setup(bot, AsyncDatabase(db))
+        renewals = asyncio.create_task(keep_leases(leases))
+        try:
+            while True:
+                # Rebalance only between sweeps so no partition changes hands mid-poll
+                partitions = await asyncio.to_thread(leases.heartbeat)
+                try:
+                    await finder.search_courses(
+                        search_client,
+                        scheduler,
+                        snapshots,
+                        partitions,
+                        history,
+                        courses,
+                    )
+                except Exception as e:
+                    print(f"Sweep failed on worker {worker_id}: {e}")
+                await asyncio.sleep(finder.POLL_TICK_SECONDS)
+        finally:
+            renewals.cancel()
+            leases.release()
+            await search_client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a poller worker")
+    parser.add_argument(
+        "--dev",
+        action="store_const",
+        const=Environment.DEV,
+        default=Environment.PROD,
+        help="Run the worker in development mode",
+        dest="env",
+    )
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args.env))
+    except KeyboardInterrupt:
+        pass
@@ -18,8 +18,10 @@ from src.bot import (
     await_feedback,
     save_feedback,
     error_handler,
+    post_init,
+    post_shutdown,
 )
-from src.db import Database
+from src.db import AsyncDatabase
 from utils.conv import (
     WELCOME_TEXT,
     HELP_MD,
@@ -37,6 +39,7 @@ from utils.constants import (
     LAST_SUBSCRIPTION,
     COURSE_NAME,
     USER_LIST,
+    SEARCH_CLIENT,
 )
 
 
@@ -69,16 +72,12 @@ def mock_context():
 
 @pytest.fixture(autouse=True)
 def mock_db():
-    with patch("src.bot.DB") as mock:
-        db = MagicMock(spec=Database)
-        db.env = Environment.DEV
-        db.get_user.return_value = None
-        db.get_user_course.return_value = None
-
-        mock.env = Environment.DEV
-        mock.get_user = db.get_user
-        mock.get_user_course = db.get_user_course
-        yield mock
+    db = MagicMock(spec=AsyncDatabase)
+    db.env = Environment.DEV
+    db.get_user.return_value = None
+    db.get_user_course.return_value = None
+    with patch("src.bot.DB", db):
+        yield db
 
 
 @pytest.mark.asyncio
@@ -255,3 +254,18 @@ async def test_feedback_flow(mock_update, mock_context):
     assert result == ConversationHandler.END
     mock_context.bot.send_message.assert_called_once()
     mock_update.message.reply_text.assert_called_once_with(FEEDBACK_SUCCESS_TEXT)
+
+
+@pytest.mark.asyncio
+async def test_search_client_lifecycle():
+    application = MagicMock()
+    application.bot_data = {}
+    with patch("src.bot.client.create_search_client") as create_client:
+        create_client.return_value.close = AsyncMock()
+        await post_init(application)
+        search_client = application.bot_data[SEARCH_CLIENT]
+        assert search_client is create_client.return_value
+
+        await post_shutdown(application)
+        search_client.close.assert_awaited_once()
+        assert SEARCH_CLIENT not in application.bot_data
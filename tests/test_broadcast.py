@@ -0,0 +1,116 @@
+import os
+import sys
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from telegram.error import Forbidden, TimedOut
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.broadcast import Broadcast, broadcast_id_of
+from src.db import AsyncDatabase
+from src.notifier import Notifier
+from utils.constants import NotificationStatus, PINNED, STATUS, UID
+
+
+@pytest.fixture
+def mock_db():
+    db = MagicMock(spec=AsyncDatabase)
+    db.get_all_users.return_value = [{UID: f"u{i}"} for i in range(5)]
+    db.get_broadcast_recipients.return_value = {"u0"}
+    return db
+
+
+@pytest.fixture
+def mock_bot():
+    bot = MagicMock()
+
+    async def send_message(chat_id, **_):
+        if chat_id == "u4":
+            raise Forbidden("Forbidden: bot was blocked by the user")
+        message = MagicMock(chat_id=chat_id)
+        message.pin = AsyncMock(return_value=True)
+        return message
+
+    bot.send_message = AsyncMock(side_effect=send_message)
+    return bot
+
+
+def make_broadcast(db, bot, **kwargs) -> Broadcast:
+    notifier = Notifier(bot, rate=100, burst=100, chat_interval=0)
+    return Broadcast(db, notifier, "hello", **kwargs)
+
+
+def saved_outcomes(db: MagicMock) -> dict[str, dict]:
+    return {
+        outcome[UID]: outcome
+        for call in db.save_broadcast_outcomes.call_args_list
+        for outcome in call.args[1]
+    }
+
+
+@pytest.mark.asyncio
+async def test_broadcast_resumes_and_records_outcomes(mock_db, mock_bot):
+    report = await make_broadcast(mock_db, mock_bot, checkpoint_every=2).run()
+
+    assert report.broadcast_id == broadcast_id_of("hello")
+    assert (report.delivered, report.pinned, report.already_delivered) == (3, 3, 1)
+    assert list(report.failed) == ["u4"] and report.pruned == 1
+    assert mock_bot.send_message.await_count == 4
+    mock_db.prune_users.assert_called_once_with(["u4"])
+
+    outcomes = saved_outcomes(mock_db)
+    assert set(outcomes) == {"u1", "u2", "u3", "u4"}
+    assert outcomes["u1"][STATUS] == NotificationStatus.DELIVERED
+    assert outcomes["u1"][PINNED]
+    assert outcomes["u4"][STATUS] == NotificationStatus.FAILED
+    # Checkpointed in batches of two while sending
+    assert mock_db.save_broadcast_outcomes.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_broadcast_dry_run_sends_nothing(mock_db, mock_bot):
+    report = await make_broadcast(mock_db, mock_bot).run(dry_run=True)
+
+    assert (report.delivered, report.already_delivered) == (4, 1)
+    mock_bot.send_message.assert_not_awaited()
+    mock_db.save_broadcast_outcomes.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_failed_pin_still_counts_as_delivered(mock_db, mock_bot):
+    mock_db.get_all_users.return_value = [{UID: "u1"}]
+    mock_db.get_broadcast_recipients.return_value = set()
+    message = MagicMock(chat_id="u1")
+    message.pin = AsyncMock(side_effect=RuntimeError("not enough rights"))
+    mock_bot.send_message = AsyncMock(return_value=message)
+
+    report = await make_broadcast(mock_db, mock_bot).run()
+
+    assert (report.delivered, report.pinned) == (1, 0)
+    outcome = saved_outcomes(mock_db)["u1"]
+    assert outcome[STATUS] == NotificationStatus.DELIVERED
+    assert not outcome[PINNED]
+
+
+@pytest.mark.asyncio
+async def test_broadcast_retries_transient_failures(mock_db, mock_bot):
+    mock_db.get_all_users.return_value = [{UID: "u1"}, {UID: "u2"}]
+    mock_db.get_broadcast_recipients.return_value = set()
+    attempts = []
+
+    async def send_message(chat_id, **_):
+        attempts.append(chat_id)
+        if chat_id == "u2" and attempts.count("u2") < 3:
+            raise TimedOut()
+        message = MagicMock(chat_id=chat_id)
+        message.pin = AsyncMock(return_value=True)
+        return message
+
+    mock_bot.send_message = AsyncMock(side_effect=send_message)
+    broadcast = make_broadcast(mock_db, mock_bot, max_attempts=3, retry_base=0)
+    report = await broadcast.run()
+
+    assert report.delivered == 2 and not report.failed
+    assert attempts.count("u1") == 1 and attempts.count("u2") == 3
+    assert saved_outcomes(mock_db)["u2"][STATUS] == NotificationStatus.DELIVERED
+    mock_db.prune_users.assert_called_once_with([])
@@ -0,0 +1,77 @@
+import asyncio
+import os
+import sys
+
+import pytest
+from unittest.mock import AsyncMock, patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.cache import TTLCache
+
+
+def test_ttl_expiry():
+    cache = TTLCache(ttl=10, maxsize=2)
+    with patch("utils.cache.time.monotonic", return_value=0):
+        cache.set("a", 1)
+    with patch("utils.cache.time.monotonic", return_value=5):
+        assert cache.get("a") == 1
+    with patch("utils.cache.time.monotonic", return_value=10):
+        assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_lru_eviction():
+    cache = TTLCache(ttl=60, maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+@pytest.mark.asyncio
+async def test_get_or_fetch_refetches_past_max_age():
+    cache = TTLCache(ttl=15, maxsize=8)
+    fetch = AsyncMock(side_effect=["fresh", "fresher"])
+    with patch("utils.cache.time.monotonic", return_value=0):
+        cache.set("k", "cached")
+    with patch("utils.cache.time.monotonic", return_value=5):
+        assert await cache.get_or_fetch("k", fetch, max_age=10) == "cached"
+        assert await cache.get_or_fetch("k", fetch, max_age=5) == "fresh"
+        assert await cache.get_or_fetch("k", fetch, max_age=0) == "fresher"
+        # Readers without a max_age get the refreshed entry
+        assert cache.get("k") == "fresher"
+    assert fetch.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_get_or_fetch_coalesces_concurrent_misses():
+    cache = TTLCache(ttl=60, maxsize=8)
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "payload"
+
+    results = await asyncio.gather(*(cache.get_or_fetch("k", fetch) for _ in range(5)))
+    assert results == ["payload"] * 5
+    assert calls == 1
+
+    assert await cache.get_or_fetch("k", fetch) == "payload"
+    assert calls == 1
+
+
+@pytest.mark.asyncio
+async def test_get_or_fetch_does_not_cache_failures():
+    cache = TTLCache(ttl=60, maxsize=8)
+    fetch = AsyncMock(side_effect=[LookupError("BU is down"), "payload"])
+
+    with pytest.raises(LookupError):
+        await cache.get_or_fetch("k", fetch)
+    assert await cache.get_or_fetch("k", fetch) == "payload"
+    assert fetch.await_count == 2
@@ -3,23 +3,31 @@ import sys
 
 import pendulum
 import pytest
-from unittest.mock import MagicMock, patch
-from pymongo.errors import PyMongoError
+from unittest.mock import ANY, MagicMock, patch
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure, PyMongoError
 from pymongo.synchronous.database import Database as MongoDB
 from pymongo.synchronous.collection import Collection
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from src.db import Database
+from src.db import AsyncDatabase, Database
 from utils.constants import (
     Environment,
-    COURSE_LIST,
+    NotificationStatus,
+    SUBSCRIPTION_LIST,
     USER_LIST,
     COURSE_NAME,
     SEM_YEAR,
+    SUBSCRIBERS,
     UID,
+    CREATED_AT,
     LAST_SUBSCRIBED,
     IS_SUBSCRIBED,
     LAST_SUBSCRIPTION,
+    ENROLLMENT_LIST,
+    BROADCAST_ID,
+    STATUS,
+    POLLED_AT,
 )
 from utils.models import Course
 
@@ -27,24 +35,29 @@ from utils.models import Course
 @pytest.fixture
 def mock_mongo_client():
     with patch("src.db.MongoClient") as mock_client:
-        mock_courses = MagicMock(spec=Collection)
+        mock_subscriptions = MagicMock(spec=Collection)
         mock_users = MagicMock(spec=Collection)
 
         mock_db = MagicMock(spec=MongoDB)
         mock_db.__getitem__.side_effect = lambda x: (
-            mock_courses if x == COURSE_LIST else mock_users
+            mock_subscriptions if x == SUBSCRIPTION_LIST else mock_users
         )
 
         mock_client.return_value.get_database.return_value = mock_db
 
+        # Run transaction callbacks straight away with the session
+        session = mock_client.return_value.start_session.return_value.__enter__()
+        session.with_transaction.side_effect = lambda callback: callback(session)
+
         yield mock_db
 
 
 @pytest.fixture
 def db(mock_mongo_client):
     database = Database(Environment.DEV)
-    database.course_collection = mock_mongo_client[COURSE_LIST]
+    database.subscription_collection = mock_mongo_client[SUBSCRIPTION_LIST]
     database.user_collection = mock_mongo_client[USER_LIST]
+    database.snapshot_collection = MagicMock(spec=Collection)
     return database
 
 
@@ -56,40 +69,119 @@ def test_database_init():
         mock_client.return_value.get_database.assert_called_once_with("dev_db")
 
 
+def test_database_init_ensures_indexes(mock_mongo_client):
+    Database(Environment.DEV)
+    subscriptions = mock_mongo_client[SUBSCRIPTION_LIST]
+    subscriptions.create_indexes.assert_called_once()
+    names = {
+        index.document["name"]
+        for index in subscriptions.create_indexes.call_args.args[0]
+    }
+    assert names == {"user_course", "course_users", "semester"}
+
+
+def test_ensure_indexes_survives_conflicts(db, mock_mongo_client):
+    mock_mongo_client[SUBSCRIPTION_LIST].create_indexes.side_effect = OperationFailure(
+        "dup"
+    )
+    db.ensure_indexes()
+    mock_mongo_client[USER_LIST].create_indexes.assert_called()
+
+
 def test_get_all_courses_empty(db, mock_mongo_client):
-    mock_mongo_client[COURSE_LIST].find.return_value = []
+    mock_mongo_client[SUBSCRIPTION_LIST].aggregate.return_value = []
     courses = list(db.get_all_courses())
     assert len(courses) == 0
-    mock_mongo_client[COURSE_LIST].find.assert_called_once()
+    mock_mongo_client[SUBSCRIPTION_LIST].aggregate.assert_called_once()
+
 
+def test_get_all_courses_groups_subscriptions(db, mock_mongo_client):
+    db.get_all_courses()
 
-def test_get_all_courses_with_data(db, mock_mongo_client):
-    expected_courses = [
-        {COURSE_NAME: "Course1", USER_LIST: ["user1"]},
-        {COURSE_NAME: "Course2", USER_LIST: ["user2", "user3"]},
+    [pipeline] = mock_mongo_client[SUBSCRIPTION_LIST].aggregate.call_args.args
+    assert pipeline[0] == {
+        "$group": {
+            "_id": {COURSE_NAME: f"${COURSE_NAME}", SEM_YEAR: f"${SEM_YEAR}"},
+            USER_LIST: {"$push": f"${UID}"},
+        }
+    }
+
+
+def test_get_sweep_courses_counts_subscriptions(db, mock_mongo_client):
+    db.get_sweep_courses("Fall 2024", batch_size=100)
+
+    [pipeline], kwargs = mock_mongo_client[SUBSCRIPTION_LIST].aggregate.call_args
+    assert pipeline[:3] == [
+        {"$match": {SEM_YEAR: "Fall 2024"}},
+        {"$sort": {COURSE_NAME: 1}},
+        {
+            "$group": {
+                "_id": {COURSE_NAME: f"${COURSE_NAME}", SEM_YEAR: f"${SEM_YEAR}"},
+                SUBSCRIBERS: {"$sum": 1},
+            }
+        },
     ]
-    mock_mongo_client[COURSE_LIST].find.return_value = expected_courses
+    assert kwargs == {"batchSize": 100}
 
-    courses = list(db.get_all_courses())
-    assert courses == expected_courses
-    assert len(courses[1][USER_LIST]) == 2
+
+def test_purge_expired(db, mock_mongo_client):
+    db.purge_expired("Fall 2024", ["u1"])
+
+    mock_mongo_client[SUBSCRIPTION_LIST].delete_many.assert_called_once_with(
+        {SEM_YEAR: {"$ne": "Fall 2024"}}, session=ANY
+    )
+    mock_mongo_client[USER_LIST].update_many.assert_called_once_with(
+        {UID: {"$in": ["u1"]}}, {"$set": {IS_SUBSCRIBED: False}}, session=ANY
+    )
+
+
+def test_get_subscribers(db, mock_mongo_client):
+    now = pendulum.now()
+    mock_mongo_client[SUBSCRIPTION_LIST].find.return_value = [
+        {COURSE_NAME: "CAS CS111 A1", UID: "u1", CREATED_AT: now},
+        {COURSE_NAME: "CAS CS111 A1", UID: "u2"},
+    ]
+
+    assert db.get_subscribers("Fall 2024", ["CAS CS111 A1", "CAS CS112 A1"]) == {
+        "CAS CS111 A1": {"u1": now, "u2": None}
+    }
+    mock_mongo_client[SUBSCRIPTION_LIST].find.assert_called_once_with(
+        {COURSE_NAME: {"$in": ["CAS CS111 A1", "CAS CS112 A1"]}, SEM_YEAR: "Fall 2024"},
+        {"_id": 0, COURSE_NAME: 1, UID: 1, CREATED_AT: 1},
+    )
+    assert db.get_subscribers("Fall 2024", []) == {}
+    mock_mongo_client[SUBSCRIPTION_LIST].find.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_async_database_streams_sweep_courses(db, mock_mongo_client):
+    cursor = MagicMock()
+    cursor.__iter__.return_value = iter([{COURSE_NAME: str(i)} for i in range(5)])
+    mock_mongo_client[SUBSCRIPTION_LIST].aggregate.return_value = cursor
+
+    streamed = [
+        doc async for doc in AsyncDatabase(db).stream_sweep_courses("Fall 2024", 2)
+    ]
+
+    assert [doc[COURSE_NAME] for doc in streamed] == ["0", "1", "2", "3", "4"]
+    cursor.close.assert_called_once()
 
 
 def test_get_user_course_not_found(db, mock_mongo_client):
-    mock_mongo_client[COURSE_LIST].find_one.return_value = None
+    mock_mongo_client[SUBSCRIPTION_LIST].find_one.return_value = None
     course = db.get_user_course("nonexistent_user")
     assert course is None
 
 
 def test_get_user_course_found(db, mock_mongo_client):
     test_uid = "test123"
-    expected_course = {COURSE_NAME: "Course1", USER_LIST: [test_uid]}
-    mock_mongo_client[COURSE_LIST].find_one.return_value = expected_course
+    expected_course = {UID: test_uid, COURSE_NAME: "Course1"}
+    mock_mongo_client[SUBSCRIPTION_LIST].find_one.return_value = expected_course
 
     course = db.get_user_course(test_uid)
     assert course == expected_course
-    mock_mongo_client[COURSE_LIST].find_one.assert_called_once_with(
-        {USER_LIST: test_uid}
+    mock_mongo_client[SUBSCRIPTION_LIST].find_one.assert_called_once_with(
+        {UID: test_uid}
     )
 
 
@@ -101,26 +193,26 @@ def test_subscribe_new_course(db, mock_mongo_client):
 
     db.subscribe(test_course, test_uid, test_time)
 
-    # Verify course update
-    mock_mongo_client[COURSE_LIST].update_one.assert_called_with(
-        {COURSE_NAME: test_course, SEM_YEAR: test_sem_year},
-        {"$setOnInsert": {SEM_YEAR: test_sem_year}, "$push": {USER_LIST: test_uid}},
+    # Verify subscription upsert
+    mock_mongo_client[SUBSCRIPTION_LIST].update_one.assert_called_once_with(
+        {UID: test_uid, COURSE_NAME: test_course, SEM_YEAR: test_sem_year},
+        {"$setOnInsert": {CREATED_AT: test_time}},
         upsert=True,
+        session=ANY,
     )
 
-    # Verify user updates
-    mock_mongo_client[USER_LIST].update_one.assert_any_call(
-        {UID: test_uid}, {"$set": {LAST_SUBSCRIBED: test_time}}, upsert=True
-    )
-    mock_mongo_client[USER_LIST].update_one.assert_any_call(
+    # Verify user updates are merged into one write
+    mock_mongo_client[USER_LIST].update_one.assert_called_once_with(
         {UID: test_uid},
         {
             "$set": {
+                LAST_SUBSCRIBED: test_time,
                 IS_SUBSCRIBED: True,
                 LAST_SUBSCRIPTION: test_course,
             }
         },
         upsert=True,
+        session=ANY,
     )
 
 
@@ -130,9 +222,9 @@ def test_unsubscribe_existing_user(db, mock_mongo_client):
 
     db.unsubscribe(test_course, test_uid)
 
-    # Verify course update
-    mock_mongo_client[COURSE_LIST].update_one.assert_called_once_with(
-        {COURSE_NAME: test_course}, {"$pull": {USER_LIST: test_uid}}
+    # Verify subscription removal
+    mock_mongo_client[SUBSCRIPTION_LIST].delete_many.assert_called_once_with(
+        {UID: test_uid, COURSE_NAME: test_course}, session=ANY
     )
 
     # Verify user status update
@@ -145,17 +237,105 @@ def test_unsubscribe_existing_user(db, mock_mongo_client):
             }
         },
         upsert=True,
+        session=ANY,
     )
 
 
-def test_remove_course(db, mock_mongo_client):
-    test_course = "CAS CS111 A1"
-    mock_mongo_client[COURSE_LIST].delete_one.return_value.deleted_count = 1
+def test_writes_fall_back_without_transactions(db, mock_mongo_client):
+    session = db.mongo_client.start_session.return_value.__enter__()
+    session.with_transaction.side_effect = OperationFailure(
+        "Transaction numbers are only allowed on a replica set member or mongos",
+        code=20,
+    )
+
+    db.unsubscribe("CAS CS111 A1", "u1")
+    db.unsubscribe("CAS CS112 A1", "u1")
+
+    assert not db.transactions
+    session.with_transaction.assert_called_once()
+    subscriptions = mock_mongo_client[SUBSCRIPTION_LIST]
+    assert subscriptions.delete_many.call_count == 2
+    assert subscriptions.delete_many.call_args.kwargs["session"] is None
+
+
+def subscription(uid: str, created_at: pendulum.DateTime, _id=None) -> dict:
+    doc = {
+        UID: uid,
+        COURSE_NAME: "CAS CS111 A1",
+        SEM_YEAR: "Fall 2025",
+        CREATED_AT: created_at,
+    }
+    return doc if _id is None else {"_id": _id, **doc}
+
+
+def test_unsubscribe_many(db, mock_mongo_client):
+    now = pendulum.now()
+    subscriptions = mock_mongo_client[SUBSCRIPTION_LIST]
+    # u2 has resubscribed since, so only u1's subscription is ended
+    subscriptions.find.return_value = [
+        subscription("u1", now, _id=1),
+        subscription("u2", now.add(minutes=1), _id=2),
+    ]
 
-    result = db.remove_course(test_course)
-    assert result.deleted_count == 1
-    mock_mongo_client[COURSE_LIST].delete_one.assert_called_once_with(
-        {COURSE_NAME: test_course}
+    ended = db.unsubscribe_many(
+        [subscription("u1", now), subscription("u2", now), subscription("u3", now)]
+    )
+
+    assert ended == ["u1"]
+    subscriptions.find.assert_called_once_with(
+        {UID: {"$in": ["u1", "u2", "u3"]}}, session=ANY
+    )
+    subscriptions.delete_many.assert_called_once_with(
+        {"_id": {"$in": [1]}}, session=ANY
+    )
+    [[requests]] = [c.args for c in mock_mongo_client[USER_LIST].bulk_write.mock_calls]
+    assert requests == [
+        UpdateOne(
+            {UID: "u1"},
+            {"$set": {IS_SUBSCRIBED: False, LAST_SUBSCRIPTION: "CAS CS111 A1"}},
+        )
+    ]
+
+    assert db.unsubscribe_many([]) == []
+    subscriptions.find.assert_called_once()
+
+
+def test_prune_users(db, mock_mongo_client):
+    uids = ["u1", "u2"]
+
+    db.prune_users(uids)
+
+    mock_mongo_client[SUBSCRIPTION_LIST].delete_many.assert_called_once_with(
+        {UID: {"$in": uids}}, session=ANY
+    )
+    mock_mongo_client[USER_LIST].delete_many.assert_called_once_with(
+        {UID: {"$in": uids}}, session=ANY
+    )
+
+
+def test_unsubscribing_last_user_deletes_snapshot(db, mock_mongo_client):
+    subscriptions = mock_mongo_client[SUBSCRIPTION_LIST]
+    subscriptions.distinct.return_value = []
+    subscriptions.find.return_value = [subscription("u1", None, _id=1)]
+    db.unsubscribe_many([subscription("u1", None)])
+
+    subscriptions.distinct.assert_called_once_with(
+        COURSE_NAME, {COURSE_NAME: {"$in": ["CAS CS111 A1"]}}, session=ANY
+    )
+    db.snapshot_collection.delete_many.assert_called_once_with(
+        {"_id": {"$in": ["CAS CS111 A1"]}}, session=ANY
+    )
+
+    # Still subscribed by others: the snapshot stays
+    subscriptions.distinct.return_value = ["CAS CS111 A1"]
+    db.snapshot_collection.reset_mock()
+    db.unsubscribe("CAS CS111 A1", "u2")
+    db.snapshot_collection.delete_many.assert_not_called()
+
+    # Purges collect every orphaned snapshot
+    db.purge_expired("Fall 2024", [])
+    db.snapshot_collection.delete_many.assert_called_once_with(
+        {"_id": {"$nin": ["CAS CS111 A1"]}}, session=ANY
     )
 
 
@@ -197,3 +377,185 @@ def test_database_error_handling():
         mock_client.side_effect = PyMongoError("Connection failed")
         with pytest.raises(PyMongoError):
             Database(Environment.DEV)
+
+
+def test_save_snapshots(db):
+    db.snapshot_collection = MagicMock(spec=Collection)
+    db.save_snapshots(
+        [{"_id": "CAS CS111 A1", "a": 0, "w": 1, "t": 2}], ["CAS CS112 A1"]
+    )
+
+    requests = db.snapshot_collection.bulk_write.call_args.args[0]
+    assert [type(r).__name__ for r in requests] == ["ReplaceOne", "DeleteOne"]
+
+    db.snapshot_collection.reset_mock()
+    db.save_snapshots([], [])
+    db.snapshot_collection.bulk_write.assert_not_called()
+
+
+def test_database_init_creates_enrollment_time_series(mock_mongo_client):
+    mock_mongo_client.list_collection_names.return_value = []
+    Database(Environment.DEV)
+    mock_mongo_client.create_collection.assert_called_once_with(
+        ENROLLMENT_LIST,
+        timeseries={
+            "timeField": POLLED_AT,
+            "metaField": COURSE_NAME,
+            "granularity": "minutes",
+        },
+        expireAfterSeconds=ANY,
+    )
+
+    mock_mongo_client.reset_mock()
+    mock_mongo_client.list_collection_names.return_value = [ENROLLMENT_LIST]
+    Database(Environment.DEV)
+    mock_mongo_client.create_collection.assert_not_called()
+
+
+def test_save_enrollment(db):
+    db.enrollment_collection = MagicMock(spec=Collection)
+    samples = [{COURSE_NAME: "CAS CS111 A1", POLLED_AT: pendulum.now(), "a": 0}]
+    db.save_enrollment(samples)
+
+    db.enrollment_collection.insert_many.assert_called_once_with(samples, ordered=False)
+    assert "_id" not in samples[0]
+
+    db.enrollment_collection.reset_mock()
+    db.save_enrollment([])
+    db.enrollment_collection.insert_many.assert_not_called()
+
+
+def test_get_enrollment_history(db):
+    db.enrollment_collection = MagicMock(spec=Collection)
+    start, end = pendulum.now().subtract(days=1), pendulum.now()
+    db.get_enrollment_history("CAS CS111 A1", start, end, 3600)
+
+    [pipeline] = db.enrollment_collection.aggregate.call_args.args
+    assert pipeline[0] == {
+        "$match": {COURSE_NAME: "CAS CS111 A1", POLLED_AT: {"$gte": start, "$lt": end}}
+    }
+    assert pipeline[-1] == {"$unset": "_id"}
+
+
+def test_acquire_lease(db):
+    db.lease_collection = MagicMock(spec=Collection)
+    now, expires_at = pendulum.now(), pendulum.now().add(seconds=60)
+    assert db.acquire_lease(3, "w1", now, expires_at)
+
+    db.lease_collection.update_one.side_effect = DuplicateKeyError("held")
+    assert not db.acquire_lease(3, "w1", now, expires_at)
+
+
+def test_enqueue_notifications_skips_queued_keys(db):
+    db.outbox_collection = MagicMock(spec=Collection)
+    db.outbox_collection.bulk_write.return_value.upserted_count = 1
+    intents = [{"_id": "u1:CAS CS111 A1:Fall 2025:opened", UID: "u1"}]
+
+    assert db.enqueue_notifications(intents) == 1
+    [request] = db.outbox_collection.bulk_write.call_args.args[0]
+    assert request._filter == {"_id": intents[0]["_id"]}
+    assert request._doc == {"$setOnInsert": intents[0]}
+    assert request._upsert
+
+    assert db.enqueue_notifications([]) == 0
+    db.outbox_collection.bulk_write.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_broadcast_outcomes(db):
+    db.broadcast_collection = MagicMock(spec=Collection)
+    db.broadcast_collection.find.return_value = [{UID: "u1"}]
+    outcome = {UID: "u2", STATUS: NotificationStatus.FAILED}
+
+    assert await AsyncDatabase(db).get_broadcast_recipients("b1") == {"u1"}
+    db.broadcast_collection.find.assert_called_once_with(
+        {BROADCAST_ID: "b1", STATUS: NotificationStatus.DELIVERED}, {UID: 1}
+    )
+
+    await AsyncDatabase(db).save_broadcast_outcomes("b1", [outcome])
+    [request] = db.broadcast_collection.bulk_write.call_args.args[0]
+    assert request._filter == {"_id": "b1:u2"}
+    assert request._doc == {BROADCAST_ID: "b1", **outcome}
+
+
+@pytest.mark.asyncio
+async def test_async_database_offloads_calls(db, mock_mongo_client):
+    mock_mongo_client[SUBSCRIPTION_LIST].aggregate.return_value = iter(
+        [{COURSE_NAME: "c"}]
+    )
+    mock_mongo_client[USER_LIST].find_one.return_value = {UID: "u1"}
+    async_db = AsyncDatabase(db)
+
+    assert async_db.env == Environment.DEV
+    assert await async_db.get_all_courses() == [{COURSE_NAME: "c"}]
+    assert await async_db.get_user("u1") == {UID: "u1"}
+    mock_mongo_client[USER_LIST].find_one.assert_called_once_with({UID: "u1"})
+
+
+@pytest.mark.asyncio
+async def test_async_database_caches_user_reads(db, mock_mongo_client):
+    users = mock_mongo_client[USER_LIST]
+    users.find_one.side_effect = [None, {UID: "u1", IS_SUBSCRIBED: True}]
+    async_db = AsyncDatabase(db)
+
+    assert await async_db.get_user("u1") is None
+    assert await async_db.get_user("u1") is None
+    assert users.find_one.call_count == 1
+
+    await async_db.subscribe(Course("CAS CS111 A1"), "u1", pendulum.now())
+    assert await async_db.get_user("u1") == {UID: "u1", IS_SUBSCRIBED: True}
+    assert users.find_one.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_async_database_invalidates_on_unsubscribe_many(db, mock_mongo_client):
+    subscriptions = mock_mongo_client[SUBSCRIPTION_LIST]
+    subscriptions.find_one.return_value = {COURSE_NAME: "CAS CS111 A1"}
+    async_db = AsyncDatabase(db)
+
+    await async_db.get_user_course("u1")
+    await async_db.get_user_course("u2")
+    await async_db.unsubscribe_many([subscription("u1", pendulum.now())])
+    await async_db.get_user_course("u1")
+    await async_db.get_user_course("u2")
+    assert [c.args[0] for c in subscriptions.find_one.call_args_list] == [
+        {UID: "u1"},
+        {UID: "u2"},
+        {UID: "u1"},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_async_database_skips_caching_read_racing_write(db):
+    async_db = AsyncDatabase(db)
+
+    def read_during_write(uid):
+        async_db.invalidate_users([uid])
+        return {UID: uid, IS_SUBSCRIBED: True}
+
+    assert await async_db._read_through(async_db.users, "u1", read_during_write)
+    assert async_db.users.get("u1") is None
+
+
+def test_async_database_applies_change_events(db):
+    async_db = AsyncDatabase(db)
+    for uid in ("u1", "u2"):
+        async_db.users.set(uid, ({UID: uid},))
+        async_db.user_courses.set(uid, (None,))
+
+    async_db.apply_change({"ns": {"coll": USER_LIST}, "fullDocument": {UID: "u1"}})
+    assert async_db.users.get("u1") is None
+    assert async_db.users.get("u2") is not None
+    assert async_db.user_courses.get("u1") is not None
+
+    async_db.apply_change(
+        {"ns": {"coll": SUBSCRIPTION_LIST}, "fullDocument": {UID: "u2"}}
+    )
+    assert async_db.user_courses.get("u2") is None
+    assert async_db.user_courses.get("u1") is not None
+
+    async_db.apply_change({"ns": {"coll": SUBSCRIPTION_LIST}})
+    assert len(async_db.user_courses) == 0
+
+    async_db.apply_change({"ns": {"coll": USER_LIST}})
+    assert len(async_db.users) == 0
@@ -0,0 +1,539 @@
+import asyncio
+import os
+import sys
+
+import pendulum
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import finder
+from src.db import AsyncDatabase
+from src.history import EnrollmentHistory
+from src.leases import partition_of
+from src.outbox import notification_key
+from src.scheduler import PollScheduler
+from src.snapshots import AVAILABLE, SnapshotStore, Transition
+from utils.client import SearchClient
+from utils.constants import (
+    COURSE_NAME,
+    POLLED_AT,
+    SEM_YEAR,
+    SUBSCRIBERS,
+    UID,
+    USER_LIST,
+)
+from utils.models import Course, CourseResponse
+
+
+def make_response(section: str, available: int) -> CourseResponse:
+    return CourseResponse(
+        class_section=section,
+        subject="CASCS",
+        catalog_nbr="111",
+        wait_tot=0,
+        enrollment_available=available,
+    )
+
+
+def queued_users(db: MagicMock) -> set[str]:
+    return {
+        intent[UID]
+        for call in db.enqueue_notifications.call_args_list
+        for intent in call.args[0]
+    }
+
+
+def store_courses(db: MagicMock, course_docs: list[dict]) -> None:
+    """Serve `course_docs` through the sweep cursor and the subscriber lookups.
+
+    As with the subscriptions collection, only courses with users in the requested
+    semester are swept.
+    """
+
+    async def stream(semester, *_):
+        for doc in course_docs:
+            if not doc[USER_LIST] or doc[SEM_YEAR] != semester:
+                continue
+            yield {
+                COURSE_NAME: doc[COURSE_NAME],
+                SEM_YEAR: doc[SEM_YEAR],
+                SUBSCRIBERS: len(doc[USER_LIST]),
+            }
+
+    db.stream_sweep_courses.side_effect = stream
+    db.get_subscribers.side_effect = lambda semester, names: {
+        doc[COURSE_NAME]: dict.fromkeys(doc[USER_LIST])
+        for doc in course_docs
+        if doc[SEM_YEAR] == semester and doc[COURSE_NAME] in names
+    }
+
+
+@pytest.fixture
+def mock_db():
+    db = MagicMock(spec=AsyncDatabase)
+    with patch("src.finder.DB", db):
+        yield db
+
+
+@pytest.fixture
+def mock_bot():
+    bot = MagicMock()
+    bot.send_message = AsyncMock()
+    with patch("src.finder.BOT", bot):
+        yield bot
+
+
+@pytest.mark.asyncio
+async def test_search_courses_polls_concurrently(mock_db, mock_bot):
+    sem_year = Course.get_sem_year()
+    store_courses(
+        mock_db,
+        [
+            {COURSE_NAME: f"CAS CS{100 + i} A1", SEM_YEAR: sem_year, USER_LIST: ["u"]}
+            for i in range(6)
+        ],
+    )
+    in_flight = 0
+    max_in_flight = 0
+
+    async def fake_fetch(_search_url, _session):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return {"A1": make_response("A1", 0)}
+
+    with (
+        patch("src.finder.POLL_CONCURRENCY", 3),
+        patch("utils.client.fetch_sections", fake_fetch),
+    ):
+        await finder.search_courses(
+            SearchClient(MagicMock()), PollScheduler(), SnapshotStore()
+        )
+
+    assert max_in_flight == 3
+    assert queued_users(mock_db) == set()
+
+
+@pytest.mark.asyncio
+async def test_search_courses_notifies_open_and_missing(mock_db, mock_bot):
+    sem_year = Course.get_sem_year()
+    store_courses(
+        mock_db,
+        [
+            {COURSE_NAME: "CAS CS111 A1", SEM_YEAR: sem_year, USER_LIST: ["u1"]},
+            {COURSE_NAME: "CAS CS112 Z1", SEM_YEAR: sem_year, USER_LIST: ["u2"]},
+        ],
+    )
+
+    async def fake_fetch(_search_url, _session):
+        return {"A1": make_response("A1", 1)}
+
+    with patch("utils.client.fetch_sections", fake_fetch):
+        await finder.search_courses(
+            SearchClient(MagicMock()), PollScheduler(), SnapshotStore()
+        )
+
+    mock_db.enqueue_notifications.assert_called_once()
+    assert queued_users(mock_db) == {"u1", "u2"}
+    mock_bot.send_message.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_search_courses_raises_after_sweep(mock_db, mock_bot):
+    sem_year = Course.get_sem_year()
+    store_courses(
+        mock_db,
+        [
+            {COURSE_NAME: "CAS CS111 A1", SEM_YEAR: sem_year, USER_LIST: ["u1"]},
+            {COURSE_NAME: "CAS CS112 A1", SEM_YEAR: sem_year, USER_LIST: ["u2"]},
+        ],
+    )
+
+    async def fake_fetch(search_url, _session):
+        if "catalog_nbr=111" in search_url:
+            raise LookupError("BU is down")
+        return {"A1": make_response("A1", 1)}
+
+    with patch("utils.client.fetch_sections", fake_fetch):
+        with pytest.raises(LookupError):
+            await finder.search_courses(
+                SearchClient(MagicMock()), PollScheduler(), SnapshotStore()
+            )
+
+    assert queued_users(mock_db) == {"u2"}
+
+
+@pytest.mark.asyncio
+async def test_search_courses_fetches_each_search_url_once(mock_db, mock_bot):
+    sem_year = Course.get_sem_year()
+    store_courses(
+        mock_db,
+        [
+            {COURSE_NAME: "CAS CS111 A1", SEM_YEAR: sem_year, USER_LIST: ["u1"]},
+            {COURSE_NAME: "CAS CS111 B1", SEM_YEAR: sem_year, USER_LIST: ["u2"]},
+            {COURSE_NAME: "CAS CS112 A1", SEM_YEAR: sem_year, USER_LIST: ["u3"]},
+        ],
+    )
+    fetch = AsyncMock(
+        return_value={"A1": make_response("A1", 0), "B1": make_response("B1", 1)}
+    )
+
+    with patch("utils.client.fetch_sections", fetch):
+        await finder.search_courses(
+            SearchClient(MagicMock()), PollScheduler(), SnapshotStore()
+        )
+
+    assert fetch.await_count == 2
+    [intent] = mock_db.enqueue_notifications.call_args.args[0]
+    assert intent["_id"] == notification_key(
+        "u2", Course("CAS CS111 B1"), Course.get_sem_year(), Transition.OPENED
+    )
+
+
+@pytest.mark.asyncio
+async def test_search_courses_records_enrollment_history(mock_db, mock_bot):
+    sem_year = Course.get_sem_year()
+    store_courses(
+        mock_db,
+        [
+            {COURSE_NAME: "CAS CS111 A1", SEM_YEAR: sem_year, USER_LIST: ["u1"]},
+            {COURSE_NAME: "CAS CS111 Z1", SEM_YEAR: sem_year, USER_LIST: ["u2"]},
+        ],
+    )
+    history = EnrollmentHistory()
+    fetch = AsyncMock(return_value={"A1": make_response("A1", 0)})
+    mock_db.save_enrollment.side_effect = ConnectionError("write failed")
+
+    with patch("utils.client.fetch_sections", fetch):
+        await finder.search_courses(
+            SearchClient(MagicMock()), PollScheduler(), SnapshotStore(), None, history
+        )
+
+    # Only sections present in the poll are sampled; a failed write keeps them
+    [[samples]] = [call.args for call in mock_db.save_enrollment.call_args_list]
+    assert [sample[COURSE_NAME] for sample in samples] == ["CAS CS111 A1"]
+    assert history.pop_samples() == samples
+
+
+@pytest.mark.asyncio
+async def test_search_courses_samples_fresh_fetches(mock_db, mock_bot):
+    sem_year = Course.get_sem_year()
+    store_courses(
+        mock_db,
+        [
+            {COURSE_NAME: "CAS CS111 A1", SEM_YEAR: sem_year, USER_LIST: ["u1"]},
+        ],
+    )
+    search_url = Course("CAS CS111 A1").search_url
+    search_client = SearchClient(MagicMock())
+    scheduler = PollScheduler()
+    history = EnrollmentHistory()
+    answered = []
+
+    async def fake_fetch(_search_url, _session):
+        answered.append(pendulum.now())
+        return {"A1": make_response("A1", len(answered))}
+
+    with patch("utils.client.fetch_sections", fake_fetch):
+        for _ in range(2):
+            await finder.search_courses(
+                search_client, scheduler, SnapshotStore(), None, history
+            )
+            scheduler.states[search_url].next_poll = 0
+            scheduler._queue = [(0, search_url)]
+            scheduler._allowance = 1
+
+    # Each sample comes from its own request, stamped when BU answered it
+    samples = [call.args[0][0] for call in mock_db.save_enrollment.call_args_list]
+    assert [sample[AVAILABLE] for sample in samples] == [1, 2]
+    assert all(
+        answered[i] <= sample[POLLED_AT] < answered[i].add(seconds=1)
+        for i, sample in enumerate(samples)
+    )
+
+
+@pytest.mark.asyncio
+async def test_search_courses_skips_malformed_sections(mock_db, mock_bot):
+    sem_year = Course.get_sem_year()
+    store_courses(
+        mock_db,
+        [
+            {COURSE_NAME: "CAS CS111 A1", SEM_YEAR: sem_year, USER_LIST: ["u1"]},
+            {COURSE_NAME: "CAS CS111 B1", SEM_YEAR: sem_year, USER_LIST: ["u2"]},
+        ],
+    )
+    snapshots = SnapshotStore()
+    fetch = AsyncMock(return_value={"A1": make_response("A1", 1), "B1": None})
+
+    with patch("utils.client.fetch_sections", fetch):
+        stats = await finder.search_courses(
+            SearchClient(MagicMock()), PollScheduler(), snapshots
+        )
+
+    # B1 could not be read, which is not the same as vanishing
+    assert queued_users(mock_db) == {"u1"}
+    assert stats.completed == 2
+
+
+def test_find_section_suggests_first_section():
+    sections = {"A1": make_response("A1", 0)}
+    assert Course("CAS CS111 A1").find_section(sections) == sections["A1"]
+
+    with pytest.raises(ValueError) as e_info:
+        Course("CAS CS111 Z1").find_section(sections)
+    assert "Did you mean CASCS 111 A1?" in e_info.value.args[0]
+
+
+@pytest.mark.asyncio
+async def test_search_courses_defers_while_breaker_open(mock_db, mock_bot):
+    sem_year = Course.get_sem_year()
+    store_courses(
+        mock_db,
+        [
+            {COURSE_NAME: "CAS CS111 A1", SEM_YEAR: sem_year, USER_LIST: ["u1"]},
+        ],
+    )
+    search_client = SearchClient(MagicMock())
+    scheduler = PollScheduler()
+    fetch = AsyncMock()
+
+    with (
+        patch.object(type(search_client.breaker), "is_open", True),
+        patch("utils.client.fetch_sections", fetch),
+    ):
+        await finder.search_courses(search_client, scheduler, SnapshotStore())
+
+    fetch.assert_not_awaited()
+    assert scheduler.pop_due() == [Course("CAS CS111 A1").search_url]
+
+
+@pytest.mark.asyncio
+async def test_breaker_deferrals_count_due_searches_once_per_trip(
+    mock_db, mock_bot, capsys
+):
+    sem_year = Course.get_sem_year()
+    store_courses(
+        mock_db,
+        [
+            {COURSE_NAME: "CAS CS111 A1", SEM_YEAR: sem_year, USER_LIST: ["u1"]},
+            {COURSE_NAME: "CAS CS112 A1", SEM_YEAR: sem_year, USER_LIST: ["u2"]},
+        ],
+    )
+    search_client = SearchClient(MagicMock())
+    scheduler, courses = PollScheduler(), finder.CourseList()
+    fetch = AsyncMock(return_value={"A1": make_response("A1", 0)})
+    with patch("utils.client.fetch_sections", fetch):
+        await finder.search_courses(
+            search_client, scheduler, SnapshotStore(), courses=courses
+        )
+    scheduler.states[Course("CAS CS111 A1").search_url].next_poll = 0
+    scheduler.states[Course("CAS CS112 A1").search_url].next_poll = float("inf")
+    search_client.breaker._open()
+
+    async def tick() -> finder.SweepStats:
+        return await finder.search_courses(
+            search_client, scheduler, SnapshotStore(), courses=courses
+        )
+
+    capsys.readouterr()
+    assert (await tick()).skipped == 1
+    await tick()
+    assert capsys.readouterr().out.count("Class search unavailable") == 1
+
+    # A failed trial opens the breaker again: a new trip, reported again
+    search_client.breaker._open()
+    await tick()
+    assert capsys.readouterr().out.count("Class search unavailable") == 1
+
+
+@pytest.mark.asyncio
+async def test_search_courses_acts_only_on_transitions(mock_db, mock_bot):
+    sem_year = Course.get_sem_year()
+    store_courses(
+        mock_db,
+        [
+            {COURSE_NAME: "CAS CS111 A1", SEM_YEAR: sem_year, USER_LIST: ["u1"]},
+        ],
+    )
+    search_url = Course("CAS CS111 A1").search_url
+    scheduler = PollScheduler()
+    snapshots = SnapshotStore()
+    fetch = AsyncMock(return_value={"A1": make_response("A1", 0)})
+
+    with patch("utils.client.fetch_sections", fetch):
+        await finder.search_courses(SearchClient(MagicMock()), scheduler, snapshots)
+        mock_db.save_snapshots.assert_called_once()
+        assert mock_db.save_snapshots.call_args.args[0][0]["_id"] == "CAS CS111 A1"
+
+        # Unchanged poll: nothing to notify or persist
+        scheduler.states[search_url].next_poll = 0
+        scheduler._queue = [(0, search_url)]
+        await finder.search_courses(SearchClient(MagicMock()), scheduler, snapshots)
+        mock_db.save_snapshots.assert_called_once()
+        mock_db.enqueue_notifications.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_search_courses_skips_unleased_partitions(mock_db, mock_bot):
+    sem_year = Course.get_sem_year()
+    store_courses(
+        mock_db,
+        [
+            {COURSE_NAME: "CAS CS111 A1", SEM_YEAR: sem_year, USER_LIST: []},
+            {COURSE_NAME: "CAS CS112 A1", SEM_YEAR: sem_year, USER_LIST: ["u1"]},
+        ],
+    )
+    fetch = AsyncMock(return_value={"A1": make_response("A1", 1)})
+    partitions = frozenset({partition_of("CAS CS112 A1")})
+    assert partition_of("CAS CS111 A1") not in partitions
+
+    with patch("utils.client.fetch_sections", fetch):
+        await finder.search_courses(
+            SearchClient(MagicMock()), PollScheduler(), SnapshotStore(), partitions
+        )
+
+    assert queued_users(mock_db) == {"u1"}
+
+
+@pytest.mark.asyncio
+async def test_search_courses_reuses_course_list_between_refreshes(mock_db, mock_bot):
+    sem_year = Course.get_sem_year()
+    store_courses(
+        mock_db,
+        [
+            {COURSE_NAME: "CAS CS111 A1", SEM_YEAR: sem_year, USER_LIST: ["u1"]},
+        ],
+    )
+    search_url = Course("CAS CS111 A1").search_url
+    scheduler = PollScheduler()
+    courses = finder.CourseList()
+    fetch = AsyncMock(return_value={"A1": make_response("A1", 0)})
+
+    async def tick(partitions=None):
+        scheduler.states[search_url].next_poll = 0
+        scheduler._queue = [(0, search_url)]
+        scheduler._allowance = 1
+        await finder.search_courses(
+            SearchClient(MagicMock()),
+            scheduler,
+            SnapshotStore(),
+            partitions,
+            courses=courses,
+        )
+
+    with patch("utils.client.fetch_sections", fetch):
+        await finder.search_courses(
+            SearchClient(MagicMock()), scheduler, SnapshotStore(), courses=courses
+        )
+        await tick()
+        assert mock_db.stream_sweep_courses.call_count == 1
+        assert fetch.await_count == 2
+
+        # New leases reload the list at once, as does the refresh interval elapsing
+        await tick(frozenset({partition_of("CAS CS111 A1")}))
+        assert mock_db.stream_sweep_courses.call_count == 2
+        with patch("src.finder.COURSE_REFRESH_SECONDS", 0):
+            await tick(courses.partitions)
+        assert mock_db.stream_sweep_courses.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_search_courses_bypasses_search_cache(mock_db, mock_bot):
+    sem_year = Course.get_sem_year()
+    store_courses(
+        mock_db,
+        [
+            {COURSE_NAME: "CAS CS111 A1", SEM_YEAR: sem_year, USER_LIST: ["u1"]},
+        ],
+    )
+    search_url = Course("CAS CS111 A1").search_url
+    search_client = SearchClient(MagicMock())
+    search_client.cache.set(search_url, {"A1": make_response("A1", 0)})
+    fetch = AsyncMock(return_value={"A1": make_response("A1", 3)})
+
+    with patch("utils.client.fetch_sections", fetch):
+        await finder.search_courses(search_client, PollScheduler(), SnapshotStore())
+
+    fetch.assert_awaited_once()
+    assert search_client.cache.get(search_url)["A1"].enrollment_available == 3
+
+
+@pytest.mark.asyncio
+async def test_search_courses_skips_overlapping_sweep(mock_db, mock_bot):
+    fetch = AsyncMock()
+    async with finder.SWEEP_LOCK:
+        with patch("utils.client.fetch_sections", fetch):
+            stats = await finder.search_courses(
+                SearchClient(MagicMock()), PollScheduler(), SnapshotStore()
+            )
+
+    assert stats.overlapped
+    mock_db.stream_sweep_courses.assert_not_called()
+    fetch.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_search_courses_carries_over_past_budget(mock_db, mock_bot):
+    sem_year = Course.get_sem_year()
+    store_courses(
+        mock_db,
+        [
+            {COURSE_NAME: "CAS CS111 A1", SEM_YEAR: sem_year, USER_LIST: ["u1"]},
+            {COURSE_NAME: "CAS CS112 A1", SEM_YEAR: sem_year, USER_LIST: ["u2"]},
+        ],
+    )
+    slow_url = Course("CAS CS112 A1").search_url
+
+    async def fake_fetch(search_url, _session):
+        if search_url == slow_url:
+            await asyncio.sleep(1)
+        return {"A1": make_response("A1", 0)}
+
+    scheduler = PollScheduler()
+    with (
+        patch("src.finder.SWEEP_BUDGET_SECONDS", 0.05),
+        patch("utils.client.fetch_sections", fake_fetch),
+    ):
+        stats = await finder.search_courses(
+            SearchClient(MagicMock()), scheduler, SnapshotStore()
+        )
+
+    assert (stats.completed, stats.skipped, stats.carried_over) == (1, 0, 1)
+    # The unfinished search is due again ahead of everything else
+    assert scheduler.pop_due() == [slow_url]
+
+
+@pytest.mark.asyncio
+async def test_search_courses_loads_subscribers_only_to_notify(mock_db, mock_bot):
+    sem_year = Course.get_sem_year()
+    store_courses(
+        mock_db,
+        [
+            {COURSE_NAME: "CAS CS111 A1", SEM_YEAR: sem_year, USER_LIST: ["u1"]},
+            {COURSE_NAME: "CAS CS111 B1", SEM_YEAR: sem_year, USER_LIST: ["u2"]},
+        ],
+    )
+    snapshots = SnapshotStore()
+    fetch = AsyncMock(
+        return_value={"A1": make_response("A1", 0), "B1": make_response("B1", 0)}
+    )
+
+    with patch("utils.client.fetch_sections", fetch):
+        await finder.search_courses(
+            SearchClient(MagicMock()), PollScheduler(), snapshots
+        )
+        mock_db.get_subscribers.assert_not_awaited()
+
+        fetch.return_value = {
+            "A1": make_response("A1", 0),
+            "B1": make_response("B1", 2),
+        }
+        await finder.search_courses(
+            SearchClient(MagicMock()), PollScheduler(), snapshots
+        )
+
+    mock_db.get_subscribers.assert_awaited_with(sem_year, ["CAS CS111 B1"])
+    assert queued_users(mock_db) == {"u2"}
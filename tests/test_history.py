@@ -0,0 +1,75 @@
+import os
+import sys
+
+import pendulum
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.history import (
+    AVAILABLE_MAX,
+    AVAILABLE_MIN,
+    WAITLIST_MAX,
+    EnrollmentHistory,
+    downsample,
+)
+from src.snapshots import AVAILABLE, WAITLIST
+from utils.constants import COURSE_NAME, POLLED_AT, SAMPLES
+from utils.models import Course, CourseResponse
+
+COURSE = Course("CAS CS111 A1")
+EPOCH = pendulum.from_timestamp(0)
+
+
+def make_response(available: int, waitlist: int = 0) -> CourseResponse:
+    return CourseResponse(
+        class_section="A1",
+        subject="CASCS",
+        catalog_nbr="111",
+        wait_tot=waitlist,
+        enrollment_available=available,
+    )
+
+
+def sample(seconds: int, available: int, waitlist: int = 0) -> dict:
+    return {
+        COURSE_NAME: str(COURSE),
+        POLLED_AT: EPOCH.add(seconds=seconds),
+        AVAILABLE: available,
+        WAITLIST: waitlist,
+    }
+
+
+def test_record_and_pop():
+    history = EnrollmentHistory()
+    history.record(COURSE, make_response(2, 5), EPOCH)
+
+    assert history.pop_samples() == [sample(0, 2, 5)]
+    assert len(history) == 0
+
+
+def test_buffer_drops_oldest_samples():
+    history = EnrollmentHistory(limit=2)
+    for seconds in range(3):
+        history.record(COURSE, make_response(seconds), EPOCH.add(seconds=seconds))
+    assert [s[AVAILABLE] for s in history.samples] == [1, 2]
+    assert history.dropped == 1
+
+    # A failed write goes back ahead of newer samples, still within the bound
+    failed = history.pop_samples()
+    history.record(COURSE, make_response(3), EPOCH.add(seconds=3))
+    history.restore(failed)
+    assert [s[AVAILABLE] for s in history.samples] == [2, 3]
+    assert history.dropped == 2
+
+
+def test_downsample_summarizes_windows():
+    windows = downsample(
+        [sample(0, 0, 4), sample(30, 2, 3), sample(59, 1, 3), sample(60, 0, 5)], 60
+    )
+
+    assert [(w[POLLED_AT], w[SAMPLES]) for w in windows] == [
+        (EPOCH, 3),
+        (EPOCH.add(minutes=1), 1),
+    ]
+    first = windows[0]
+    assert (first[AVAILABLE], first[AVAILABLE_MIN], first[AVAILABLE_MAX]) == (1, 0, 2)
+    assert (first[WAITLIST], first[WAITLIST_MAX]) == (3, 4)
@@ -0,0 +1,66 @@
+import os
+import sys
+
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.db import Database
+from src.leases import LeaseManager, partition_of
+
+
+def make_db(owned: list[int], live_workers: int, free: set[int]):
+    db = MagicMock(spec=Database)
+    db.renew_leases.return_value = owned
+    db.count_live_workers.return_value = live_workers
+    db.acquire_lease.side_effect = lambda p, *_: p in free
+    return db
+
+
+def test_partition_of_groups_sections_of_a_search():
+    assert partition_of("CAS CS111 A1") == partition_of("CAS CS111 B1")
+    assert 0 <= partition_of("CAS CS111 A1", partitions=4) < 4
+
+
+def test_heartbeat_acquires_fair_share():
+    db = make_db(owned=[], live_workers=2, free={1, 2, 5, 6, 7})
+    leases = LeaseManager(db, "w1", partitions=8)
+
+    owned = leases.heartbeat()
+    assert len(owned) == 4
+    assert owned <= {1, 2, 5, 6, 7}
+    db.heartbeat_worker.assert_called_once()
+    db.release_leases.assert_not_called()
+
+
+def test_heartbeat_releases_extras_when_workers_join():
+    db = make_db(owned=list(range(8)), live_workers=4, free=set())
+    leases = LeaseManager(db, "w1", partitions=8)
+
+    assert leases.heartbeat() == {0, 1}
+    db.release_leases.assert_called_once_with("w1", [2, 3, 4, 5, 6, 7])
+    db.acquire_lease.assert_not_called()
+
+
+def test_heartbeat_takes_over_expired_leases():
+    db = make_db(owned=[0, 1], live_workers=1, free={2, 3})
+    leases = LeaseManager(db, "w1", partitions=4)
+    assert leases.heartbeat() == {0, 1, 2, 3}
+
+    leases.release()
+    db.release_leases.assert_called_with("w1", [0, 1, 2, 3])
+    db.remove_worker.assert_called_once_with("w1")
+
+
+def test_renew_keeps_leases_without_rebalancing():
+    db = make_db(owned=[0, 1], live_workers=1, free={2, 3})
+    leases = LeaseManager(db, "w1", partitions=4)
+    assert leases.heartbeat() == {0, 1, 2, 3}
+    db.reset_mock()
+
+    # Another worker took partition 3 after a missed renewal
+    db.renew_leases.return_value = [0, 1, 2]
+    assert leases.renew() == {0, 1, 2}
+    db.heartbeat_worker.assert_called_once()
+    db.count_live_workers.assert_not_called()
+    db.acquire_lease.assert_not_called()
+    db.release_leases.assert_not_called()
@@ -1,10 +1,12 @@
+import json
 import os
 import sys
 
 import pytest
+from unittest.mock import MagicMock
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils.models import Course
+from utils.models import Course, parse_sections
 
 
 def test_course_init():
@@ -35,3 +37,55 @@ def test_missing_course():
 
     assert e_info.type is ValueError
     assert f"{course} was not found. Did you mean CASCS 111" in e_info.value.args[0]
+
+
+def test_course_response_uses_injected_session():
+    course = Course("CAS CS111 A1")
+    session = MagicMock()
+    session.get.return_value.content = json.dumps(
+        {
+            "classes": [
+                {
+                    "class_section": "A1",
+                    "subject": "CASCS",
+                    "catalog_nbr": course.number,
+                    "descr": "Introduction to Computer Science 1",
+                    "wait_tot": 3,
+                    "enrollment_available": 0,
+                }
+            ]
+        }
+    ).encode()
+
+    course_response = course.get_course_section(session)
+    session.get.assert_called_once_with(course.search_url, impersonate="chrome")
+    assert course_response.wait_tot == 3
+
+
+def test_parse_sections_rejects_malformed_payload():
+    response = MagicMock()
+    response.content = b'{"classes": {"class_section": "A1"}}'
+    with pytest.raises(LookupError):
+        parse_sections(response, "url")
+
+
+def test_parse_sections_isolates_malformed_sections():
+    section = {
+        "class_section": "A1",
+        "subject": "CASCS",
+        "catalog_nbr": "111",
+        "wait_tot": 3,
+        "enrollment_available": 0,
+    }
+    response = MagicMock()
+    response.content = json.dumps(
+        {"classes": [section, {**section, "class_section": "B1", "wait_tot": None}]}
+    ).encode()
+
+    sections = parse_sections(response, "url")
+    assert Course("CAS CS111 A1").find_section(sections).wait_tot == 3
+    assert sections["B1"] is None
+    with pytest.raises(LookupError):
+        Course("CAS CS111 B1").find_section(sections)
+    with pytest.raises(ValueError):
+        Course("CAS CS111 C1").find_section(sections)
@@ -0,0 +1,91 @@
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from telegram.error import BadRequest, Forbidden, RetryAfter, TimedOut
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.notifier import FanOutReport, Notifier, is_dead_chat, percentile
+
+
+def make_bot(delay: float = 0.0):
+    bot = MagicMock()
+
+    async def send_message(**_):
+        await asyncio.sleep(delay)
+
+    bot.send_message = AsyncMock(side_effect=send_message)
+    return bot
+
+
+@pytest.mark.asyncio
+async def test_fan_out_sends_concurrently():
+    notifier = Notifier(make_bot(delay=0.05), rate=100, burst=100)
+    start = time.monotonic()
+    report = await notifier.fan_out([f"u{i}" for i in range(20)], "open")
+
+    assert time.monotonic() - start < 0.5
+    assert len(report.sent) == 20 and not report.failed
+    assert len(report.latencies) == 20
+
+
+@pytest.mark.asyncio
+async def test_fan_out_respects_global_rate():
+    notifier = Notifier(make_bot(), rate=50, burst=5)
+    start = time.monotonic()
+    await notifier.fan_out([f"u{i}" for i in range(10)], "open")
+
+    # 5 sends from the burst, then 5 more at 50 per second
+    assert time.monotonic() - start >= 0.09
+
+
+@pytest.mark.asyncio
+async def test_same_chat_is_spaced():
+    notifier = Notifier(make_bot(), rate=100, burst=100, chat_interval=0.1)
+    start = time.monotonic()
+    await asyncio.gather(notifier.send("u1", "a"), notifier.send("u1", "b"))
+    assert time.monotonic() - start >= 0.1
+
+
+@pytest.mark.asyncio
+async def test_retry_after_pauses_and_retries():
+    bot = make_bot()
+    bot.send_message.side_effect = [RetryAfter(0), None]
+    notifier = Notifier(bot, rate=100, burst=100, chat_interval=0)
+    report = await notifier.fan_out(["u1"], "open")
+
+    assert report.sent == ["u1"]
+    assert bot.send_message.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_retry_after_gives_up_after_max_retries():
+    bot = make_bot()
+    bot.send_message.side_effect = RetryAfter(0)
+    notifier = Notifier(bot, rate=100, burst=100, chat_interval=0, max_retries=2)
+    report = await notifier.fan_out(["u1"], "open")
+
+    assert isinstance(report.failed["u1"], RetryAfter)
+    assert bot.send_message.await_count == 3
+
+
+def test_report_percentiles():
+    report = FanOutReport(sent=["u"] * 10, latencies=[i / 10 for i in range(1, 11)])
+    assert percentile(report.latencies, 50) == 0.5
+    assert percentile(report.latencies, 99) == 1.0
+    assert percentile([], 50) == 0.0
+    assert str(report).startswith("10/10 delivered")
+
+
+def test_dead_chats_are_told_apart_from_transient_failures():
+    assert is_dead_chat(Forbidden("Forbidden: bot was blocked by the user"))
+    assert is_dead_chat(BadRequest("Chat not found"))
+    assert not is_dead_chat(BadRequest("Can't parse entities"))
+    assert not is_dead_chat(TimedOut())
+    assert not is_dead_chat(RetryAfter(5))
+
+    report = FanOutReport(failed={"u1": Forbidden("blocked"), "u2": TimedOut()})
+    assert report.dead == ["u1"]
@@ -0,0 +1,217 @@
+import os
+import sys
+
+import pendulum
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from telegram.error import Forbidden, TimedOut
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.db import AsyncDatabase
+from src.memory_db import MemoryDatabase
+from src.notifier import Notifier
+from src.outbox import OutboxDrainer, make_intents, subscription_of
+from utils.constants import (
+    Environment,
+    ATTEMPTS,
+    COURSE_NAME,
+    IS_SUBSCRIBED,
+    LAST_SUBSCRIPTION,
+    UID,
+)
+from utils.models import Course
+
+NOW = pendulum.datetime(2025, 9, 1)
+
+
+def make_drainer(db: MagicMock, bot: MagicMock, **kwargs) -> OutboxDrainer:
+    notifier = Notifier(bot, rate=100, burst=100, chat_interval=0, max_retries=0)
+    return OutboxDrainer(db, notifier, **kwargs)
+
+
+def keep_subscribed(db: MagicMock, intents: list[dict]) -> None:
+    """Serve the subscriptions `intents` were queued for as still live."""
+    db.get_user_subscriptions.return_value = [
+        subscription_of(intent) for intent in intents
+    ]
+
+
+@pytest.fixture
+def mock_db():
+    return MagicMock(spec=AsyncDatabase)
+
+
+@pytest.fixture
+def mock_bot():
+    bot = MagicMock()
+
+    async def send_message(chat_id, **_):
+        if chat_id == "blocked":
+            raise Forbidden("Forbidden: bot was blocked by the user")
+        if chat_id == "flaky":
+            raise TimedOut()
+
+    bot.send_message = AsyncMock(side_effect=send_message)
+    return bot
+
+
+def test_intents_are_keyed_per_user_and_event():
+    course = Course("CAS CS111 A1")
+    first = make_intents(course, "Fall 2025", "opened", "open!", ["u1", "u2"], NOW)
+    again = make_intents(course, "Fall 2025", "opened", "open!", ["u1"], NOW.add(1))
+
+    assert len({intent["_id"] for intent in first}) == 2
+    assert again[0]["_id"] == first[0]["_id"]
+
+
+def test_intents_are_keyed_per_subscription():
+    course = Course("CAS CS111 A1")
+    first = make_intents(
+        course, "Fall 2025", "opened", "", ["u1"], NOW, subscribed_at={"u1": NOW}
+    )
+    again = make_intents(
+        course, "Fall 2025", "opened", "", ["u1"], NOW, subscribed_at={"u1": NOW}
+    )
+    resubscribed = make_intents(
+        course, "Fall 2025", "opened", "", ["u1"], NOW, {"u1": NOW.add(minutes=1)}
+    )
+
+    assert again[0]["_id"] == first[0]["_id"]
+    assert resubscribed[0]["_id"] != first[0]["_id"]
+
+
+@pytest.mark.asyncio
+async def test_resubscribed_user_is_notified_again(mock_bot):
+    db = AsyncDatabase(MemoryDatabase(Environment.DEV))
+    course = Course("CAS CS111 A1")
+    semester = Course.get_sem_year()
+
+    async def detect_opening() -> int:
+        [users] = (await db.get_subscribers(semester, [str(course)])).values()
+        intents = make_intents(
+            course, semester, "opened", "open!", users, subscribed_at=users
+        )
+        return await db.enqueue_notifications(intents)
+
+    await db.subscribe(course, "u1", NOW)
+    assert await detect_opening() == 1
+    assert await detect_opening() == 0
+    await make_drainer(db, mock_bot).drain()
+    assert await db.get_user_course("u1") is None
+
+    # The delivered intent is still retained, but the new subscription has its own key
+    await db.subscribe(course, "u1", NOW.add(minutes=1))
+    assert await detect_opening() == 1
+    await make_drainer(db, mock_bot).drain()
+    assert mock_bot.send_message.await_count == 2
+    assert await db.get_user_course("u1") is None
+
+
+@pytest.mark.asyncio
+async def test_drain_delivers_unsubscribes_then_settles(mock_db, mock_bot):
+    course = Course("CAS CS111 A1")
+    intents = make_intents(course, "Fall 2025", "opened", "open!", ["u1", "u2"], NOW)
+    keep_subscribed(mock_db, intents)
+    mock_db.claim_notifications.side_effect = [intents, []]
+    calls = MagicMock()
+    mock_db.unsubscribe_many.side_effect = calls.unsubscribe_many
+    mock_db.settle_notifications.side_effect = calls.settle_notifications
+
+    stats = await make_drainer(mock_db, mock_bot, batch_size=2).drain()
+
+    assert stats.delivered == 2
+    assert mock_bot.send_message.await_count == 2
+    assert [c[0] for c in calls.mock_calls] == [
+        "unsubscribe_many",
+        "settle_notifications",
+    ]
+    [subscriptions] = mock_db.unsubscribe_many.call_args.args
+    assert {subscription[UID] for subscription in subscriptions} == {"u1", "u2"}
+    delivered, retries, failed, _ = mock_db.settle_notifications.call_args.args
+    assert sorted(delivered) == sorted(intent["_id"] for intent in intents)
+    assert retries == {} and failed == []
+
+
+@pytest.mark.asyncio
+async def test_drain_retries_then_gives_up(mock_db, mock_bot):
+    course = Course("CAS CS111 A1")
+    fresh, stale = make_intents(
+        course, "Fall 2025", "opened", "open!", ["flaky", "flaky"], NOW
+    )
+    fresh["_id"], stale["_id"] = "fresh", "stale"
+    stale[ATTEMPTS] = 4
+    keep_subscribed(mock_db, [fresh])
+    mock_db.claim_notifications.return_value = [fresh, stale]
+
+    drainer = make_drainer(mock_db, mock_bot, max_attempts=5, retry_base=5)
+    stats = await drainer.drain()
+
+    assert (stats.delivered, stats.retried, stats.failed) == (0, 1, 1)
+    mock_db.prune_users.assert_called_once_with([])
+    mock_db.unsubscribe_many.assert_called_once()
+    assert mock_db.unsubscribe_many.call_args.args == ([],)
+    delivered, retries, failed, now = mock_db.settle_notifications.call_args.args
+    assert delivered == [] and failed == ["stale"]
+    assert now.add(seconds=2.5) <= retries["fresh"] <= now.add(seconds=5)
+
+
+@pytest.mark.asyncio
+async def test_drain_prunes_dead_chats_without_retrying(mock_db, mock_bot):
+    course = Course("CAS CS111 A1")
+    intents = make_intents(
+        course, "Fall 2025", "opened", "open!", ["u1", "blocked"], NOW
+    )
+    keep_subscribed(mock_db, intents)
+    mock_db.claim_notifications.return_value = intents
+
+    stats = await make_drainer(mock_db, mock_bot).drain()
+
+    assert (stats.delivered, stats.retried, stats.failed) == (1, 0, 1)
+    assert stats.pruned == 1
+    mock_db.prune_users.assert_called_once_with(["blocked"])
+    _, retries, failed, _ = mock_db.settle_notifications.call_args.args
+    assert retries == {} and failed == [intents[1]["_id"]]
+
+
+@pytest.mark.asyncio
+async def test_drain_drops_notifications_of_ended_subscriptions(mock_bot):
+    db = AsyncDatabase(MemoryDatabase(Environment.DEV))
+    course, other = Course("CAS CS111 A1"), Course("CAS CS112 A1")
+    semester = Course.get_sem_year()
+    await db.subscribe(course, "u1", NOW)
+    [users] = (await db.get_subscribers(semester, [str(course)])).values()
+    await db.enqueue_notifications(
+        make_intents(course, semester, "opened", "open!", users, subscribed_at=users)
+    )
+
+    # The user moves on while the notification waits for delivery
+    await db.unsubscribe(course, "u1")
+    await db.subscribe(other, "u1", NOW.add(minutes=1))
+    stats = await make_drainer(db, mock_bot).drain()
+
+    assert (stats.delivered, stats.dropped) == (0, 1)
+    mock_bot.send_message.assert_not_awaited()
+    assert (await db.get_user_course("u1"))[COURSE_NAME] == str(other)
+    user = await db.get_user("u1")
+    assert user[IS_SUBSCRIBED] and user[LAST_SUBSCRIPTION] == str(other)
+
+
+@pytest.mark.asyncio
+async def test_drain_delivers_notices_without_unsubscribing(mock_db, mock_bot):
+    course = Course("CAS CS111 A1")
+    intents = make_intents(
+        course,
+        "Spring 2025",
+        "expired",
+        "expired",
+        ["u1"],
+        NOW,
+        ends_subscription=False,
+    )
+    mock_db.claim_notifications.return_value = intents
+
+    stats = await make_drainer(mock_db, mock_bot).drain()
+
+    assert stats.delivered == 1
+    mock_db.get_user_subscriptions.assert_not_called()
+    mock_db.unsubscribe_many.assert_called_once_with([])
@@ -0,0 +1,50 @@
+import os
+import sys
+
+import pendulum
+import pytest
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.db import AsyncDatabase
+from src.memory_db import MemoryDatabase
+from src.outbox import notification_key
+from src.rollover import SemesterRollover
+from utils.constants import Environment, IS_SUBSCRIBED
+from utils.models import Course
+
+
+@pytest.fixture
+def db():
+    return AsyncDatabase(MemoryDatabase(Environment.DEV))
+
+
+@pytest.mark.asyncio
+async def test_rollover_notifies_and_purges_past_semesters(db):
+    with patch.object(Course, "get_sem_year", return_value="Fall 2000"):
+        await db.subscribe(Course("CAS CS111 A1"), "u1", pendulum.now())
+        await db.subscribe(Course("CAS CS111 A1"), "u2", pendulum.now())
+    await db.subscribe(Course("CAS CS112 A1"), "u3", pendulum.now())
+
+    assert await SemesterRollover(db).check() == 2
+
+    assert set(db.sync.outbox) == {
+        notification_key(uid, Course("CAS CS111 A1"), "Fall 2000", "expired")
+        for uid in ("u1", "u2")
+    }
+    assert await db.get_expired_courses(Course.get_sem_year()) == []
+    assert not (await db.get_user("u1"))[IS_SUBSCRIBED]
+    assert await db.get_user_course("u3") is not None
+
+
+@pytest.mark.asyncio
+async def test_rollover_runs_once_per_semester(db):
+    rollover = SemesterRollover(db)
+    with patch.object(db.sync, "get_expired_courses", return_value=[]) as query:
+        await rollover.check()
+        await rollover.check()
+        assert query.call_count == 1
+
+        with patch.object(Course, "get_sem_year", return_value="Fall 2999"):
+            await rollover.check()
+        assert query.call_count == 2
@@ -0,0 +1,72 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.scheduler import PollScheduler
+
+
+def make_scheduler():
+    return PollScheduler(min_interval=5, base_interval=60, max_interval=600)
+
+
+def test_new_searches_are_due_immediately():
+    scheduler = make_scheduler()
+    scheduler.sync({"a": 1, "b": 1}, now=0)
+    assert sorted(scheduler.pop_due(now=0)) == ["a", "b"]
+    assert scheduler.pop_due(now=1) == []
+
+
+def test_dropped_searches_are_not_polled():
+    scheduler = make_scheduler()
+    scheduler.sync({"a": 1, "b": 1}, now=0)
+    scheduler.sync({"a": 1}, now=0)
+    assert scheduler.pop_due(now=0) == ["a"]
+    assert len(scheduler) == 1
+
+
+def test_volatile_search_speeds_up_and_dormant_backs_off():
+    scheduler = make_scheduler()
+    scheduler.sync({"hot": 1, "cold": 1}, now=0)
+    scheduler.pop_due(now=0)
+    scheduler.record("hot", changed=True, now=0)
+    scheduler.record("cold", changed=False, now=0)
+
+    hot, cold = scheduler.states["hot"], scheduler.states["cold"]
+    assert hot.interval < 60 < cold.interval
+    assert hot.next_poll < cold.next_poll
+
+
+def test_carried_over_search_keeps_its_priority():
+    scheduler = make_scheduler()
+    scheduler.sync({"a": 1}, now=0)
+    scheduler.pop_due(now=0)
+    scheduler.sync({"a": 1, "b": 1}, now=1)
+
+    scheduler.carry_over("a")
+    assert scheduler.states["a"].next_poll == 0
+    assert scheduler.pop_due(now=1) == ["a", "b"]
+
+
+def test_subscribers_shorten_delay():
+    scheduler = make_scheduler()
+    scheduler.sync({"popular": 8, "niche": 1}, now=0)
+    popular = scheduler.states["popular"]
+    niche = scheduler.states["niche"]
+    assert scheduler.delay(popular) == 15
+    assert scheduler.delay(niche) == 60
+
+
+def test_poll_budget_matches_fixed_interval():
+    scheduler = make_scheduler()
+    searches = {str(i): 1 for i in range(10)}
+    scheduler.sync(searches, now=0)
+    polls = len(scheduler.pop_due(now=0))
+
+    # Every search is hot, but polls stay within one per search per base interval
+    for tick in range(1, 121):
+        now = tick * 5
+        for search_url in scheduler.pop_due(now=now):
+            scheduler.record(search_url, changed=True, now=now)
+            polls += 1
+
+    assert polls <= 10 + 10 * 600 / 60
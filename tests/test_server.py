@@ -0,0 +1,86 @@
+import asyncio
+import os
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, MagicMock, patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import server
+
+UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 1,
+        "date": 0,
+        "chat": {"id": 1, "type": "private"},
+        "text": "/start",
+    },
+}
+
+
+@pytest.fixture
+def application():
+    application = MagicMock()
+    for method in (
+        "initialize",
+        "start",
+        "stop",
+        "shutdown",
+        "post_init",
+        "post_shutdown",
+    ):
+        setattr(application, method, AsyncMock())
+    application.post_stop = None
+    application.bot = MagicMock()
+    application.bot.set_webhook = AsyncMock()
+    application.update_queue = asyncio.Queue()
+    with (
+        patch("src.server.APPLICATION", application),
+        patch("src.server.WEBHOOK_URL", "https://alert.example.com"),
+        patch("src.server.WEBHOOK_SECRET", "secret"),
+    ):
+        yield application
+
+
+def test_webhook_runs_application_lifecycle(application):
+    with TestClient(server.app):
+        application.initialize.assert_awaited_once()
+        application.post_init.assert_awaited_once_with(application)
+        application.start.assert_awaited_once()
+        application.bot.set_webhook.assert_awaited_once()
+        assert (
+            application.bot.set_webhook.call_args.kwargs["url"]
+            == "https://alert.example.com/telegram"
+        )
+
+    application.stop.assert_awaited_once()
+    application.shutdown.assert_awaited_once()
+    application.post_shutdown.assert_awaited_once_with(application)
+
+
+def test_webhook_queues_updates(application):
+    with TestClient(server.app) as client:
+        response = client.post(
+            "/telegram",
+            json=UPDATE,
+            headers={"X-Telegram-Bot-Api-Secret-Token": "secret"},
+        )
+
+    assert response.status_code == 200
+    assert application.update_queue.get_nowait().update_id == 1
+
+
+def test_webhook_rejects_wrong_secret(application):
+    with TestClient(server.app) as client:
+        response = client.post("/telegram", json=UPDATE)
+
+    assert response.status_code == 403
+    assert application.update_queue.empty()
+
+
+def test_webhook_disabled_without_application():
+    client = TestClient(server.app)
+    assert client.get("/").json() == {"Hello": "World"}
+    assert client.post("/telegram", json=UPDATE).status_code == 404
@@ -0,0 +1,70 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.snapshots import SnapshotStore, Transition
+from utils.models import Course, CourseResponse
+
+COURSE = Course("CAS CS111 A1")
+
+
+def make_response(available: int, waitlist: int = 0) -> CourseResponse:
+    return CourseResponse(
+        class_section="A1",
+        subject="CASCS",
+        catalog_nbr="111",
+        wait_tot=waitlist,
+        enrollment_available=available,
+    )
+
+
+def test_first_closed_poll_is_recorded_silently():
+    store = SnapshotStore()
+    assert store.diff(COURSE, make_response(0), now=1) is None
+    assert store.snapshots["CAS CS111 A1"].timestamp == 1
+
+
+def test_opened_consumes_snapshot():
+    store = SnapshotStore()
+    store.diff(COURSE, make_response(0), now=1)
+    event = store.diff(COURSE, make_response(2), now=2)
+    assert event.kind == Transition.OPENED
+    assert event.previous.enrollment_available == 0
+    assert "CAS CS111 A1" not in store.snapshots
+
+    # A later subscriber sees the still-open section as a fresh opening
+    assert store.diff(COURSE, make_response(2), now=3).kind == Transition.OPENED
+
+
+def test_count_changes_and_vanishing():
+    store = SnapshotStore()
+    store.diff(COURSE, make_response(0, waitlist=5), now=1)
+    assert store.diff(COURSE, make_response(0, waitlist=5), now=2) is None
+    assert store.snapshots["CAS CS111 A1"].timestamp == 1
+
+    event = store.diff(COURSE, make_response(0, waitlist=4), now=3)
+    assert event.kind == Transition.WAITLIST_CHANGED
+
+    event = store.diff(COURSE, None)
+    assert event.kind == Transition.VANISHED
+    assert event.previous.wait_tot == 4
+
+
+def test_pop_changes_and_reload():
+    store = SnapshotStore()
+    store.diff(COURSE, make_response(0, waitlist=5), now=1)
+    store.diff(Course("CAS CS112 A1"), make_response(0), now=1)
+    store.pop_changes()
+
+    store.retain(["CAS CS111 A1"])
+    assert "CAS CS112 A1" not in store.snapshots
+    store.diff(COURSE, make_response(0, waitlist=6), now=2)
+    upserts, removed = store.pop_changes()
+    assert upserts == [{"_id": "CAS CS111 A1", "a": 0, "w": 6, "t": 2}]
+    assert removed == []
+
+    store.diff(COURSE, None)
+    assert store.pop_changes() == ([], ["CAS CS111 A1"])
+
+    reloaded = SnapshotStore(upserts)
+    assert reloaded.diff(COURSE, make_response(0, waitlist=6)) is None
@@ -0,0 +1,265 @@
+import os
+import sys
+
+import pendulum
+import pytest
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.db import Database, open_database
+from src.memory_db import MemoryDatabase
+from src.outbox import make_intents, subscription_of
+from src.sqlite_db import SQLiteDatabase
+from src.storage import Storage
+from utils.constants import (
+    Environment,
+    NotificationStatus,
+    COURSE_NAME,
+    SEM_YEAR,
+    SUBSCRIBERS,
+    UID,
+    USER_LIST,
+    STATUS,
+    ATTEMPTS,
+    AVAILABLE_AT,
+    CREATED_AT,
+    IS_SUBSCRIBED,
+    LAST_SUBSCRIBED,
+    LAST_SUBSCRIPTION,
+    PINNED,
+    UPDATED_AT,
+    POLLED_AT,
+    SAMPLES,
+)
+from utils.models import Course
+
+COURSE = Course("CAS CS111 A1")
+OTHER_COURSE = Course("CAS CS112 A1")
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def db(request) -> Storage:
+    if request.param == "memory":
+        return MemoryDatabase(Environment.DEV)
+    return SQLiteDatabase(Environment.DEV, ":memory:")
+
+
+def test_open_database_selects_backend(tmp_path, monkeypatch):
+    assert isinstance(open_database(Environment.DEV, "memory"), MemoryDatabase)
+    monkeypatch.setattr("src.db.SQLITE_PATH", str(tmp_path / "alert.sqlite3"))
+    assert isinstance(open_database(Environment.DEV, "sqlite"), SQLiteDatabase)
+    assert issubclass(Database, Storage)
+    with pytest.raises(ValueError):
+        open_database(Environment.DEV, "redis")
+
+
+def test_subscriptions(db: Storage):
+    now = pendulum.now()
+    semester = Course.get_sem_year()
+    db.subscribe(COURSE, "u1", now)
+    db.subscribe(COURSE, "u1", now)
+    db.subscribe(COURSE, "u2", now)
+    db.subscribe(OTHER_COURSE, "u3", now)
+
+    assert sorted(
+        (c[COURSE_NAME], c[SUBSCRIBERS]) for c in db.get_sweep_courses(semester, 100)
+    ) == [(str(COURSE), 2), (str(OTHER_COURSE), 1)]
+    [subscribers] = db.get_subscribers(semester, [str(COURSE)]).values()
+    assert list(subscribers) == ["u1", "u2"]
+    assert subscribers["u1"].timestamp() == pytest.approx(now.timestamp())
+    assert db.get_user_course("u3")[COURSE_NAME] == str(OTHER_COURSE)
+    [course] = [c for c in db.get_all_courses() if c[COURSE_NAME] == str(COURSE)]
+    assert (course[SEM_YEAR], sorted(course[USER_LIST])) == (semester, ["u1", "u2"])
+
+    user = db.get_user("u1")
+    assert user[IS_SUBSCRIBED] and user[LAST_SUBSCRIPTION] == str(COURSE)
+    assert user[LAST_SUBSCRIBED].timestamp() == pytest.approx(now.timestamp())
+
+    db.unsubscribe(COURSE, "u1")
+    assert db.get_user_course("u1") is None
+    assert not db.get_user("u1")[IS_SUBSCRIBED]
+
+    [live] = db.get_user_subscriptions(["u2"])
+    stale = {**live, CREATED_AT: now.subtract(minutes=1)}
+    missing = {**live, UID: "missing"}
+    assert db.unsubscribe_many([stale, missing]) == []
+    assert db.get_user_course("u2") is not None
+    assert db.unsubscribe_many([live, missing]) == ["u2"]
+    assert db.get_subscribers(semester, [str(COURSE)]) == {}
+    assert not db.get_user("u2")[IS_SUBSCRIBED]
+    assert db.get_user("missing") is None
+
+    db.prune_users(["u3"])
+    assert db.get_user("u3") is None
+    assert list(db.get_sweep_courses(semester, 100)) == []
+
+
+def test_expired_courses(db: Storage):
+    now = pendulum.now()
+    with patch.object(Course, "get_sem_year", return_value="Fall 2000"):
+        db.subscribe(COURSE, "u1", now)
+        db.subscribe(COURSE, "u2", now)
+    db.subscribe(OTHER_COURSE, "u3", now)
+    semester = Course.get_sem_year()
+
+    assert [c[COURSE_NAME] for c in db.get_sweep_courses(semester, 100)] == [
+        str(OTHER_COURSE)
+    ]
+    [expired] = db.get_expired_courses(semester)
+    assert (expired[COURSE_NAME], expired[SEM_YEAR]) == (str(COURSE), "Fall 2000")
+    assert sorted(expired[USER_LIST]) == ["u1", "u2"]
+
+    db.purge_expired(semester, ["u1", "u2"])
+    assert db.get_expired_courses(semester) == []
+    assert not db.get_user("u1")[IS_SUBSCRIBED]
+    assert db.get_user("u3")[IS_SUBSCRIBED]
+    assert db.get_user_course("u3")[COURSE_NAME] == str(OTHER_COURSE)
+
+
+def test_enrollment_history(db: Storage):
+    start = pendulum.from_timestamp(0)
+    db.save_enrollment(
+        [
+            {COURSE_NAME: str(COURSE), POLLED_AT: start.add(seconds=s), "a": a, "w": 0}
+            for s, a in [(0, 0), (30, 2), (60, 1), (120, 0)]
+        ]
+    )
+    db.save_enrollment(
+        [{COURSE_NAME: str(OTHER_COURSE), POLLED_AT: start, "a": 5, "w": 0}]
+    )
+
+    windows = db.get_enrollment_history(str(COURSE), start, start.add(seconds=120), 60)
+    assert [(w[POLLED_AT].timestamp(), w[SAMPLES], w["a"]) for w in windows] == [
+        (0, 2, 2),
+        (60, 1, 1),
+    ]
+    assert db.get_enrollment_history("CAS CS113 A1", start, start.add(days=1), 60) == []
+
+
+def test_users_and_snapshots(db: Storage):
+    now = pendulum.now()
+    db.update_subscription_time("u1", now)
+    db.update_subscription_status("u1", str(COURSE), False)
+    assert db.get_user("u1")[LAST_SUBSCRIPTION] == str(COURSE)
+    assert [user[UID] for user in db.get_all_users()] == ["u1"]
+
+    db.save_snapshots([{"_id": str(COURSE), "a": 0, "w": 3, "t": 1}], [])
+    db.save_snapshots([{"_id": str(COURSE), "a": 2, "w": 3, "t": 2}], [])
+    assert list(db.get_snapshots()) == [{"_id": str(COURSE), "a": 2, "w": 3, "t": 2}]
+
+
+def test_snapshots_go_with_last_subscription(db: Storage):
+    now = pendulum.now()
+    snapshot = {"_id": str(COURSE), "a": 0, "w": 3, "t": 1}
+    db.subscribe(COURSE, "u1", now)
+    db.subscribe(COURSE, "u2", now)
+    db.save_snapshots([snapshot, {**snapshot, "_id": str(OTHER_COURSE)}], [])
+
+    db.unsubscribe(COURSE, "u1")
+    assert [doc["_id"] for doc in db.get_snapshots()] == [str(COURSE)]
+    db.unsubscribe_many(db.get_user_subscriptions(["u2"]))
+    assert list(db.get_snapshots()) == []
+
+    db.subscribe(COURSE, "u3", now)
+    db.save_snapshots([snapshot], [])
+    db.prune_users(["u3"])
+    assert list(db.get_snapshots()) == []
+
+    with patch.object(Course, "get_sem_year", return_value="Fall 2000"):
+        db.subscribe(COURSE, "u4", now)
+    db.save_snapshots([snapshot], [])
+    db.purge_expired(Course.get_sem_year(), ["u4"])
+    assert list(db.get_snapshots()) == []
+
+
+def test_leases(db: Storage):
+    now = pendulum.now()
+    later = now.add(seconds=60)
+    db.heartbeat_worker("w1", now)
+    db.heartbeat_worker("w2", now)
+    assert db.count_live_workers(now.subtract(seconds=1)) == 2
+    db.remove_worker("w2")
+    assert db.count_live_workers(now.subtract(seconds=1)) == 1
+
+    assert db.acquire_lease(0, "w1", now, later)
+    assert not db.acquire_lease(0, "w2", now, later)
+    assert db.renew_leases("w1", now, later.add(seconds=60)) == [0]
+    assert db.acquire_lease(0, "w2", later.add(seconds=61), later.add(seconds=120))
+
+    db.release_leases("w2", [0])
+    assert db.renew_leases("w2", now, later) == []
+    assert db.acquire_lease(0, "w1", now, later)
+
+
+def test_outbox(db: Storage):
+    now = pendulum.now()
+    intents = make_intents(COURSE, "Fall 2025", "opened", "open!", ["u1", "u2"], now)
+    assert db.enqueue_notifications(intents) == 2
+    assert db.enqueue_notifications(intents) == 0
+
+    claimed = db.claim_notifications("d1", now, now.add(seconds=60), 10)
+    assert sorted(intent[UID] for intent in claimed) == ["u1", "u2"]
+    assert db.claim_notifications("d2", now, now.add(seconds=60), 10) == []
+
+    [delivered, retried] = sorted(intent["_id"] for intent in claimed)
+    db.settle_notifications([delivered], {retried: now.add(seconds=5)}, [], now)
+    assert db.claim_notifications("d2", now, now.add(seconds=60), 10) == []
+    [retry] = db.claim_notifications("d2", now.add(seconds=5), now.add(seconds=65), 10)
+    assert retry["_id"] == retried and retry[ATTEMPTS] == 1
+    assert retry[AVAILABLE_AT].timestamp() == pytest.approx(
+        now.add(seconds=5).timestamp()
+    )
+
+    db.settle_notifications([], {}, [retried], now)
+    db.purge_notifications(now.add(seconds=1))
+    assert db.enqueue_notifications(intents) == 2
+
+
+def test_outbox_intents_name_their_subscription(db: Storage):
+    now = pendulum.now()
+    semester = Course.get_sem_year()
+    db.subscribe(COURSE, "u1", now)
+    [users] = db.get_subscribers(semester, [str(COURSE)]).values()
+    db.enqueue_notifications(
+        make_intents(COURSE, semester, "opened", "", users, now, subscribed_at=users)
+    )
+
+    [intent] = db.claim_notifications("d1", now, now.add(seconds=60), 10)
+    assert db.unsubscribe_many([subscription_of(intent)]) == ["u1"]
+    assert db.get_user_course("u1") is None
+
+
+def test_broadcasts(db: Storage):
+    now = pendulum.now()
+    db.save_broadcast_outcomes(
+        "b1",
+        [
+            {
+                UID: "u1",
+                PINNED: True,
+                STATUS: NotificationStatus.DELIVERED,
+                UPDATED_AT: now,
+            },
+            {
+                UID: "u2",
+                PINNED: False,
+                STATUS: NotificationStatus.FAILED,
+                UPDATED_AT: now,
+            },
+        ],
+    )
+    assert db.get_broadcast_recipients("b1") == {"u1"}
+
+    db.save_broadcast_outcomes(
+        "b1",
+        [
+            {
+                UID: "u2",
+                PINNED: False,
+                STATUS: NotificationStatus.DELIVERED,
+                UPDATED_AT: now,
+            }
+        ],
+    )
+    assert db.get_broadcast_recipients("b1") == {"u1", "u2"}
+    assert db.get_broadcast_recipients("b2") == set()
@@ -0,0 +1,117 @@
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from curl_cffi.requests.exceptions import HTTPError, Timeout
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.client import SearchClient
+from utils.throttle import (
+    BreakerState,
+    CircuitBreaker,
+    CircuitOpenError,
+    TokenBucket,
+    is_transient_failure,
+)
+
+
+def http_error(status_code: int) -> HTTPError:
+    response = MagicMock()
+    response.status_code = status_code
+    return HTTPError(f"HTTP {status_code}", response=response)
+
+
+def test_is_transient_failure():
+    assert is_transient_failure(Timeout("timed out"))
+    assert is_transient_failure(http_error(429))
+    assert is_transient_failure(http_error(503))
+    assert not is_transient_failure(http_error(404))
+    assert not is_transient_failure(ValueError("not found"))
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, base_backoff=30, max_backoff=600)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == BreakerState.OPEN
+    assert breaker.is_open
+    assert not breaker.allow()
+
+
+def test_breaker_half_opens_with_single_trial():
+    breaker = CircuitBreaker(failure_threshold=1, base_backoff=30, max_backoff=600)
+    with patch("utils.throttle.time.monotonic", return_value=0):
+        breaker.record_failure()
+    assert 15 <= breaker.opened_until <= 30
+
+    with patch("utils.throttle.time.monotonic", return_value=31):
+        assert breaker.allow()
+        assert breaker.state == BreakerState.HALF_OPEN
+        assert not breaker.allow()
+
+        # A failed trial reopens the breaker with a longer backoff
+        breaker.record_failure()
+        assert breaker.state == BreakerState.OPEN
+        assert 31 + 30 <= breaker.opened_until <= 31 + 60
+
+    with patch("utils.throttle.time.monotonic", return_value=100):
+        assert breaker.allow()
+        breaker.record_success()
+        assert breaker.state == BreakerState.CLOSED
+        assert breaker.allow()
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_waits_when_empty():
+    bucket = TokenBucket(rate=10, capacity=1)
+    await bucket.acquire()
+    with patch("utils.throttle.asyncio.sleep", new=AsyncMock()) as sleep:
+        with patch("utils.throttle.time.monotonic", side_effect=[bucket._updated, 1e9]):
+            await bucket.acquire()
+    sleep.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_search_client_trips_breaker():
+    breaker = CircuitBreaker(failure_threshold=2, base_backoff=30, max_backoff=600)
+    search_client = SearchClient(MagicMock(), breaker=breaker)
+    fetch = AsyncMock(side_effect=http_error(503))
+
+    with patch("utils.client.fetch_sections", fetch):
+        for _ in range(2):
+            with pytest.raises(HTTPError):
+                await search_client.get_sections("url")
+        assert not search_client.available
+
+        with pytest.raises(CircuitOpenError):
+            await search_client.get_sections("url")
+    assert fetch.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_failures_trip_breaker_once():
+    breaker = CircuitBreaker(failure_threshold=5, base_backoff=30, max_backoff=600)
+    search_client = SearchClient(MagicMock(), breaker=breaker)
+
+    async def fetch(_search_url, _session):
+        await asyncio.sleep(0.01)
+        raise Timeout("timed out")
+
+    with patch("utils.client.fetch_sections", fetch):
+        results = await asyncio.gather(
+            *(search_client.get_sections(f"url{i}") for i in range(10)),
+            return_exceptions=True,
+        )
+
+    assert all(isinstance(result, Timeout) for result in results)
+    assert breaker.trips == 1
+    assert breaker.opened_until - time.monotonic() <= 30
@@ -0,0 +1,89 @@
+"""In-process caching helpers."""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    """Bounded LRU cache whose entries expire `ttl` seconds after being stored.
+
+    `get_or_fetch` coalesces concurrent misses for the same key, so a burst of
+    callers shares a single in-flight fetch. Failed fetches are not cached. Readers
+    that need fresher data than `ttl` pass a `max_age`, and entries older than that
+    are fetched again for them.
+    """
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self._in_flight: dict[K, asyncio.Future[V]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: K, max_age: float | None = None) -> V | None:
+        """Return the cached value for `key`, or None if missing, expired or stale.
+
+        Entries stored `max_age` or more seconds ago are stale but kept for others.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        now = time.monotonic()
+        if expires_at <= now:
+            del self._entries[key]
+            return None
+        if max_age is not None and now - (expires_at - self.ttl) >= max_age:
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: K, value: V) -> None:
+        """Store `value`, evicting least recently used entries beyond `maxsize`."""
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: K) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    async def get_or_fetch(
+        self,
+        key: K,
+        fetch: Callable[[], Awaitable[V]],
+        max_age: float | None = None,
+    ) -> V:
+        """Return the cached value for `key`, fetching it at most once if missing.
+
+        With `max_age`, older entries count as missing; an in-flight fetch is joined.
+        """
+        if (value := self.get(key, max_age)) is not None:
+            return value
+
+        if (future := self._in_flight.get(key)) is None:
+            future = asyncio.ensure_future(self._fetch(key, fetch))
+            self._in_flight[key] = future
+
+        # Shield the shared fetch so one cancelled caller does not cancel the others
+        return await asyncio.shield(future)
+
+    async def _fetch(self, key: K, fetch: Callable[[], Awaitable[V]]) -> V:
+        try:
+            value = await fetch()
+            self.set(key, value)
+            return value
+        finally:
+            self._in_flight.pop(key, None)
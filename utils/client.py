@@ -0,0 +1,130 @@
+"""Shared HTTP sessions and cached client for BU class search requests."""
+
+import os
+
+from curl_cffi import CurlHttpVersion
+from curl_cffi.requests import AsyncSession
+from dotenv import load_dotenv
+
+from utils.cache import TTLCache
+from utils.models import Course, CourseResponse, fetch_sections
+from utils.throttle import (
+    CircuitBreaker,
+    CircuitOpenError,
+    TokenBucket,
+    is_transient_failure,
+)
+
+load_dotenv()
+
+# Upper bound on concurrent connections kept open to the class search endpoint
+SEARCH_POOL_SIZE = int(os.getenv("SEARCH_POOL_SIZE", "10"))
+SEARCH_TIMEOUT_SECONDS = float(os.getenv("SEARCH_TIMEOUT_SECONDS", "10"))
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "15"))
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+SEARCH_RATE_LIMIT = float(os.getenv("SEARCH_RATE_LIMIT", "5"))
+SEARCH_BURST = float(os.getenv("SEARCH_BURST", "10"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_BASE_BACKOFF_SECONDS = float(os.getenv("BREAKER_BASE_BACKOFF_SECONDS", "30"))
+BREAKER_MAX_BACKOFF_SECONDS = float(os.getenv("BREAKER_MAX_BACKOFF_SECONDS", "600"))
+
+SESSION_OPTIONS = {
+    "impersonate": "chrome",
+    "timeout": SEARCH_TIMEOUT_SECONDS,
+    # Negotiate HTTP/2 via ALPN, falling back to HTTP/1.1 if the server refuses
+    "http_version": CurlHttpVersion.V2TLS,
+}
+
+
+def create_async_session() -> AsyncSession:
+    """Create a pooled keep-alive session shared by every lookup in the bot.
+
+    Connections (and their TLS handshakes) are reused across sweeps for as long as
+    the session lives, so callers should create it once and close it on shutdown.
+    """
+    return AsyncSession(max_clients=SEARCH_POOL_SIZE, **SESSION_OPTIONS)
+
+
+class SearchClient:
+    """Class search access shared by the poller and the bot's handlers.
+
+    Results are cached per search URL for `SEARCH_CACHE_TTL_SECONDS`, and concurrent
+    lookups of the same URL share one request, so a burst of lookups for a course
+    costs a single BU round-trip. The poller reads with `max_age=0` so every poll
+    sees fresh data, which then serves the handlers. Requests that miss the cache
+    are limited to `SEARCH_RATE_LIMIT` per second and rejected with
+    `CircuitOpenError` while the circuit breaker is open.
+    """
+
+    def __init__(
+        self,
+        session: AsyncSession,
+        cache: TTLCache | None = None,
+        rate_limiter: TokenBucket | None = None,
+        breaker: CircuitBreaker | None = None,
+    ):
+        self.session = session
+        if cache is None:
+            cache = TTLCache(ttl=SEARCH_CACHE_TTL_SECONDS, maxsize=SEARCH_CACHE_SIZE)
+        self.cache: TTLCache[str, dict[str, CourseResponse | None]] = cache
+        self.rate_limiter = rate_limiter or TokenBucket(
+            rate=SEARCH_RATE_LIMIT, capacity=SEARCH_BURST
+        )
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=BREAKER_FAILURE_THRESHOLD,
+            base_backoff=BREAKER_BASE_BACKOFF_SECONDS,
+            max_backoff=BREAKER_MAX_BACKOFF_SECONDS,
+        )
+
+    @property
+    def available(self) -> bool:
+        """Whether requests to BU are currently allowed by the circuit breaker."""
+        return not self.breaker.is_open
+
+    async def get_sections(
+        self, search_url: str, max_age: float | None = None
+    ) -> dict[str, CourseResponse | None]:
+        """Return every section for a search URL, reading through the cache.
+
+        Cached results older than `max_age` seconds are fetched again; `max_age=0`
+        always fetches, still sharing the result with concurrent and later readers.
+        """
+        return await self.cache.get_or_fetch(
+            search_url, lambda: self._fetch_sections(search_url), max_age
+        )
+
+    async def _fetch_sections(
+        self, search_url: str
+    ) -> dict[str, CourseResponse | None]:
+        if not self.breaker.allow():
+            raise CircuitOpenError(
+                f"Class search is unavailable, skipping {search_url}"
+            )
+        await self.rate_limiter.acquire()
+
+        try:
+            sections = await fetch_sections(search_url, self.session)
+        except Exception as exc:
+            if is_transient_failure(exc):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        return sections
+
+    async def get_course_section(self, course: Course) -> CourseResponse:
+        """Return the course's section, reading through the cache.
+
+        Raises:
+            ValueError: If the specified section is not found
+        """
+        return course.find_section(await self.get_sections(course.search_url))
+
+    async def close(self) -> None:
+        self.cache.clear()
+        await self.session.close()
+
+
+def create_search_client() -> SearchClient:
+    return SearchClient(create_async_session())
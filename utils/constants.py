@@ -11,6 +11,12 @@ class TimeConstants(IntEnum):
     TIMEOUT_SECONDS = 5
 
 
+class NotificationStatus(StrEnum):
+    PENDING = "pending"
+    DELIVERED = "delivered"
+    FAILED = "failed"
+
+
 class InputStates(IntEnum):
     AWAIT_SELECTION = 1
     AWAIT_CUSTOM_INPUT = 2
@@ -56,11 +62,37 @@ CRED_FIELDS = {Message.USERNAME, Message.PASSWORD}
 UID = "user"
 USER_LIST = "users"
 COURSE_LIST = "courses"
+SUBSCRIPTION_LIST = "subscriptions"
+SNAPSHOT_LIST = "snapshots"
+LEASE_LIST = "leases"
+WORKER_LIST = "workers"
+OUTBOX_LIST = "outbox"
+BROADCAST_LIST = "broadcasts"
+ENROLLMENT_LIST = "enrollment"
+OWNER = "owner"
+EXPIRES_AT = "expires_at"
+HEARTBEAT = "heartbeat"
+STATUS = "status"
+TEXT = "text"
+ATTEMPTS = "attempts"
+AVAILABLE_AT = "available_at"
+CREATED_AT = "created_at"
+SUBSCRIBED_AT = "subscribed_at"
+ENDS_SUBSCRIPTION = "ends_subscription"
+UPDATED_AT = "updated_at"
+BROADCAST_ID = "broadcast"
+PINNED = "pinned"
+ERROR = "error"
 COURSE_NAME = "name"
 SEM_YEAR = "semester"
+SUBSCRIBERS = "subscribers"
+POLLED_AT = "polled_at"
+SAMPLES = "samples"
 IS_SUBSCRIBED = "is_subscribed"
 LAST_SUBSCRIBED = "last_subscribed"
 LAST_SUBSCRIPTION = "last_subscription"
 FALL_SEMESTER = "Fall"
 SPRING_SEMESTER = "Spring"
 SUMMER_SEMESTER = "Summer"
+SEARCH_CLIENT = "search_client"
+CACHE_WATCHER = "cache_watcher"
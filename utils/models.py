@@ -1,10 +1,19 @@
 """Module for representing and managing Boston University courses."""
 
 from dataclasses import dataclass, field, InitVar
+from typing import Annotated, Any
 
 import pendulum
 from curl_cffi import requests
-from pydantic import BaseModel
+from curl_cffi.requests import AsyncSession, Response, Session
+from pydantic import (
+    BaseModel,
+    TypeAdapter,
+    ValidationError,
+    ValidatorFunctionWrapHandler,
+    WrapValidator,
+)
+from typing_extensions import TypedDict
 
 from utils.constants import (
     FALL_SEMESTER,
@@ -30,6 +39,41 @@ class CourseResponse(BaseModel):
     enrollment_available: int
 
 
+class SectionFields(TypedDict):
+    """The only fields of a class search section that we read."""
+
+    class_section: str
+    subject: str
+    catalog_nbr: str
+    wait_tot: int
+    enrollment_available: int
+
+
+def malformed_section(value: Any, handler: ValidatorFunctionWrapHandler) -> Any:
+    """Validate one section; a malformed one becomes its section code, if it has one."""
+    try:
+        return handler(value)
+    except ValidationError:
+        code = value.get("class_section") if isinstance(value, dict) else None
+        return code if isinstance(code, str) else None
+
+
+class ClassSearchFields(TypedDict, total=False):
+    classes: list[SectionFields]
+
+
+class LenientClassSearchFields(TypedDict, total=False):
+    classes: list[Annotated[SectionFields, WrapValidator(malformed_section)]]
+
+
+# Compiled once and run on the raw JSON bytes: a single pass that validates the
+# fields above and skips everything else without building Python objects for it
+CLASS_SEARCH_VALIDATOR = TypeAdapter(ClassSearchFields)
+# Slower fallback for payloads that fail: sections are validated one by one, so a
+# malformed section fails only itself
+LENIENT_CLASS_SEARCH_VALIDATOR = TypeAdapter(LenientClassSearchFields)
+
+
 @dataclass(frozen=True)
 class Course:
     """Represents a Boston University course with registration capabilities.
@@ -107,30 +151,73 @@ class Course:
 
         return f"{semester} {year}"
 
-    def get_course_section(self) -> CourseResponse:
+    def get_course_section(self, session: Session | None = None) -> CourseResponse:
         """Fetches course section information from BU's API.
 
+        Uses the given keep-alive session if provided, otherwise a one-off request.
+
         Raises:
             ValueError: If the specified section is not found
         """
-        response = requests.get(self.search_url, impersonate="chrome")
-        response.raise_for_status()
+        client = session or requests
+        response = client.get(self.search_url, impersonate="chrome")
+        return self.find_section(parse_sections(response, self.search_url))
+
+    def find_section(
+        self, sections: dict[str, CourseResponse | None]
+    ) -> CourseResponse:
+        """Picks this course's section out of a search key's section index.
+
+        Raises:
+            ValueError: If the specified section is not found
+            LookupError: If the section's data is malformed
+        """
+        if course_section := sections.get(self.section):
+            return course_section
+        if self.section in sections:
+            raise LookupError(f"Malformed enrollment data for {self}")
+        raise ValueError(self.not_found_msg(sections))
+
+    def not_found_msg(self, sections: dict[str, CourseResponse | None]) -> str:
+        """Explains that this section is missing, suggesting another if possible."""
+        error_msg = f"{self} was not found."
+        if first_section := next(filter(None, sections.values()), None):
+            section_name = f"{first_section.subject} {first_section.catalog_nbr} {first_section.class_section}"
+            error_msg += f" Did you mean {section_name}?"
+        return error_msg
+
+
+async def fetch_sections(
+    search_url: str, session: AsyncSession
+) -> dict[str, CourseResponse | None]:
+    """Fetches every section for a search key in a single request."""
+    response = await session.get(search_url)
+    return parse_sections(response, search_url)
+
+
+def parse_sections(
+    response: Response, search_url: str
+) -> dict[str, CourseResponse | None]:
+    """Indexes all sections of a class search response by section code.
+
+    Malformed sections map to None, so they are neither read nor reported missing.
+    """
+    response.raise_for_status()
 
+    try:
         try:
-            json_data = response.json()
-            classes: list = json_data.get("classes", [])
-            course_section = next(
-                x for x in classes if x["class_section"] == self.section
-            )
-        except StopIteration:
-            error_msg = f"{self} was not found."
-            if classes and (first_section := classes[0]):
-                section_name = f"{first_section['subject']} {first_section['catalog_nbr']} {first_section['class_section']}"
-                error_msg += f" Did you mean {section_name}?"
-            raise ValueError(error_msg)
-        except Exception as e:
-            raise LookupError(
-                f"Error fetching course with URL {self.search_url}"
-            ) from e
-
-        return CourseResponse(**course_section)
+            payload = CLASS_SEARCH_VALIDATOR.validate_json(response.content)
+        except ValidationError:
+            payload = LENIENT_CLASS_SEARCH_VALIDATOR.validate_json(response.content)
+    except Exception as e:
+        raise LookupError(f"Error fetching course with URL {search_url}") from e
+
+    sections = {}
+    for x in payload.get("classes", []):
+        if isinstance(x, dict):
+            sections[x["class_section"]] = CourseResponse.model_construct(**x)
+        elif x is not None:
+            sections.setdefault(x, None)
+    if malformed := [code for code, section in sections.items() if section is None]:
+        print(f"Skipped malformed sections {malformed} of {search_url}")
+    return sections
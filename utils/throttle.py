@@ -0,0 +1,121 @@
+"""Client-side protection for the BU class search endpoint."""
+
+import asyncio
+import random
+import time
+from enum import StrEnum
+
+from curl_cffi.requests.exceptions import ConnectionError, HTTPError, Timeout
+
+
+class CircuitOpenError(LookupError):
+    """Raised instead of issuing a request while the circuit breaker is open."""
+
+
+class BreakerState(StrEnum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+def is_transient_failure(exc: BaseException) -> bool:
+    """Whether a request failure indicates the endpoint is throttling or degraded."""
+    if isinstance(exc, (Timeout, ConnectionError)):
+        return True
+    if isinstance(exc, HTTPError) and exc.response is not None:
+        return exc.response.status_code == 429 or exc.response.status_code >= 500
+    return False
+
+
+def jittered_backoff(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff for the given attempt, drawn from its upper half."""
+    backoff = min(cap, base * 2**attempt)
+    return random.uniform(backoff / 2, backoff)
+
+
+class TokenBucket:
+    """Global requests-per-second limit with bursts of up to `capacity` requests."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    async def acquire(self) -> None:
+        """Wait until a token is available and consume it."""
+        while True:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class CircuitBreaker:
+    """Stops requests after consecutive transient failures.
+
+    After `failure_threshold` consecutive failures the breaker opens for a jittered,
+    exponentially growing backoff. Once that elapses it half-opens and lets a single
+    trial request through: success closes it, failure opens it again for longer.
+    """
+
+    def __init__(self, failure_threshold: int, base_backoff: float, max_backoff: float):
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.state = BreakerState.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.opened_until = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def is_open(self) -> bool:
+        """Whether requests are currently being rejected."""
+        if self.state == BreakerState.OPEN:
+            return time.monotonic() < self.opened_until
+        return self.state == BreakerState.HALF_OPEN and self._trial_in_flight
+
+    def allow(self) -> bool:
+        """Whether a request may be issued now; reserves the half-open trial slot."""
+        if self.state == BreakerState.OPEN and time.monotonic() >= self.opened_until:
+            self.state = BreakerState.HALF_OPEN
+        if self.state == BreakerState.HALF_OPEN:
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+        return self.state == BreakerState.CLOSED
+
+    def record_success(self) -> None:
+        self.state = BreakerState.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        # Requests in flight when the breaker opened fail late; they are one trip
+        if self.state == BreakerState.OPEN:
+            return
+        self.failures += 1
+        if (
+            self.state == BreakerState.HALF_OPEN
+            or self.failures >= self.failure_threshold
+        ):
+            self._open()
+
+    def _open(self) -> None:
+        self.opened_until = time.monotonic() + jittered_backoff(
+            self.trips, self.base_backoff, self.max_backoff
+        )
+        self.state = BreakerState.OPEN
+        self.trips += 1
+        self._trial_in_flight = False